@@ -0,0 +1,19 @@
+import asyncio
+import time
+from Pyro4.aio import AsyncProxy
+
+
+async def main(uri):
+    async with AsyncProxy(uri) as proxy:
+        print("square of 12 = %d" % await proxy.square(12))
+        keys=["key%d" % i for i in range(100)]
+        print("doing %d lookups at the same time, every lookup takes 0.5 seconds..." % len(keys))
+        begin=time.time()
+        results=await asyncio.gather(*[proxy.lookup(key) for key in keys])
+        duration=time.time()-begin
+        print("got %d results in %.2f seconds, first few: %s" % (len(results), duration, results[:4]))
+
+
+uri=input("Enter the uri of the server object: ").strip()
+loop=asyncio.get_event_loop()
+loop.run_until_complete(main(uri))
@@ -0,0 +1,23 @@
+import asyncio
+import Pyro4.aio
+
+
+class Lookup(object):
+    async def lookup(self, key):
+        await asyncio.sleep(0.5)    # simulate waiting for some other service
+        return key.upper()
+
+    def square(self, number):
+        return number*number
+
+
+async def main():
+    daemon=Pyro4.aio.AsyncDaemon()
+    uri=daemon.register(Lookup(), "example.asyncio")
+    print("Server uri: %s" % uri)
+    print("Serving on the asyncio event loop.")
+    await daemon.serve()
+
+
+loop=asyncio.get_event_loop()
+loop.run_until_complete(main())
@@ -0,0 +1,80 @@
+from __future__ import print_function
+import sys, time, select
+import Pyro4
+from Pyro4 import threadutil
+import bench
+
+# Measures how the different server types cope with a growing number of
+# (mostly idle) client connections. For every server type a daemon is started,
+# a number of idle proxies is connected to it, and then the round trip time of
+# method calls on a single active proxy is measured.
+
+CONNECTION_COUNTS=[10, 100, 500, 1000, 2000]
+ITERATIONS=2000
+
+try:
+    import resource
+    soft, hard=resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted=2*max(CONNECTION_COUNTS)+100    # client and server side of every connection
+    if soft<wanted:
+        if hard!=resource.RLIM_INFINITY:
+            wanted=min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    soft=resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+    maxconnections=(soft-100)//2
+except ImportError:
+    maxconnections=max(CONNECTION_COUNTS)
+
+servertypes=sys.argv[1:] or ["thread", "multiplex", "epoll"]
+if "epoll" in servertypes and not hasattr(select, "epoll"):
+    print("epoll is not available on this platform, skipping that server type")
+    servertypes.remove("epoll")
+
+Pyro4.config.POLLTIMEOUT=0.5
+Pyro4.config.COMMTIMEOUT=5.0
+
+
+def measure(servertype, connections):
+    Pyro4.config.SERVERTYPE=servertype
+    # the thread pool server needs a worker thread for every connection
+    Pyro4.config.THREADPOOL_MAXTHREADS=connections+10
+    daemon=Pyro4.core.Daemon()
+    uri=daemon.register(bench.bench(), "example.benchmark")
+    thread=threadutil.Thread(target=daemon.requestLoop)
+    thread.setDaemon(True)
+    thread.start()
+    idle=[]
+    try:
+        begin=time.time()
+        for _ in range(connections):
+            p=Pyro4.core.Proxy(uri)
+            p._pyroBind()
+            idle.append(p)
+        connect_duration=time.time()-begin
+        with Pyro4.core.Proxy(uri) as active:
+            active.ping()
+            begin=time.time()
+            for _ in range(ITERATIONS):
+                active.ping()
+            call_duration=time.time()-begin
+        return connect_duration, call_duration
+    finally:
+        for p in idle:
+            p._pyroRelease()
+        daemon.shutdown()
+        thread.join()
+
+
+print("%d calls on one active proxy, while N other proxies are connected but idle" % ITERATIONS)
+print("%-10s %8s %14s %14s" % ("server", "N", "connect N", "call latency"))
+for servertype in servertypes:
+    for connections in CONNECTION_COUNTS:
+        if connections>maxconnections:
+            print("%-10s %8d  skipped, not enough file descriptors available" % (servertype, connections))
+            continue
+        try:
+            connect_duration, call_duration=measure(servertype, connections)
+        except Pyro4.errors.CommunicationError:
+            print("%-10s %8d  failed: %s" % (servertype, connections, sys.exc_info()[1]))
+            continue
+        print("%-10s %8d %12.3f s %11.3f ms" % (servertype, connections, connect_duration, 1000.0*call_duration/ITERATIONS))
@@ -0,0 +1,63 @@
+from __future__ import print_function
+import sys, time, subprocess
+import Pyro4
+
+# Measures the latency of small calls and the throughput of calls with a large payload.
+# This mostly depends on how the messages are framed, sent and received, and on the serializer.
+# It starts the server itself, in a separate process (optionally give the server type as argument).
+# The server doesn't run in a thread of the client process, because then the measurements would be
+# dominated by the switching between the client and server threads.
+
+class Echo(object):
+    def echo(self, arg):
+        return arg
+    def ping(self):
+        pass
+
+def server(servertype):
+    Pyro4.config.SERVERTYPE=servertype
+    daemon=Pyro4.Daemon()
+    uri=daemon.register(Echo())
+    print(uri)
+    sys.stdout.flush()
+    daemon.requestLoop()
+
+def median(function, rounds=9):
+    """the median duration of a number of rounds, to filter out the noise of other activity on the machine"""
+    durations=[]
+    for _ in range(rounds):
+        begin=time.time()
+        function()
+        durations.append(time.time()-begin)
+    return sorted(durations)[rounds//2]
+
+def client(servertype):
+    process=subprocess.Popen([sys.executable, __file__, "server", servertype], stdout=subprocess.PIPE)
+    try:
+        uri=process.stdout.readline().decode("ascii").strip()
+        with Pyro4.Proxy(uri) as proxy:
+            proxy._pyroBind()
+            print("server type: %s" % servertype)
+            for method, args in [("ping", ()), ("echo", ("small argument",))]:
+                calls=10000
+                def smallcalls():
+                    for _ in range(calls):
+                        getattr(proxy, method)(*args)
+                print("%-5s latency: %.1f usec per call" % (method, 1000000.0*median(smallcalls)/calls))
+            # strings aren't sent as out-of-band buffers, they are part of the pickled message data
+            for size in [100000, 1000000, 10000000]:
+                payload="x"*size
+                calls=max(200000000//size//10, 4)
+                def largecalls():
+                    for _ in range(calls):
+                        proxy.echo(payload)
+                print("echo of %8d chars: %.0f Mb/sec" % (size, 2.0*size*calls/median(largecalls)/1024/1024))
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__=="__main__":
+    if len(sys.argv)>2 and sys.argv[1]=="server":
+        server(sys.argv[2])
+    else:
+        client(sys.argv[1] if len(sys.argv)>1 else Pyro4.config.SERVERTYPE)
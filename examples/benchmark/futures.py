@@ -0,0 +1,79 @@
+from __future__ import print_function
+import sys, time
+import concurrent.futures
+import Pyro4
+from Pyro4 import threadutil
+
+# Measures what a daemon pays for a large number of pending isasync calls: the time to issue them,
+# the memory they take, the time to cancel one of them, and how long the daemon keeps
+# the futures after their client disconnects. Optionally give the number of calls as argument.
+
+COUNT=int(sys.argv[1]) if len(sys.argv)>1 else 100000
+
+Pyro4.config.POLLTIMEOUT=0.5
+
+
+def rss():
+    """resident memory of the process in Mb, 0 if it can't be determined"""
+    try:
+        for line in open("/proc/self/status"):
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])//1024
+    except IOError:
+        pass
+    return 0
+
+
+class Pending(object):
+    """isasync method of which the futures never complete on their own"""
+    def __init__(self):
+        self.futures=[]
+
+    @Pyro4.isasync
+    def wait(self):
+        future=concurrent.futures.Future()
+        self.futures.append(future)
+        return future
+
+    def count(self):
+        return len(self.futures)
+
+
+def pending(daemon):
+    """the number of futures that the daemon keeps for its clients"""
+    table=getattr(daemon, "_futures", None)
+    if table is None:
+        return len(daemon._uriToFuture)    # daemons before Pyro 4.18 kept them by the uri of the client's future
+    return len(table)
+
+
+daemon=Pyro4.core.Daemon()
+uri=daemon.register(Pending(), "example.futures")
+thread=threadutil.Thread(target=daemon.requestLoop)
+thread.setDaemon(True)
+thread.start()
+
+proxy=Pyro4.core.Proxy(uri)
+proxy._pyroAsyncs.add("wait")
+proxy.count()
+memory=rss()
+begin=time.time()
+results=[proxy.wait() for _ in range(COUNT)]
+while proxy.count()<COUNT:
+    time.sleep(0.01)
+duration=time.time()-begin
+print("issue %d isasync calls: %.2f s (%.1f usec per call)" % (COUNT, duration, 1000000.0*duration/COUNT))
+print("memory:                 +%d Mb" % (rss()-memory))
+print("daemon keeps:           %d futures" % pending(daemon))
+begin=time.time()
+results[COUNT//2].cancel()
+print("cancel one:             %.2f ms" % (1000.0*(time.time()-begin)))
+begin=time.time()
+proxy._pyroRelease()
+while pending(daemon) and time.time()-begin<30:
+    time.sleep(0.01)
+if pending(daemon):
+    print("client disconnect:      daemon still keeps %d futures after 30 s" % pending(daemon))
+else:
+    print("client disconnect:      futures gone after %.2f s" % (time.time()-begin))
+daemon.shutdown()
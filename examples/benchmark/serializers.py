@@ -0,0 +1,48 @@
+from __future__ import print_function
+import sys, time
+import Pyro4.util
+import bench
+
+# Compares the speed and the message sizes of the serializers, for the request
+# and response data of the calls that the benchmark client makes.
+# No network is involved, it only measures the (de)serialization itself.
+
+ITERATIONS=20000
+
+obj=bench.bench()
+calls = [
+    ("length", ('Irmen de Jong',), {}),
+    ("timestwo", (21,), {}),
+    ("bigreply", (), {}),
+    ("manyargs", (1,2,3,4,5,6,7,8,9,10,11,12,13,14,15), {}),
+    ("noreply", (99993333,), {}),
+    ("varargs", ('een',2,(3,),[4]), {}),
+    ("keywords", (), {"arg1": 'zork'}),
+    ("echo", ('een',2,(3,),[4]), {}),
+    ("meth1", ('stringetje',), {}),
+    ("bigarg", ('Argument'*50,), {}),
+    ("oneway", ('stringetje',432423434), {}),
+    ("mapping", ({"aap":42, "noot": 99, "mies": 987654},), {}),
+]
+
+serializers=[Pyro4.util.getSerializer(name) for name in sys.argv[1:] or ["pickle", "marshal"]]
+
+print("%d (de)serializations of the request and response of every call" % ITERATIONS)
+print("%-10s %10s %10s %10s" % ("call", "serializer", "size", "seconds"))
+totals=dict((serializer.name, 0.0) for serializer in serializers)
+for method, vargs, kwargs in calls:
+    request=("example.benchmark", method, vargs, kwargs)
+    response=getattr(obj, method)(*vargs, **kwargs)
+    for serializer in serializers:
+        requestdata=serializer.dumps(request)
+        responsedata=serializer.dumps(response)
+        begin=time.time()
+        for _ in range(ITERATIONS):
+            serializer.loads(serializer.dumps(request))
+            serializer.loads(serializer.dumps(response))
+        duration=time.time()-begin
+        totals[serializer.name]+=duration
+        print("%-10s %10s %10d %10.3f" % (method, serializer.name, len(requestdata)+len(responsedata), duration))
+print()
+for serializer in serializers:
+    print("total %s: %.3f seconds" % (serializer.name, totals[serializer.name]))
@@ -25,3 +25,14 @@ duration=time.time()-begin
 totalsize=float(totalsize)
 print("It took %.2f seconds to transfer %d kilobyte." % (duration, totalsize/1024))
 print("That is %.0f k/sec. = %.1f mb/sec." % (totalsize/1024/duration, totalsize/1024/1024/duration))
+
+print("transferring the same data as bytearrays")
+totalsize=0
+begin=time.time()
+for i in range(1,15):
+    size=obj.transfer(bytearray(data*i))
+    totalsize=totalsize+basesize*i
+duration=time.time()-begin
+totalsize=float(totalsize)
+print("It took %.2f seconds to transfer %d kilobyte." % (duration, totalsize/1024))
+print("That is %.0f k/sec. = %.1f mb/sec." % (totalsize/1024/duration, totalsize/1024/1024/duration))
@@ -61,6 +61,10 @@ elif serverconfig["SERVERTYPE"]=="multiplex":
     print("Servertype is multiplex. The threads will need to get in line.")
     print("The time this will take is 5 seconds (every thread takes 1 second sequentially).")
     print("You will see that the requests are handled by a single server thread.")
+elif serverconfig["SERVERTYPE"]=="hybrid":
+    print("Servertype is hybrid. All calls will run in parallel on the worker threads.")
+    print("The time this will take is 1 second (every thread takes 1 second in parallel).")
+    print("You will see that the requests are handled by different worker threads.")
 else:
     print("Unknown servertype")
 
@@ -35,9 +35,11 @@ class Server(object):
 ######## main program
 
 Pyro4.config.SERVERTYPE="undefined"
-servertype=input("Servertype threaded or multiplex (t/m)?")
+servertype=input("Servertype threaded, multiplex or hybrid (t/m/h)?")
 if servertype=="t":
     Pyro4.config.SERVERTYPE="thread"
+elif servertype=="h":
+    Pyro4.config.SERVERTYPE="hybrid"
 else:
     Pyro4.config.SERVERTYPE="multiplex"
 
@@ -0,0 +1,365 @@
+"""
+Support for using Pyro from asyncio code (requires Python 3.5 or newer).
+
+AsyncProxy is a proxy whose remote method calls are coroutines, and that can
+have many calls in flight at the same time over its single connection.
+AsyncDaemon is a daemon that serves its objects from an asyncio event loop.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import asyncio
+import logging
+import struct
+import sys
+from Pyro4 import compression, constants, errors, util
+import Pyro4.core
+
+__all__=["AsyncProxy", "AsyncDaemon"]
+
+log=logging.getLogger("Pyro4.aio")
+
+if hasattr(asyncio, "current_task"):
+    _currentTask=asyncio.current_task
+else:
+    _currentTask=asyncio.Task.current_task
+
+
+async def getMessage(reader, requiredMsgType, connection=None):
+    """
+    Reads a complete Pyro message from an asyncio stream reader.
+    Returns a tuple of messagetype, messageflags, sequencenumber, messagedata.
+    Messages that were compressed with the compression stream of the connection are decompressed
+    with the decompression stream of the given connection.
+    """
+    MF=Pyro4.core.MessageFactory
+    try:
+        while True:
+            headerdata=await reader.readexactly(MF.HEADERSIZE)
+            msgType, flags, seq, datalen, datahmac = MF.parseMessageHeader(headerdata)
+            if 0 < Pyro4.config.MAX_MESSAGE_SIZE < datalen:
+                errorMsg = "max message size exceeded (%d where max=%d)" % (datalen, Pyro4.config.MAX_MESSAGE_SIZE)
+                log.error(errorMsg)
+                raise errors.ProtocolError(errorMsg)
+            if requiredMsgType is None or msgType == requiredMsgType:
+                break
+            if msgType==MF.MSG_CONNECT and requiredMsgType==MF.MSG_INVOKE and connection is not None and connection.handshakePending:
+                # the capabilities of the client, its first request follows right behind them
+                databytes=await reader.readexactly(datalen)
+                MF.checkHmac(flags, databytes, datahmac, connection.macState)
+                Pyro4.core._acceptHandshake(connection, databytes)
+                continue
+            err="invalid msg type %d received" % msgType
+            log.error(err)
+            raise errors.ProtocolError(err)
+        if connection is not None and requiredMsgType==MF.MSG_INVOKE:
+            connection.handshakePending=False   # the capabilities can only come in front of the first request
+        if flags & MF.FLAGS_OOB:
+            # message with out-of-band frames: read the frame table first, then the data and the buffers
+            table=await reader.readexactly(MF.OOBFRAMESIZE)
+            envelopelen, count = struct.unpack(MF.oobFrameFmt, table)
+            lengths=await reader.readexactly(4*count)
+            buffersizes=struct.unpack("!%dI" % count, lengths)
+            if MF.OOBFRAMESIZE+len(lengths)+envelopelen+sum(buffersizes)!=datalen:
+                raise errors.ProtocolError("out-of-band frame sizes don't match the message size")
+            envelope=await reader.readexactly(envelopelen)
+            buffers=[await reader.readexactly(size) for size in buffersizes]
+            MF.checkHmac(flags, [table, lengths, envelope]+buffers, datahmac, connection.macState if connection else None)
+            return msgType, flags, seq, (envelope, buffers)
+        databytes=await reader.readexactly(datalen)
+    except asyncio.IncompleteReadError:
+        raise errors.ConnectionClosedError("receiving: not enough data")
+    except OSError:
+        x=sys.exc_info()[1]
+        raise errors.ConnectionClosedError("receiving: connection lost: "+str(x))
+    MF.checkHmac(flags, databytes, datahmac, connection.macState if connection else None)
+    if flags & MF.FLAGS_STREAMCOMPRESSED == MF.FLAGS_STREAMCOMPRESSED:
+        if connection is None:
+            raise errors.ProtocolError("stream compressed message on a connection without compression streams")
+        databytes=MF.decompressStreamData(connection, databytes)
+        flags &= ~MF.FLAGS_STREAMCOMPRESSED
+    return msgType, flags, seq, databytes
+
+
+class _Connection(object):
+    """the connection of an AsyncProxy: the stream writer, and the compression streams of the connection"""
+    def __init__(self, writer):
+        self.writer=writer
+        self.compressStream=None
+        self.decompressStream=None
+        self.macState=None
+        self.options=None
+        self.handshakeMessage=None
+        self.handshakePending=False
+        self.handles=None
+
+    def send(self, data):
+        if type(data) is list:
+            self.writer.writelines(data)    # message with out-of-band frames
+        else:
+            self.writer.write(data)
+
+
+class AsyncProxy(object):
+    """
+    Pyro proxy for use in asyncio code. Calling a remote method returns a coroutine
+    that has to be awaited to get the result. Calls don't wait for each other:
+    many calls can be in flight at the same time over the single connection of the proxy,
+    the replies are matched with the calls by their sequence number.
+    Methods marked as isasync and batched calls are not supported, use a normal Proxy for those.
+
+    .. automethod:: _pyroBind
+    .. automethod:: _pyroRelease
+    """
+    __pyroAttributes=frozenset(["__getnewargs__", "__getinitargs__", "__aenter__", "__aexit__", "_pyroUri", "_pyroOneway", "_pyroTimeout", "_pyroSeq", "_pyroSerializer", "_pyroCompression"])
+
+    def __init__(self, uri):
+        Pyro4.core._check_hmac()  # check if hmac secret key is set
+        if isinstance(uri, str):
+            uri=Pyro4.core.URI(uri)
+        elif not isinstance(uri, Pyro4.core.URI):
+            raise TypeError("expected Pyro URI")
+        self._pyroUri=uri
+        self._pyroOneway=set()
+        self._pyroTimeout=Pyro4.config.COMMTIMEOUT
+        self._pyroSeq=0    # message sequence number
+        self._pyroSerializer=util.getSerializer(Pyro4.config.SERIALIZER)
+        self._pyroCompression=compression.createCompressor()
+        self.__objectId=None
+        self.__writer=None
+        self.__connection=None
+        self.__readerTask=None
+        self.__pending={}   # sequence number -> asyncio future for the reply of that call
+        self.__connLock=None
+
+    def __getattr__(self, name):
+        if name in AsyncProxy.__pyroAttributes:
+            raise AttributeError(name)
+        return Pyro4.core._RemoteMethod(self._pyroInvoke, name)
+
+    def __repr__(self):
+        connected="connected" if self.__writer else "not connected"
+        return "<%s.%s at 0x%x, %s, for %s>" % (self.__class__.__module__, self.__class__.__name__,
+            id(self), connected, self._pyroUri)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._pyroRelease()
+
+    def _pyroRelease(self):
+        """release the connection to the pyro daemon, calls that are still waiting for a reply will fail"""
+        self.__disconnect(errors.ConnectionClosedError("proxy connection released"))
+
+    async def _pyroBind(self):
+        """
+        Bind this proxy to the exact object from the uri. That means that the proxy's uri
+        will be updated with a direct PYRO uri, if it isn't one yet.
+        If the proxy is already bound, it will not bind again.
+        """
+        return await self.__connect(True)
+
+    async def _pyroInvoke(self, methodname, vargs, kwargs, flags=0, objectId=None):
+        """
+        perform the remote method call communication, returns the result when the reply arrives.
+        The call goes to the object of the proxy, unless another objectId is given.
+        """
+        MF=Pyro4.core.MessageFactory
+        if self.__writer is None:
+            await self.__connect()
+        if methodname in self._pyroOneway:
+            flags |= MF.FLAGS_ONEWAY
+        connection=self.__connection
+        objId=objectId or self.__objectId
+        method=methodname
+        defined=None
+        if connection.handles is not None:
+            objId=connection.handles.encode(objId)
+            method=connection.handles.encode(methodname)
+            if type(objId) is tuple or type(method) is tuple:
+                defined=(objId, method)
+        data, dataflags=MF.serializeData(self._pyroSerializer, (objId, method, vargs, kwargs),
+                                         compress=self._pyroCompression, method=methodname, codecs=connection.options.codecIds)
+        flags |= dataflags
+        seq=self._pyroSeq
+        while True:
+            seq=(seq+1)&0xffff
+            if seq not in self.__pending:
+                break   # don't reuse the sequence number of a call that is still in flight
+        self._pyroSeq=seq
+        MF.sendMessage(connection, MF.MSG_INVOKE, data, flags, seq)
+        del data
+        if not flags & MF.FLAGS_ONEWAY:
+            reply=asyncio.get_event_loop().create_future()
+            self.__pending[seq]=reply
+        try:
+            await connection.writer.drain()
+        except OSError:
+            x=sys.exc_info()[1]
+            self.__pending.pop(seq, None)
+            self.__disconnect(errors.ConnectionClosedError("sending: connection lost: "+str(x)))
+            raise errors.ConnectionClosedError("sending: connection lost: "+str(x))
+        if flags & MF.FLAGS_ONEWAY:
+            return None    # oneway call, no response data
+        try:
+            flags, data = await asyncio.wait_for(reply, self._pyroTimeout or None)
+        except asyncio.TimeoutError:
+            raise errors.TimeoutError("receiving: timeout")
+        finally:
+            self.__pending.pop(seq, None)
+        if defined and not flags & MF.FLAGS_EXCEPTION:
+            connection.handles.confirm(*defined)
+        data=MF.deserializeData(data, flags)
+        if flags & MF.FLAGS_EXCEPTION:
+            if sys.platform=="cli":
+                util.fixIronPythonExceptionForPickle(data, False)
+            raise data
+        if flags & MF.FLAGS_STREAMRESULT:
+            return AsyncStreamResultIterator(data, self)
+        return data
+
+    async def __connect(self, replaceUri=False):
+        """
+        Connects this proxy to the remote Pyro daemon and starts the task that reads the replies.
+        Returns true if a new connection was made, false if an existing one was already present.
+        """
+        MF=Pyro4.core.MessageFactory
+        if self.__connLock is None:
+            self.__connLock=asyncio.Lock()
+        async with self.__connLock:
+            if self.__writer is not None:
+                return False     # already connected
+            loop=asyncio.get_event_loop()
+            uri=self._pyroUri
+            if uri.protocol!="PYRO":
+                # name server lookup is blocking, don't do it in the event loop
+                from Pyro4.naming import resolve  # don't import this globally because of cyclic dependancy
+                uri=await loop.run_in_executor(None, resolve, uri)
+            log.debug("connecting to %s", uri)
+            writer=None
+            try:
+                if uri.sockname:
+                    connect=asyncio.open_unix_connection(uri.sockname)
+                else:
+                    connect=asyncio.open_connection(uri.host, uri.port)
+                reader, writer = await asyncio.wait_for(connect, self._pyroTimeout or None)
+                msgType, flags, seq, data = await asyncio.wait_for(getMessage(reader, None), self._pyroTimeout or None)
+            except Exception:
+                x=sys.exc_info()[1]
+                if writer:
+                    writer.close()
+                err="cannot connect: %s" % x
+                log.error(err)
+                if isinstance(x, errors.CommunicationError):
+                    raise
+                raise errors.CommunicationError(err)
+            if msgType==MF.MSG_CONNECTFAIL:
+                error="connection rejected"
+                if data:
+                    error+=", reason: "+str(data, "utf-8")
+                writer.close()
+                log.error(error)
+                raise errors.CommunicationError(error)
+            elif msgType!=MF.MSG_CONNECTOK:
+                writer.close()
+                err="connect: invalid msg type %d received" % msgType
+                log.error(err)
+                raise errors.ProtocolError(err)
+            self.__objectId=uri.object
+            connection=_Connection(writer)
+            try:
+                Pyro4.core._applyHandshake(connection, data)
+            except errors.CommunicationError:
+                writer.close()
+                raise
+            self._pyroSerializer=Pyro4.core._agreedSerializer(self._pyroSerializer, connection.options)
+            self.__writer=writer
+            self.__connection=connection
+            self.__pending={}
+            self.__readerTask=loop.create_task(self.__readReplies(reader, writer, self.__connection))
+            if replaceUri:
+                log.debug("replacing uri with bound one")
+                self._pyroUri=uri
+            log.debug("connected to %s", self._pyroUri)
+            return True
+
+    async def __readReplies(self, reader, writer, connection):
+        """reads the replies from the connection and hands them to the calls that are waiting for them"""
+        MF=Pyro4.core.MessageFactory
+        try:
+            while True:
+                msgType, flags, seq, data = await getMessage(reader, MF.MSG_RESULT, connection)
+                reply=self.__pending.pop(seq, None)
+                if reply is None:
+                    log.debug("dropping reply for call that is no longer waiting, seq %d", seq)
+                elif not reply.done():
+                    reply.set_result((flags, data))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # connection or protocol error, the reply stream can't be trusted anymore
+            x=sys.exc_info()[1]
+            log.debug("error reading replies: %s", x)
+            if self.__writer is writer:
+                self.__disconnect(x if isinstance(x, errors.CommunicationError) else errors.CommunicationError(str(x)))
+
+    def __disconnect(self, error):
+        writer, self.__writer = self.__writer, None
+        task, self.__readerTask = self.__readerTask, None
+        pending, self.__pending = self.__pending, {}
+        if writer is None:
+            return
+        writer.close()
+        if task is not None and task is not _currentTask():
+            task.cancel()
+        for reply in pending.values():
+            if not reply.done():
+                reply.set_exception(error)
+        log.debug("connection released")
+
+
+class AsyncStreamResultIterator(Pyro4.core._StreamResult):
+    """
+    The result of a remote method that returned an iterator or a generator, iterate over it with async for.
+    Its items are fetched from the daemon when they are needed, in chunks of at most `prefetch` items.
+    Closing it (aclose) before it is exhausted closes the generator in the daemon.
+    """
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._mustFetch():
+            try:
+                items, finished = await self.proxy._pyroInvoke("getNextStreamItems", (self.streamId, self.prefetch), {}, objectId=constants.DAEMON_NAME)
+            except Exception:
+                self._fetchFailed()
+                raise
+            self._fetched(items, finished)
+        return self._nextItem(StopAsyncIteration)
+
+    async def aclose(self):
+        """stop the iteration, the generator in the daemon is closed if it wasn't finished yet"""
+        if self._closing():
+            await self.proxy._pyroInvoke("closeStream", (self.streamId,), {}, objectId=constants.DAEMON_NAME)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+class AsyncDaemon(Pyro4.core.Daemon):
+    """
+    Pyro daemon that serves its objects from an asyncio event loop (regardless of the SERVERTYPE config item).
+    Methods that are coroutine functions are awaited in the event loop, other methods are called
+    in a thread pool so they can't block the loop. Use the serve() coroutine to serve requests
+    on an already running event loop, or requestLoop() to run an event loop in the current thread.
+    """
+    def _createTransportServer(self, servertype):
+        return super(AsyncDaemon, self)._createTransportServer("asyncio")
+
+    async def serve(self):
+        """Serve requests on the running event loop, until the daemon is closed or shut down."""
+        await self.transportServer.serve()
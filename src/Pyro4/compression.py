@@ -0,0 +1,368 @@
+"""
+Compression of the message data, with pluggable codecs.
+
+A codec is a compression algorithm (zlib, bz2, lzma). Its id travels in the header of a
+compressed message, so the other side knows how to decompress it. A Compressor chooses
+the codec and level to compress with. It learns, separately for every remote method,
+which of its candidate codecs actually pays off, and stops compressing for methods
+whose data doesn't get any smaller.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+import logging
+import sys
+import time
+import zlib
+import Pyro4
+from Pyro4 import threadutil
+from Pyro4.errors import ProtocolError
+
+__all__=["Codec", "Compressor", "CompressStream", "DecompressStream", "registerCodec", "getCodec", "getCodecById",
+         "getCodecs", "parseCodecs", "decompress"]
+
+log=logging.getLogger("Pyro4.compression")
+
+try:
+    basestring
+except NameError:
+    basestring=str
+
+_timer=getattr(time, "perf_counter", time.time)
+
+
+class Codec(object):
+    """
+    Base class for the codecs that wrap a certain compression algorithm.
+    The codecId identifies the algorithm in the message header. The levels are
+    the compression levels that a Compressor tries if no level was specified.
+    """
+    codecId=None
+    name=None
+    levels=()
+
+    def compress(self, data, level):
+        """compress the data (bytes) at the given level"""
+        raise NotImplementedError("implement in subclass")
+
+    def decompress(self, data):
+        """decompress the data (bytes)"""
+        raise NotImplementedError("implement in subclass")
+
+    def __repr__(self):
+        return "<%s.%s %r, id %s>" % (self.__class__.__module__, self.__class__.__name__, self.name, self.codecId)
+
+
+class NullCodec(Codec):
+    """A codec that leaves the data as it is. As a candidate of a Compressor, it switches compression off."""
+    name="none"
+    levels=(0,)
+
+    def compress(self, data, level):
+        return data
+
+    def decompress(self, data):
+        return data
+
+
+class ZlibCodec(Codec):
+    """Compresses with zlib. Fast, and it is always available."""
+    codecId=0
+    name="zlib"
+    levels=(1, 6)
+
+    def compress(self, data, level):
+        return zlib.compress(data, level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class Bz2Codec(Codec):
+    """Compresses with bz2. Slower than zlib, but it usually compresses text better."""
+    codecId=1
+    name="bz2"
+    levels=(9,)
+
+    def compress(self, data, level):
+        return self.bz2.compress(data, level)
+
+    def decompress(self, data):
+        return self.bz2.decompress(data)
+
+
+class LzmaCodec(Codec):
+    """Compresses with lzma (Python 3.3+). Slow, but it compresses best."""
+    codecId=2
+    name="lzma"
+    levels=(0,)
+
+    def compress(self, data, level):
+        return self.lzma.compress(data, preset=level)
+
+    def decompress(self, data):
+        return self.lzma.decompress(data)
+
+
+_codecsByName={}
+_codecsById={}
+
+STREAM_CODEC_ID=3      # the message data is compressed with the compression stream of the connection
+
+def registerCodec(codec):
+    """
+    Register a codec instance so that it can be selected by name, and so that messages
+    that were compressed with it can be decompressed. The id must be in the range 0..2.
+    """
+    if codec.codecId is not None and not 0<=codec.codecId<STREAM_CODEC_ID:
+        raise ValueError("codec id must be in the range 0..2")
+    _codecsByName[codec.name]=codec
+    if codec.codecId is not None:
+        _codecsById[codec.codecId]=codec
+
+def getCodec(name):
+    """returns the registered codec with the given name (such as 'zlib' or 'bz2')"""
+    try:
+        return _codecsByName[name]
+    except KeyError:
+        raise ValueError("unknown or unavailable compression codec: %s" % name)
+
+def getCodecById(codecId):
+    """returns the registered codec with the given id, used to decompress a received message"""
+    try:
+        return _codecsById[codecId]
+    except KeyError:
+        raise ProtocolError("unsupported compression codec id %d" % codecId)
+
+def getCodecs():
+    """returns the registered codecs that compress (that have an id), ordered by id"""
+    return [_codecsById[codecId] for codecId in sorted(_codecsById)]
+
+def decompress(data, codecId):
+    """decompresses the data of a received message, that was compressed with the codec with the given id"""
+    return getCodecById(codecId).decompress(data)
+
+def parseCodecs(spec):
+    """
+    Parses a comma separated list of codec names with an optional level, such as ``"zlib:1, bz2"``,
+    into a list of (codec, level) tuples. A codec without a level stands for all its default levels.
+    """
+    candidates=[]
+    for item in spec.split(","):
+        item=item.strip()
+        if not item:
+            continue
+        name, _, level = item.partition(":")
+        codec=getCodec(name.strip())
+        if level:
+            candidates.append((codec, int(level)))
+        else:
+            candidates.extend((codec, level) for level in codec.levels)
+    return candidates
+
+registerCodec(NullCodec())
+registerCodec(ZlibCodec())
+try:
+    import bz2
+    Bz2Codec.bz2=bz2
+    registerCodec(Bz2Codec())
+except ImportError:
+    pass
+try:
+    import lzma
+    LzmaCodec.lzma=lzma
+    registerCodec(LzmaCodec())
+except ImportError:
+    pass
+
+
+class _MethodStats(object):
+    """what a Compressor measured of the candidate codecs, for the data of one method"""
+    __slots__=["choice", "samples", "sizeIn", "sizeOut", "seconds", "countdown", "backoff"]
+
+    def __init__(self, numCandidates):
+        self.choice=None    # index of the chosen candidate, -1 = don't compress, None = still measuring
+        self.samples=0
+        self.sizeIn=[0]*numCandidates
+        self.sizeOut=[0]*numCandidates
+        self.seconds=[0.0]*numCandidates
+        self.countdown=0    # messages until the candidates are measured again
+        self.backoff=1
+
+
+class Compressor(object):
+    """
+    Compresses message data with the candidate codec that pays off best, per method.
+
+    Every candidate (codec, level) is first tried ``probes`` times on the data of a method.
+    The candidate with the lowest cost is then used for the method: the cost of a candidate
+    is its compression time plus the time to send the compressed data at the given bandwidth
+    (bytes per second, the default is about a 100 Mbit network). If no candidate beats sending the data
+    uncompressed, the data of the method isn't compressed at all: on a fast network, zlib only pays off
+    for data that compresses well. The candidates are measured again every ``reprobeInterval``
+    messages, so that the choice follows the data. That interval grows for methods whose data
+    never shrinks (up to ``maxBackoff`` times), those are hardly ever compressed anymore.
+
+    The measurements are kept for at most ``maxMethods`` method names, because the daemon gets the names
+    from its clients. The methods beyond that share a single set of measurements.
+
+    A compressor that isn't adaptive always uses its first candidate.
+    It is thread safe, a proxy or daemon can use it for all connections at the same time.
+    """
+    minSize=200     # smaller data isn't worth compressing
+    probes=3
+    reprobeInterval=1000
+    maxBackoff=64
+    maxMethods=1000
+
+    def __init__(self, codecs="zlib", adaptive=True, bandwidth=10e6):
+        if isinstance(codecs, basestring):
+            codecs=parseCodecs(codecs)
+        self.candidates=list(codecs)
+        self.adaptive=adaptive
+        self.bandwidth=float(bandwidth)
+        self.methods={}     # method name -> _MethodStats, the None key is shared by the methods beyond maxMethods
+        self.lock=threadutil.Lock()
+
+    def __repr__(self):
+        candidates=", ".join("%s:%d" % (codec.name, level) for codec, level in self.candidates)
+        return "<%s.%s at 0x%x, %s>" % (self.__class__.__module__, self.__class__.__name__, id(self), candidates)
+
+    def compress(self, data, method=None, codecs=None):
+        """
+        Compresses the data (bytes) of a message for the given method.
+        If codecs is given, only the codecs with an id in there are used (the ones that the other side supports).
+        Returns the data and the id of the codec that compressed it, or None if it isn't compressed.
+        """
+        if len(data)<self.minSize or not self.candidates:
+            return data, None
+        if not self.adaptive:
+            return self.__compressWith(self.candidates[0], data, codecs)
+        stats=self.methods.get(method)
+        if stats is None:
+            with self.lock:
+                if method not in self.methods and len(self.methods)>=self.maxMethods:
+                    method=None     # too many different names, don't let the table grow without bound
+                stats=self.methods.setdefault(method, _MethodStats(len(self.candidates)))
+        with self.lock:
+            choice=stats.choice
+            if choice is None:
+                candidate=stats.samples%len(self.candidates)
+                stats.samples+=1
+            else:
+                stats.countdown-=1
+                if stats.countdown<=0:
+                    stats.choice=None   # measure the candidates again, from the next message on
+        if choice is not None:
+            if choice<0:
+                return data, None
+            return self.__compressWith(self.candidates[choice], data, codecs)
+        codec, level = self.candidates[candidate]
+        if codecs is not None and codec.codecId is not None and codec.codecId not in codecs:
+            return data, None   # the other side doesn't support this candidate, it isn't measured now
+        start=_timer()
+        compressed=codec.compress(data, level)
+        duration=_timer()-start
+        with self.lock:
+            stats.sizeIn[candidate]+=len(data)
+            stats.sizeOut[candidate]+=min(len(compressed), len(data))
+            stats.seconds[candidate]+=duration
+            if stats.choice is None and stats.samples>=self.probes*len(self.candidates):
+                self.__choose(method, stats)
+        if codec.codecId is not None and len(compressed)<len(data):
+            return compressed, codec.codecId
+        return data, None
+
+    def __compressWith(self, candidate, data, codecs):
+        codec, level = candidate
+        if codec.codecId is None or codecs is not None and codec.codecId not in codecs:
+            return data, None
+        compressed=codec.compress(data, level)
+        if len(compressed)<len(data):
+            return compressed, codec.codecId
+        return data, None
+
+    def __choose(self, method, stats):
+        """choose the cheapest candidate for the method from the measurements, and reset them"""
+        best=-1
+        bestCost=1.0/self.bandwidth     # seconds per byte of data that is sent uncompressed
+        shrinks=False
+        for index, (codec, level) in enumerate(self.candidates):
+            if not stats.sizeIn[index] or codec.codecId is None:
+                continue
+            shrinks|=stats.sizeOut[index]<stats.sizeIn[index]
+            cost=(stats.seconds[index]+stats.sizeOut[index]/self.bandwidth)/stats.sizeIn[index]
+            if cost<bestCost:
+                best, bestCost = index, cost
+        stats.backoff=1 if shrinks else min(stats.backoff*2, self.maxBackoff)
+        stats.countdown=self.reprobeInterval*stats.backoff
+        stats.choice=best
+        stats.samples=0
+        for index in range(len(self.candidates)):
+            stats.sizeIn[index]=stats.sizeOut[index]=0
+            stats.seconds[index]=0.0
+        log.debug("compression for method %s: %s", method, self.candidates[best] if best>=0 else "none")
+
+    def codecFor(self, method):
+        """the (codec, level) that is used for the data of the method, None if it isn't compressed or not chosen yet"""
+        stats=self.methods.get(method)
+        if stats is None or stats.choice is None or stats.choice<0:
+            return None
+        return self.candidates[stats.choice]
+
+#: The compressor that is used when compression is simply switched on (the default zlib level, no adaptation).
+default=Compressor("zlib:6", adaptive=False)
+
+class CompressStream(object):
+    """
+    Compresses all messages that are sent on one connection with a single zlib (deflate) stream.
+    Every message is flushed so that it can be decompressed on its own, but the stream remembers
+    the previous messages. Small messages that look alike (same object, method and argument types)
+    then compress to a fraction of their size, which per-message compression can't do.
+    The messages must be decompressed in the order they were compressed in, so the lock
+    must be held while a message is compressed and sent.
+    The window and memory level are kept small, because every connection has its own stream.
+    """
+    level=6
+    windowBits=13
+    memLevel=6
+
+    def __init__(self):
+        self.lock=threadutil.Lock()
+        self.compressor=zlib.compressobj(self.level, zlib.DEFLATED, -self.windowBits, self.memLevel)
+
+    def compress(self, data):
+        data=self.compressor.compress(data)+self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data[:-4]    # every flushed message ends with the same empty block, the other side adds it again
+
+
+class DecompressStream(object):
+    """Decompresses the messages that were compressed by the CompressStream on the other end of the connection."""
+    flushMarker=bytes(bytearray([0, 0, 0xff, 0xff]))
+
+    def __init__(self):
+        self.decompressor=zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def decompress(self, data, maxSize=0):
+        """
+        Decompresses the data of a message. A message that decompresses to more than maxSize bytes (if given)
+        is a ProtocolError, because a small compressed message can expand to an enormous amount of data.
+        """
+        decompressor=self.decompressor
+        try:
+            result=decompressor.decompress(data, maxSize)
+            if not decompressor.unconsumed_tail:
+                result+=decompressor.decompress(self.flushMarker, maxSize+1-len(result) if maxSize else 0)
+        except zlib.error:
+            raise ProtocolError("invalid data in compression stream: %s" % sys.exc_info()[1])
+        if decompressor.unconsumed_tail or maxSize and len(result)>maxSize:
+            raise ProtocolError("max message size exceeded (decompressed data larger than %d)" % maxSize)
+        return result
+
+
+def createCompressor():
+    """create a compressor as the config items describe, or None if COMPRESSION is off"""
+    if not Pyro4.config.COMPRESSION:
+        return None
+    return Compressor(Pyro4.config.COMPRESSION_CODECS)
@@ -21,7 +21,12 @@ class Configuration(object):
                "THREADPOOL_MINTHREADS", "THREADPOOL_MAXTHREADS",
                "THREADPOOL_IDLETIMEOUT", "HMAC_KEY", "AUTOPROXY",
                "BROADCAST_ADDRS", "NATHOST", "NATPORT", "MAX_MESSAGE_SIZE",
-               "FLAME_ENABLED" )
+               "FLAME_ENABLED", "PIPELINING", "CONNPOOL", "CONNPOOL_MINSIZE",
+               "CONNPOOL_MAXSIZE", "CONNPOOL_IDLETIMEOUT", "SERIALIZER",
+               "OOB_THRESHOLD", "ITER_STREAMING", "ITER_STREAM_PREFETCH",
+               "ITER_STREAM_IDLETIMEOUT", "COMPRESSION_CODECS", "COMPRESSION_STREAM", "MAC_ALGORITHMS",
+               "ONEWAY_THREADS", "ONEWAY_QUEUESIZE", "ONEWAY_OVERFLOW", "ASYNC_THREADS",
+               "PROGRESS_INTERVAL", "BATCH_THREADS" )
 
     def __init__(self):
         self.reset()
@@ -39,6 +44,9 @@ class Configuration(object):
         self.NATHOST = None
         self.NATPORT = 0
         self.COMPRESSION = False
+        self.COMPRESSION_CODECS = "zlib"    # the codecs (and levels) that compressors choose from, per method
+        self.COMPRESSION_STREAM = False     # compress the messages of a connection with a single zlib stream
+        self.SERIALIZER = "pickle"   # serializer that new proxies use for their requests
         self.SERVERTYPE = "thread"
         self.DOTTEDNAMES = False   # server-side
         self.COMMTIMEOUT = 0.0
@@ -46,15 +54,31 @@ class Configuration(object):
         self.SOCK_REUSE = False    # so_reuseaddr on server sockets?
         self.THREADING2 = False    # use threading2 if available?
         self.ONEWAY_THREADED = True     # oneway calls run in their own thread
+        self.ONEWAY_THREADS = 16        # max threads of the pool that runs the oneway calls of a daemon
+        self.ONEWAY_QUEUESIZE = 1000    # max oneway calls waiting for a thread, 0 = no limit
+        self.ONEWAY_OVERFLOW = "block"  # when the oneway queue is full: block, drop or inline
+        self.ASYNC_THREADS = 16     # max threads of the client side pool that runs the async calls and Futures
+        self.PROGRESS_INTERVAL = 0.1  # progress updates of isasync calls are sent at most once per interval (seconds)
+        self.BATCH_THREADS = 16     # max threads of the daemon pool that runs the calls of parallel batches
         self.DETAILED_TRACEBACK = False
         self.THREADPOOL_MINTHREADS = 4
         self.THREADPOOL_MAXTHREADS = 50
         self.THREADPOOL_IDLETIMEOUT = 2.0
         self.HMAC_KEY = None   # must be bytes type
+        self.MAC_ALGORITHMS = "blake2b, hmac-sha1"    # the supported mac algorithms for HMAC_KEY, in order of preference
         self.AUTOPROXY = True
         self.MAX_MESSAGE_SIZE = 0   # 0 = unlimited
+        self.OOB_THRESHOLD = 65536  # buffers of this size or larger are sent out-of-band, 0 = never
         self.BROADCAST_ADDRS = "<broadcast>, 0.0.0.0"   # comma separated list of broadcast addresses
         self.FLAME_ENABLED = False
+        self.PIPELINING = False    # new proxies pipeline their calls over their connection
+        self.CONNPOOL = False      # new proxies borrow a connection from the shared pool for every call
+        self.CONNPOOL_MINSIZE = 0      # idle connections per daemon that are kept regardless of the idle timeout
+        self.CONNPOOL_MAXSIZE = 8      # max idle connections kept per daemon
+        self.CONNPOOL_IDLETIMEOUT = 30.0     # seconds, 0 = keep idle connections forever
+        self.ITER_STREAMING = True     # iterator and generator results are streamed to the client
+        self.ITER_STREAM_PREFETCH = 16     # number of items that the client fetches at a time
+        self.ITER_STREAM_IDLETIMEOUT = 0.0     # seconds, 0 = streams are only closed with their connection
         self.PREFER_IP_VERSION = 4    # 4, 6 or 0 (let OS choose according to RFC 3484)
 
         if useenvironment:
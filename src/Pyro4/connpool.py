@@ -0,0 +1,180 @@
+"""
+Process-wide pool of client connections to Pyro daemons.
+
+Pooled proxies don't own a connection. For every call they borrow one from the pool,
+and give it back after the reply has been received. Connections are kept per daemon
+location, so all proxies for objects in the same daemon share them. The size of the pool
+and how long idle connections are kept are set by the CONNPOOL_* config items.
+When a call has to make a new connection, the pool opens more in the background, until
+CONNPOOL_MINSIZE idle connections are ready for the next calls.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+import logging
+import select
+import socket
+import sys
+import time
+from Pyro4 import threadutil, socketutil
+import Pyro4.core
+
+__all__=["ConnectionPool", "pool"]
+
+log=logging.getLogger("Pyro4.connpool")
+
+
+class _IdleConnection(object):
+    """a connection in the pool, and the time it was given back"""
+    __slots__=["connection", "released"]
+
+    def __init__(self, connection):
+        self.connection=connection
+        self.released=time.time()
+
+
+class ConnectionPool(object):
+    """
+    Keeps the idle connections to Pyro daemons, per daemon location.
+    At most CONNPOOL_MAXSIZE idle connections are kept per location, surplus ones are closed
+    when they are given back. Connections that have been idle for more than CONNPOOL_IDLETIMEOUT
+    seconds are closed as well, except for the last CONNPOOL_MINSIZE ones of each location.
+    When there is no idle connection for a call, a thread opens new ones until there are
+    CONNPOOL_MINSIZE idle connections for the location (see :meth:`prefill`).
+    """
+    def __init__(self):
+        self.lock=threadutil.Lock()
+        self.idle={}    # location -> list of _IdleConnection, most recently used last
+        self.filling=set()  # the locations for which connections are being opened ahead of time
+
+    def __repr__(self):
+        return "<%s at 0x%x, %d idle connections>" % (self.__class__.__name__, id(self), self.idleCount())
+
+    @staticmethod
+    def location(uri):
+        """the key under which the connections to the daemon of the (resolved) uri are kept"""
+        return uri.sockname or (uri.host, uri.port)
+
+    def idleCount(self, uri=None):
+        """number of idle connections in the pool, in total or for the daemon of the given uri"""
+        with self.lock:
+            if uri is not None:
+                return len(self.idle.get(self.location(uri), []))
+            return sum(len(idle) for idle in self.idle.values())
+
+    def acquire(self, uri, timeout):
+        """
+        Borrow a connection to the daemon of the (resolved) uri, for exclusive use until it is given back
+        with :meth:`release`, or closed. Makes a new connection if there is no healthy idle one.
+        """
+        location=self.location(uri)
+        while True:
+            with self.lock:
+                expired=self.__evict()
+                idle=self.idle.get(location)
+                conn=idle.pop().connection if idle else None
+            for oldconn in expired:
+                oldconn.close()
+            if conn is None:
+                break
+            if self.isHealthy(conn):
+                conn.timeout=timeout
+                conn.objectId=uri.object
+                return conn
+            log.debug("discarding stale connection to %s", uri.location)
+            conn.close()
+        conn=Pyro4.core._connect(uri, timeout)
+        if Pyro4.config.CONNPOOL_MINSIZE:
+            # the next calls shouldn't have to wait for a new connection as well
+            with self.lock:
+                startFill=location not in self.filling
+                self.filling.add(location)
+            if startFill:
+                filler=threadutil.Thread(target=self.__fill, args=(uri, timeout))
+                filler.setDaemon(True)
+                filler.start()
+        return conn
+
+    def prefill(self, uri, timeout=None):
+        """
+        Open connections to the daemon of the (resolved) uri ahead of time, until there are
+        CONNPOOL_MINSIZE idle ones. Returns the number of connections that were opened.
+        """
+        location=self.location(uri)
+        wanted=min(Pyro4.config.CONNPOOL_MINSIZE, Pyro4.config.CONNPOOL_MAXSIZE)   # no more than the pool keeps
+        opened=0
+        while True:
+            with self.lock:
+                if len(self.idle.get(location, []))>=wanted:
+                    return opened
+            self.release(uri, Pyro4.core._connect(uri, timeout))
+            opened+=1
+
+    def __fill(self, uri, timeout):
+        try:
+            self.prefill(uri, timeout)
+        except Exception:
+            log.debug("can't open connections ahead of time to %s: %s", uri.location, sys.exc_info()[1])
+        finally:
+            with self.lock:
+                self.filling.discard(self.location(uri))
+
+    def release(self, uri, conn):
+        """give a borrowed connection back, it must be in a clean state (no unread reply data)"""
+        with self.lock:
+            idle=self.idle.setdefault(self.location(uri), [])
+            if len(idle)<Pyro4.config.CONNPOOL_MAXSIZE:
+                idle.append(_IdleConnection(conn))
+                conn=None
+            expired=self.__evict()
+        if conn is not None:
+            conn.close()    # the pool is full
+        for oldconn in expired:
+            oldconn.close()
+
+    def __evict(self):
+        """remove the connections that have been idle for too long, returns them so they can be closed outside the lock"""
+        idletimeout=Pyro4.config.CONNPOOL_IDLETIMEOUT
+        expired=[]
+        if idletimeout:
+            now=time.time()
+            for location, idle in list(self.idle.items()):
+                # the oldest connections are first in the list
+                while len(idle)>Pyro4.config.CONNPOOL_MINSIZE and now-idle[0].released>idletimeout:
+                    expired.append(idle.pop(0).connection)
+                if not idle:
+                    del self.idle[location]
+        return expired
+
+    def clear(self, uri=None):
+        """close all idle connections, or only those to the daemon of the given uri"""
+        with self.lock:
+            if uri is not None:
+                idle=self.idle.pop(self.location(uri), [])
+            else:
+                idle=[conn for conns in self.idle.values() for conn in conns]
+                self.idle={}
+        for conn in idle:
+            conn.connection.close()
+
+    @staticmethod
+    def isHealthy(conn):
+        """
+        An idle connection should have nothing to read. If it has, the daemon has closed the
+        connection (or sent something we didn't ask for) and it can't be used for a new call.
+        """
+        if conn.buffered:
+            return False
+        try:
+            if hasattr(select, "poll"):
+                poll=select.poll()
+                poll.register(conn.fileno(), select.POLLIN | select.POLLPRI)
+                return not poll.poll(0)
+            readable, _, _ = socketutil.selectfunction([conn.sock], [], [], 0)
+            return not readable
+        except (select.error, ValueError, socket.error):
+            return False
+
+
+pool=ConnectionPool()
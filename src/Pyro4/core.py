@@ -6,25 +6,31 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 
 from __future__ import with_statement
 from Pyro4 import constants, threadutil, util, socketutil, errors
-from Pyro4.socketserver.multiplexserver import SocketServer_Select, SocketServer_Poll
+from Pyro4.socketserver.multiplexserver import SocketServer_Select, SocketServer_Poll, SocketServer_Epoll
 from Pyro4.socketserver.threadpoolserver import SocketServer_Threadpool
+from Pyro4.socketserver.hybridserver import SocketServer_HybridSelect, SocketServer_HybridPoll, SocketServer_HybridEpoll
 import concurrent.futures as cfutures
 import Pyro4
+import collections
+import functools
 import hashlib
-import hmac
 import inspect
+import itertools
 import logging
 import os
 import re
+import select
+import socket
 import struct
 import sys
 import time
 import uuid
+import weakref
 try:
     import copyreg
 except ImportError:
     import copy_reg as copyreg
-from Pyro4 import futures
+from Pyro4 import futures, connpool, compression, msgauth, handshake, handles, tpjobqueue
 
 __all__=["URI", "Proxy", "Daemon", "callback", "batch", "async"]
 
@@ -173,6 +179,97 @@ def _check_hmac():
         raise errors.PyroError("HMAC_KEY must be bytes type")
 
 
+def _connect(uri, timeout):
+    """
+    Makes a socket connection to the daemon of the (resolved) uri and does the connection handshake.
+    Returns the connection, or raises a CommunicationError.
+    """
+    conn=None
+    connect_location=uri.sockname if uri.sockname else (uri.host, uri.port)
+    try:
+        sock=socketutil.createSocket(connect=connect_location, reuseaddr=Pyro4.config.SOCK_REUSE, timeout=timeout)
+        conn=socketutil.SocketConnection(sock, uri.object)
+        # Do handshake. For now, no need to send anything.
+        msgType, flags, seq, data = MessageFactory.getMessage(conn, None)
+        # any trailing data (dataLen>0) is an error message, if any
+    except Exception:
+        x=sys.exc_info()[1]
+        if conn:
+            conn.close()
+        err="cannot connect: %s" % x
+        log.error(err)
+        if isinstance(x, errors.CommunicationError):
+            raise
+        else:
+            raise errors.CommunicationError(err)
+    if msgType==MessageFactory.MSG_CONNECTFAIL:
+        error="connection rejected"
+        if data:
+            if sys.version_info>=(3,0):
+                data=str(data,"utf-8")
+            error+=", reason: "+data
+        conn.close()
+        log.error(error)
+        raise errors.CommunicationError(error)
+    elif msgType!=MessageFactory.MSG_CONNECTOK:
+        conn.close()
+        err="connect: invalid msg type %d received" % msgType
+        log.error(err)
+        raise errors.ProtocolError(err)
+    try:
+        _applyHandshake(conn, data)
+    except errors.CommunicationError:
+        conn.close()
+        raise
+    return conn
+
+def _applyHandshake(conn, data):
+    """
+    Sets up the connection of a client with the options that follow from the capabilities that the daemon
+    announced in the handshake (the lines after the "ok"), and the capabilities of the client itself.
+    If the daemon accepts them, the capabilities of the client are sent to it in front of the first request.
+    """
+    if sys.version_info>=(3,0):
+        data=str(data, "utf-8")
+    client=handshake.Capabilities.local()
+    options=handshake.agree(handshake.Capabilities.decode(data.partition("\n")[2]), client, Pyro4.config.COMPRESSION_STREAM)
+    if options.mac is None:
+        raise errors.CommunicationError("no common mac algorithm, the daemon supports: %s" % ",".join(options.daemon.macs))
+    conn.macState=msgauth.MacState([msgauth.getAlgorithm(options.mac)])
+    if "connect" in options.extensions:
+        data=client.encode()
+        if sys.version_info>=(3,0):
+            data=bytes(data, "utf-8")
+        conn.handshakeMessage=MessageFactory.createMessage(MessageFactory.MSG_CONNECT, data, 0, 0, conn.macState)
+    if options.streamCompression:
+        conn.compressStream=compression.CompressStream()
+    if "intern" in options.extensions:
+        conn.handles=handles.ClientHandles()
+    conn.options=options
+
+def _acceptHandshake(conn, data):
+    """Sets up a connection of the daemon with the options that follow from the capabilities that the client sent"""
+    if sys.version_info>=(3,0):
+        data=str(data, "utf-8")
+    conn.handshakePending=False
+    options=handshake.agree(conn.options.daemon, handshake.Capabilities.decode(data), conn.options.wantStreamCompression)
+    if options.mac is None:
+        raise errors.ProtocolError("no common mac algorithm")
+    conn.macState=msgauth.MacState([msgauth.getAlgorithm(options.mac)])
+    if options.streamCompression:
+        conn.compressStream=compression.CompressStream()
+    if "intern" in options.extensions:
+        conn.handles=handles.DaemonHandles()
+    conn.options=options
+
+def _agreedSerializer(serializer, options):
+    """returns the serializer if the daemon supports it, the pickle serializer otherwise"""
+    if serializer.name in options.serializers:
+        return serializer
+    log.warning("the daemon doesn't support the %s serializer, using pickle", serializer.name)
+    return util.getSerializer(util.PickleSerializer.name)
+
+
 class Proxy(object):
     """
     Pyro proxy for a remote object. Intercepts method calls and dispatches them to the remote object.
@@ -183,14 +280,17 @@ class Proxy(object):
     .. automethod:: _pyroBatch
     .. automethod:: _pyroAsync
     """
-    _pyroSerializer=util.Serializer()
-    __pyroAttributes=frozenset(["__getnewargs__", "__getinitargs__", "_pyroConnection", "_pyroFutureDaemon", "_pyroUri", "_pyroOneway", "_pyroAsyncs", "_pyroTimeout", "_pyroSeq"])
+    __pyroAttributes=frozenset(["__getnewargs__", "__getinitargs__", "_pyroConnection", "_pyroFutureDaemon", "_pyroUri", "_pyroOneway", "_pyroAsyncs", "_pyroTimeout", "_pyroSeq", "_pyroPipelined", "_pyroPooled", "_pyroSerializer", "_pyroCompression"])
 
     def __init__(self, uri):
         """
         .. autoattribute:: _pyroOneway
         .. autoattribute:: _pyroAsyncs
         .. autoattribute:: _pyroTimeout
+        .. autoattribute:: _pyroPipelined
+        .. autoattribute:: _pyroPooled
+        .. autoattribute:: _pyroSerializer
+        .. autoattribute:: _pyroCompression
         """
         _check_hmac()  # check if hmac secret key is set
         if isinstance(uri, basestring):
@@ -198,11 +298,18 @@ class Proxy(object):
         elif not isinstance(uri, URI):
             raise TypeError("expected Pyro URI")
         self._pyroUri=uri
+        self.__pyroReader=None
+        self.__pyroPoolUri=None     # resolved uri, when the proxy borrows its connections from the pool
+        self.__pyroCodecs=None      # ids of the compression codecs that the daemon supports
         self._pyroConnection=None
         self._pyroFutureDaemon=None
         self._pyroOneway=set()
         self._pyroAsyncs=set()
         self._pyroSeq=0    # message sequence number
+        self._pyroPipelined=Pyro4.config.PIPELINING
+        self._pyroPooled=Pyro4.config.CONNPOOL
+        self._pyroSerializer=util.getSerializer(Pyro4.config.SERIALIZER)
+        self._pyroCompression=compression.createCompressor()
         self.__pyroTimeout=Pyro4.config.COMMTIMEOUT
         self.__pyroLock=threadutil.Lock()
         self.__pyroConnLock=threadutil.Lock()
@@ -210,8 +317,6 @@ class Proxy(object):
     def __del__(self):
         if hasattr(self, "_pyroConnection"):
             self._pyroRelease()
-        if hasattr(self, "_pyroFutureDaemon") and self._pyroFutureDaemon:
-            self._pyroFutureDaemon.shutdown()
 
     def __getattr__(self, name):
         if name in Proxy.__pyroAttributes:
@@ -220,7 +325,7 @@ class Proxy(object):
         return _RemoteMethod(self._pyroInvoke, name)
 
     def __repr__(self):
-        connected="connected" if self._pyroConnection else "not connected"
+        connected="connected" if self._pyroConnection or self.__pyroPoolUri else "not connected"
         return "<%s.%s at 0x%x, %s, for %s>" % (self.__class__.__module__, self.__class__.__name__,
             id(self), connected, self._pyroUri)
 
@@ -232,9 +337,15 @@ class Proxy(object):
 
     def __setstate__(self, state):
         self._pyroUri, self._pyroOneway, self._pyroAsyncs, self._pyroSerializer, self.__pyroTimeout = state
+        self.__pyroReader=None
+        self.__pyroPoolUri=None
+        self.__pyroCodecs=None
         self._pyroConnection=None 
         self._pyroFutureDaemon=None
         self._pyroSeq=0
+        self._pyroPipelined=Pyro4.config.PIPELINING
+        self._pyroPooled=Pyro4.config.CONNPOOL
+        self._pyroCompression=compression.createCompressor()
         self.__pyroLock=threadutil.Lock()
         self.__pyroConnLock=threadutil.Lock()
 
@@ -270,7 +381,16 @@ class Proxy(object):
     def _pyroRelease(self):
         """release the connection to the pyro daemon"""
         with self.__pyroConnLock:
+            self.__pyroPoolUri=None     # borrowed connections go back to the pool when their call is done
             if self._pyroConnection is not None:
+                if self.__pyroReader is not None:
+                    # fail the calls that are still waiting for a reply, and wake up the reader thread
+                    self.__pyroReader.stop(errors.ConnectionClosedError("proxy connection released"))
+                    self.__pyroReader=None
+                    try:
+                        self._pyroConnection.sock.shutdown(socket.SHUT_RDWR)
+                    except socket.error:
+                        pass
                 self._pyroConnection.close()
                 self._pyroConnection=None
                 log.debug("connection released")
@@ -292,57 +412,210 @@ class Proxy(object):
             self._pyroConnection.timeout=timeout
     _pyroTimeout=property(__pyroGetTimeout, __pyroSetTimeout)
 
-    def _pyroInvoke(self, methodname, vargs, kwargs, flags=0):
-        """perform the remote method call communication"""
-        if self._pyroConnection is None:
+    def _pyroInvoke(self, methodname, vargs, kwargs, flags=0, objectId=None):
+        """
+        perform the remote method call communication.
+        The call goes to the object of the proxy, unless another objectId is given
+        (for instance the daemon's own object, over the same connection).
+        """
+        if self._pyroConnection is None and self.__pyroPoolUri is None:
             # rebind here, don't do it from inside the invoke because deadlock will occur
             self.__pyroCreateConnection()
+        poolUri=self.__pyroPoolUri
         if methodname in self._pyroAsyncs:
             flags |= MessageFactory.FLAGS_ASYNC
             future = futures.ClientFuture(self)
-            # daemon needed to register the special asynchronous calls
-            if not self._pyroFutureDaemon:
-                self.__pyroCreateFutureDaemon()
-            self._pyroFutureDaemon.register(future)
-            logging.debug("Going to send client future %s", self._pyroFutureDaemon.uriFor(future))
-            vargs = (future,) + vargs # special way to send the future
-        data, compressed=self._pyroSerializer.serialize(
-            (self._pyroConnection.objectId, methodname, vargs, kwargs),
-            compress=Pyro4.config.COMPRESSION)
-        if compressed:
-            flags |= MessageFactory.FLAGS_COMPRESSED
+            reader=None
+            if poolUri is None and "completions" in self._pyroConnection.options.extensions:
+                reader=self.__pyroCompletionReader()
+            if reader is not None:
+                # the daemon sends the outcome back on this connection, the reader thread delivers it
+                vargs = (reader.addFuture(future),) + vargs
+            else:
+                # the daemon that runs the call reports the outcome to the shared future daemon of this process
+                self._pyroFutureDaemon=_futureDaemon()
+                futureProxy=self._pyroFutureDaemon.registerFuture(future)
+                log.debug("Going to send client future %s", future._pyroId)
+                vargs = (futureProxy,) + vargs # special way to send the future
+        if poolUri is not None:
+            conn=connpool.pool.acquire(poolUri, self.__pyroTimeout)
+            objId=objectId or poolUri.object
+        else:
+            conn=self._pyroConnection
+            objId=objectId or conn.objectId
+        method=methodname
+        defined=None
+        if conn.handles is not None:
+            # the object id and method name are sent as compact handles, once the daemon knows them
+            objId=conn.handles.encode(objId)
+            method=conn.handles.encode(methodname)
+            if type(objId) is tuple or type(method) is tuple:
+                defined=(objId, method)     # confirmed by a successful reply
+        try:
+            data, dataflags=MessageFactory.serializeData(self._pyroSerializer, (objId, method, vargs, kwargs),
+                compress=self._pyroCompression, method=methodname, codecs=self.__pyroCodecs)
+        except:
+            if poolUri is not None:
+                connpool.pool.release(poolUri, conn)
+            raise
+        flags |= dataflags
         if methodname in self._pyroOneway:
             flags |= MessageFactory.FLAGS_ONEWAY
+        if poolUri is not None:
+            return self.__pyroInvokePooled(poolUri, conn, data, flags, future if flags & MessageFactory.FLAGS_ASYNC else None, defined)
+        reader=self.__pyroReader
+        if reader is not None:
+            return self.__pyroInvokePipelined(reader, data, flags, future if flags & MessageFactory.FLAGS_ASYNC else None, defined)
         with self.__pyroLock:
-            self._pyroSeq=(self._pyroSeq+1)&0xffff
-            data=MessageFactory.createMessage(MessageFactory.MSG_INVOKE, data, flags, self._pyroSeq)
-            try:
-                self._pyroConnection.send(data)
-                del data  # invite GC to collect the object, don't wait for out-of-scope
-                if flags & MessageFactory.FLAGS_ONEWAY:
-                    return None    # oneway call, no response data
-                # TODO methods marked both oneway and isasync should returning an ImmediateFuture with None as result
-                elif flags & MessageFactory.FLAGS_ASYNC:
-                    return future
-                else:
-                    msgType, flags, seq, data = MessageFactory.getMessage(self._pyroConnection, MessageFactory.MSG_RESULT)
-                    self.__pyroCheckSequence(seq)
-                    data=self._pyroSerializer.deserialize(data, compressed=flags & MessageFactory.FLAGS_COMPRESSED)
-                    if flags & MessageFactory.FLAGS_EXCEPTION:
-                        if sys.platform=="cli":
-                            util.fixIronPythonExceptionForPickle(data, False)
-                        raise data
+            reader=self.__pyroReader
+            if reader is None:
+                self._pyroSeq=(self._pyroSeq+1)&0xffff
+                try:
+                    MessageFactory.sendMessage(self._pyroConnection, MessageFactory.MSG_INVOKE, data, flags, self._pyroSeq)
+                    del data  # invite GC to collect the object, don't wait for out-of-scope
+                    if flags & MessageFactory.FLAGS_ONEWAY:
+                        return None    # oneway call, no response data
+                    # TODO methods marked both oneway and isasync should returning an ImmediateFuture with None as result
+                    elif flags & MessageFactory.FLAGS_ASYNC:
+                        return future
                     else:
-                        return data
-            except (errors.CommunicationError, KeyboardInterrupt):
-                # Communication error during read. To avoid corrupt transfers, we close the connection.
-                # Otherwise we might receive the previous reply as a result of a new methodcall!
-                # Special case for keyboardinterrupt: people pressing ^C to abort the client
-                # may be catching the keyboardinterrupt in their code. We should probably be on the
-                # safe side and release the proxy connection in this case too, because they might
-                # be reusing the proxy object after catching the exception...
-                self._pyroRelease()
+                        msgType, flags, seq, data = MessageFactory.getMessage(self._pyroConnection, MessageFactory.MSG_RESULT)
+                        self.__pyroCheckSequence(seq)
+                        if defined and not flags & MessageFactory.FLAGS_EXCEPTION:
+                            self._pyroConnection.handles.confirm(*defined)
+                        return self.__pyroResult(data, flags)
+                except (errors.CommunicationError, KeyboardInterrupt):
+                    # Communication error during read. To avoid corrupt transfers, we close the connection.
+                    # Otherwise we might receive the previous reply as a result of a new methodcall!
+                    # Special case for keyboardinterrupt: people pressing ^C to abort the client
+                    # may be catching the keyboardinterrupt in their code. We should probably be on the
+                    # safe side and release the proxy connection in this case too, because they might
+                    # be reusing the proxy object after catching the exception...
+                    self._pyroRelease()
+                    raise
+        # an isasync call started a reader thread for its completions while we were waiting for the lock
+        return self.__pyroInvokePipelined(reader, data, flags, future if flags & MessageFactory.FLAGS_ASYNC else None, defined)
+
+    def __pyroInvokePipelined(self, reader, data, flags, future, defined):
+        """
+        Send the call on the pipelined connection and wait for the reader thread to hand us the reply.
+        Other threads can send their calls while we're waiting.
+        """
+        flags |= MessageFactory.FLAGS_PIPELINED
+        with self.__pyroLock:
+            seq=self._pyroSeq
+            while True:
+                seq=(seq+1)&0xffff
+                if not reader.isWaitingFor(seq):
+                    break   # don't reuse the sequence number of a call that is still in flight
+            self._pyroSeq=seq
+            reply=None
+            try:
+                if not flags & (MessageFactory.FLAGS_ONEWAY | MessageFactory.FLAGS_ASYNC):
+                    reply=reader.expect(seq)
+                MessageFactory.sendMessage(reader.connection, MessageFactory.MSG_INVOKE, data, flags, seq)
+                del data
+            except errors.CommunicationError:
+                # the connection is broken, we can't trust the message stream anymore
+                reader.forget(seq)
+                self.__pyroReleasePipeline(reader)
                 raise
+        if flags & MessageFactory.FLAGS_ONEWAY:
+            return None    # oneway call, no response data
+        elif flags & MessageFactory.FLAGS_ASYNC:
+            return future
+        try:
+            reply.event.wait(self.__pyroTimeout or None)
+        except KeyboardInterrupt:
+            reader.forget(seq)
+            raise
+        if not reply.event.isSet():
+            # the reply may still arrive later, the reader will drop it. The connection stays usable.
+            reader.forget(seq)
+            raise errors.TimeoutError("receiving: timeout")
+        if reply.error is not None:
+            self.__pyroReleasePipeline(reader)
+            raise reply.error
+        if defined and not reply.flags & MessageFactory.FLAGS_EXCEPTION:
+            reader.connection.handles.confirm(*defined)
+        return self.__pyroResult(reply.data, reply.flags)
+
+    def __pyroInvokePooled(self, uri, conn, data, flags, future, defined):
+        """
+        Make the call on a connection that was borrowed from the pool for the duration of the call.
+        Calls from other threads don't wait for this one, they borrow their own connection.
+        """
+        with self.__pyroLock:
+            self._pyroSeq=(self._pyroSeq+1)&0xffff
+            seq=self._pyroSeq
+        try:
+            MessageFactory.sendMessage(conn, MessageFactory.MSG_INVOKE, data, flags, seq)
+            del data
+            if not flags & (MessageFactory.FLAGS_ONEWAY | MessageFactory.FLAGS_ASYNC):
+                msgType, replyflags, replyseq, data = MessageFactory.getMessage(conn, MessageFactory.MSG_RESULT)
+                if replyseq!=seq:
+                    err="invoke: reply sequence out of sync, got %d expected %d" % (replyseq, seq)
+                    log.error(err)
+                    raise errors.ProtocolError(err)
+                if defined and not replyflags & MessageFactory.FLAGS_EXCEPTION:
+                    conn.handles.confirm(*defined)
+            if flags & MessageFactory.FLAGS_ONEWAY:
+                connpool.pool.release(uri, conn)
+                return None    # oneway call, no response data
+            elif flags & MessageFactory.FLAGS_ASYNC:
+                connpool.pool.release(uri, conn)
+                return future
+            if replyflags & MessageFactory.FLAGS_STREAMRESULT:
+                # the daemon keeps the stream as long as this connection, it stays borrowed until the stream is done
+                streamId=MessageFactory.deserializeData(data, replyflags)
+                return _StreamResultIterator(streamId, self.__pyroPinnedCopy(conn), uri)
+        except:
+            # we can't be sure about the state of the message stream, don't give the connection back
+            conn.close()
+            raise
+        connpool.pool.release(uri, conn)
+        return self.__pyroResult(data, replyflags)
+
+    def __pyroPinnedCopy(self, conn):
+        """a copy of this proxy that makes its calls over the given connection, that it owns"""
+        proxy=self.__copy__()
+        proxy._pyroPooled=False
+        proxy._pyroPipelined=False
+        proxy._pyroSerializer=self._pyroSerializer
+        proxy._pyroTimeout=self.__pyroTimeout
+        proxy._pyroConnection=conn
+        return proxy
+
+    def __pyroResult(self, data, flags):
+        """
+        Returns the result from the data of a reply message, or raises the exception that it contains.
+        An iterator or generator result is returned as an iterator that fetches its items from the daemon.
+        """
+        data=MessageFactory.deserializeData(data, flags)
+        if flags & MessageFactory.FLAGS_EXCEPTION:
+            if sys.platform=="cli":
+                util.fixIronPythonExceptionForPickle(data, False)
+            raise data
+        if flags & MessageFactory.FLAGS_STREAMRESULT:
+            return _StreamResultIterator(data, self)
+        return data
+
+    def __pyroReleasePipeline(self, reader):
+        """release the connection if it still is the one of the given (broken) pipeline"""
+        if self.__pyroReader is reader:
+            self._pyroRelease()
+
+    def __pyroCompletionReader(self):
+        """
+        Returns the reader thread of the connection, that delivers the outcome of the isasync calls
+        (the "completions" extension). It is started for the first such call, the calls of the proxy
+        then go through it like pipelined calls.
+        """
+        with self.__pyroLock:
+            if self.__pyroReader is None and self._pyroConnection is not None:
+                self.__pyroReader=_PipelineReader(self._pyroConnection)
+                self.__pyroReader.start()
+            return self.__pyroReader
 
     def _pyroCancelFuture(self, client_future_uri):
         """
@@ -352,18 +625,6 @@ class Proxy(object):
         # Cannot use just the future because it might already be unregistered
         return self._pyroInvoke("", (client_future_uri, ), None, MessageFactory.FLAGS_ASYNC_CANCEL)
 
-    def __pyroCreateFutureDaemon(self):
-        """
-        Find or create a pyro4 daemon
-        """
-        # TODO try to reuse a daemon if there is already one running in the process
-        # looking for _pyroDaemon is useless, because a proxy is never registered
-        self._pyroFutureDaemon = Daemon()
-        thread_daemon = threadutil.Thread(name="Pyro4 daemon for async calls",
-                                          target=self._pyroFutureDaemon.requestLoop)
-        thread_daemon.setDaemon(True)
-        thread_daemon.start()
-
     def __pyroCheckSequence(self, seq):
         if seq!=self._pyroSeq:
             err="invoke: reply sequence out of sync, got %d expected %d" % (seq, self._pyroSeq)
@@ -374,57 +635,36 @@ class Proxy(object):
         """
         Connects this proxy to the remote Pyro daemon. Does connection handshake.
         Returns true if a new connection was made, false if an existing one was already present.
+        A pooled proxy doesn't keep the connection, it gives it to the pool for its calls to borrow.
         """
         with self.__pyroConnLock:
-            if self._pyroConnection is not None:
+            if self._pyroConnection is not None or self.__pyroPoolUri is not None:
                 return False     # already connected
             from Pyro4.naming import resolve  # don't import this globally because of cyclic dependancy
             uri=resolve(self._pyroUri)
-            # socket connection (normal or Unix domain socket)
-            conn=None
             log.debug("connecting to %s", uri)
-            connect_location=uri.sockname if uri.sockname else (uri.host, uri.port)
-            with self.__pyroLock:
-                try:
+            if self._pyroPooled and not self._pyroPipelined:
+                # this also checks that the daemon can be reached
+                conn=connpool.pool.acquire(uri, self.__pyroTimeout)
+                connpool.pool.release(uri, conn)
+                self.__pyroPoolUri=uri
+            else:
+                with self.__pyroLock:
                     if self._pyroConnection is not None:
                         return False    # already connected
-                    sock=socketutil.createSocket(connect=connect_location, reuseaddr=Pyro4.config.SOCK_REUSE, timeout=self.__pyroTimeout)
-                    conn=socketutil.SocketConnection(sock, uri.object)
-                    # Do handshake. For now, no need to send anything.
-                    msgType, flags, seq, data = MessageFactory.getMessage(conn, None)
-                    # any trailing data (dataLen>0) is an error message, if any
-                except Exception:
-                    x=sys.exc_info()[1]
-                    if conn:
-                        conn.close()
-                    err="cannot connect: %s" % x
-                    log.error(err)
-                    if isinstance(x, errors.CommunicationError):
-                        raise
-                    else:
-                        raise errors.CommunicationError(err)
-                else:
-                    if msgType==MessageFactory.MSG_CONNECTFAIL:
-                        error="connection rejected"
-                        if data:
-                            if sys.version_info>=(3,0):
-                                data=str(data,"utf-8")
-                            error+=", reason: "+data
-                        conn.close()
-                        log.error(error)
-                        raise errors.CommunicationError(error)
-                    elif msgType==MessageFactory.MSG_CONNECTOK:
-                        self._pyroConnection=conn
-                        if replaceUri:
-                            log.debug("replacing uri with bound one")
-                            self._pyroUri=uri
-                        log.debug("connected to %s", self._pyroUri)
-                        return True
-                    else:
-                        conn.close()
-                        err="connect: invalid msg type %d received" % msgType
-                        log.error(err)
-                        raise errors.ProtocolError(err)
+                    conn=_connect(uri, self.__pyroTimeout)
+                    if self._pyroPipelined:
+                        self.__pyroReader=_PipelineReader(conn)
+                        self.__pyroReader.start()
+                    self._pyroConnection=conn
+            # use what the daemon supports, the pooled connections to it all agreed on the same options
+            self._pyroSerializer=_agreedSerializer(self._pyroSerializer, conn.options)
+            self.__pyroCodecs=conn.options.codecIds
+            if replaceUri:
+                log.debug("replacing uri with bound one")
+                self._pyroUri=uri
+            log.debug("connected to %s", self._pyroUri)
+            return True
 
     def _pyroReconnect(self, tries=100000000):
         """(re)connect the proxy to the daemon containing the pyro object which the proxy is for"""
@@ -449,11 +689,268 @@ class Proxy(object):
         """returns a helper class that lets you do asynchronous method calls on the proxy"""
         return _AsyncProxyAdapter(self)
 
-    def _pyroInvokeBatch(self, calls, oneway=False):
+    def _pyroInvokeBatch(self, calls, oneway=False, parallel=False, stream=False):
         flags=MessageFactory.FLAGS_BATCH
         if oneway:
             flags|=MessageFactory.FLAGS_ONEWAY
-        return self._pyroInvoke("<batch>", calls, None, flags)
+        kwargs={}
+        # older daemons ignore these, they run the calls one after the other and return all results at once
+        if parallel:
+            kwargs["parallel"]=0 if parallel is True else int(parallel)
+        if stream and not oneway:
+            kwargs["stream"]=Pyro4.config.ITER_STREAM_PREFETCH if stream is True else max(1, int(stream))
+        results=self._pyroInvoke("<batch>", calls, kwargs or None, flags)
+        if isinstance(results, _StreamResultIterator):
+            results.prefetch=kwargs["stream"]   # fetch the results in the chunks that the daemon runs them in
+        return results
+
+
+class _StreamResult(object):
+    """
+    The result of a remote method that returned an iterator or a generator.
+    Its items are fetched from the daemon when they are needed, in chunks of at most
+    `prefetch` items, so the remote generator only runs as far as the client consumes it.
+    Closing it before it is exhausted closes the generator in the daemon.
+    This is the bookkeeping that _StreamResultIterator and aio.AsyncStreamResultIterator share,
+    they make the calls to the daemon.
+    """
+    def __init__(self, streamId, proxy):
+        self.streamId=streamId
+        self.proxy=proxy
+        self.prefetch=Pyro4.config.ITER_STREAM_PREFETCH
+        self.items=collections.deque()
+        self.finished=False
+
+    def _mustFetch(self):
+        """must the next items be fetched from the daemon? (there are none left, and the stream isn't finished)"""
+        return not self.items and not self.finished
+
+    def _fetched(self, items, finished):
+        self.items.extend(items)
+        if finished:
+            self.finished=True
+            self._done()
+
+    def _fetchFailed(self):
+        self.finished=True    # the daemon has discarded the stream
+        self._done()
+
+    def _nextItem(self, stop):
+        """returns the next item that was fetched, raises the stop exception if there are none"""
+        if not self.items:
+            raise stop
+        return self.items.popleft()
+
+    def _closing(self):
+        """stops the iteration, returns whether the stream must still be closed in the daemon"""
+        self.items.clear()
+        if self.finished:
+            return False
+        self.finished=True
+        return True
+
+    def _done(self):
+        """called when the daemon doesn't have the stream anymore"""
+        pass
+
+
+class _StreamResultIterator(_StreamResult):
+    """
+    The iterator that a proxy returns for an iterator or generator result, see _StreamResult.
+    A pooled proxy borrows the connection of the call from the pool for the life of the stream (poolUri is
+    its pool location then), because the daemon closes the stream when that connection is closed.
+    """
+    def __init__(self, streamId, proxy, poolUri=None):
+        super(_StreamResultIterator, self).__init__(streamId, proxy)
+        self.poolUri=poolUri
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._mustFetch():
+            try:
+                items, finished = self.proxy._pyroInvoke("getNextStreamItems", (self.streamId, self.prefetch), {}, objectId=constants.DAEMON_NAME)
+            except Exception:
+                self._fetchFailed()
+                raise
+            self._fetched(items, finished)
+        return self._nextItem(StopIteration)
+
+    next=__next__    # Python 2.x
+
+    def close(self):
+        """stop the iteration, the generator in the daemon is closed if it wasn't finished yet"""
+        if self._closing():
+            try:
+                self.proxy._pyroInvoke("closeStream", (self.streamId,), {}, objectId=constants.DAEMON_NAME)
+            finally:
+                self._done()
+
+    def _done(self):
+        if self.poolUri is not None:
+            # give the connection back to the pool, unless a failed call has closed it already
+            conn, self.proxy._pyroConnection = self.proxy._pyroConnection, None
+            if conn is not None:
+                connpool.pool.release(self.poolUri, conn)
+            self.poolUri=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _PipelinedReply(object):
+    """the reply to a call on a pipelined connection, that a calling thread is waiting for"""
+    __slots__=["event", "flags", "data", "error"]
+
+    def __init__(self):
+        self.event=threadutil.Event()
+        self.flags=0
+        self.data=None
+        self.error=None
+
+
+class _PipelineReader(threadutil.Thread):
+    """
+    Reads the replies that arrive on a pipelined proxy connection, and hands them
+    to the threads that are waiting for them. Replies are matched by sequence number,
+    so they can arrive in any order.
+    It also delivers the FUTURE messages with the outcome of isasync calls to their futures.
+    That happens on the shared executor (see Pyro4.futures.submit), in the order of the messages,
+    so that the callbacks of the futures can make calls on the proxy themselves.
+    """
+    def __init__(self, connection):
+        super(_PipelineReader, self).__init__(name="Pyro4 pipeline reader")
+        self.setDaemon(True)
+        self.connection=connection
+        self.lock=threadutil.Lock()
+        self.waiting={}    # sequence number -> _PipelinedReply
+        self.futures={}    # future id -> ClientFuture
+        self.futureIds=itertools.count()
+        self.deliveries=collections.deque()
+        self.delivering=False
+        self.error=None
+
+    def addFuture(self, future):
+        """register the future of an isasync call, returns the id that is sent in its place"""
+        futureId=next(self.futureIds)
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self.futures[futureId]=future
+        future._completionId=futureId
+        return futureId
+
+    def expect(self, seq):
+        """register a call that waits for the reply with the given sequence number"""
+        reply=_PipelinedReply()
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self.waiting[seq]=reply
+        return reply
+
+    def isWaitingFor(self, seq):
+        return seq in self.waiting
+
+    def forget(self, seq):
+        """the call is no longer waiting for its reply (timeout), if it still arrives it is dropped"""
+        with self.lock:
+            self.waiting.pop(seq, None)
+
+    def run(self):
+        try:
+            if hasattr(select, "poll"):
+                poll=select.poll()
+                poll.register(self.connection.fileno(), select.POLLIN | select.POLLPRI)
+                waitForData=poll.poll
+            else:
+                sock=self.connection.sock
+                waitForData=lambda: socketutil.selectfunction([sock], [], [])
+            while True:
+                # wait without a timeout for the next reply, the callers do their own timeouts.
+                # Replies that were received together with the previous one are already in the buffer.
+                if not self.connection.buffered:
+                    waitForData()
+                msgType, flags, seq, data = MessageFactory.getMessage(self.connection, None)
+                if msgType==MessageFactory.MSG_FUTURE:
+                    self.__futureMessage(data, flags)
+                    continue
+                if msgType!=MessageFactory.MSG_RESULT:
+                    raise errors.ProtocolError("invalid msg type %d received" % msgType)
+                with self.lock:
+                    reply=self.waiting.pop(seq, None)
+                if reply is None:
+                    log.debug("dropping reply seq %d, no call is waiting for it", seq)
+                    continue
+                reply.flags=flags
+                reply.data=data
+                del data
+                reply.event.set()
+        except Exception:
+            x=sys.exc_info()[1]
+            log.debug("pipeline reader stops: %r", x)
+            if not isinstance(x, (errors.CommunicationError, errors.SecurityError)):
+                x=errors.ConnectionClosedError("receiving: connection lost: %s" % x)
+            self.stop(x)
+
+    def stop(self, error):
+        """fail all calls that are still waiting for their reply, and refuse new ones"""
+        with self.lock:
+            if self.error is None:
+                self.error=error
+            waiting, self.waiting = self.waiting, {}
+            pending, self.futures = self.futures, {}
+        for reply in waiting.values():
+            reply.error=self.error
+            reply.event.set()
+        for future in pending.values():
+            self.__deliver(future.set_exception, self.error)
+
+    def __futureMessage(self, data, flags):
+        # a FUTURE message holds one or more (future id, kind, value) entries
+        for futureId, kind, value in MessageFactory.deserializeData(data, flags):
+            with self.lock:
+                if kind=="progress":
+                    future=self.futures.get(futureId)
+                else:
+                    future=self.futures.pop(futureId, None)
+            if future is None:
+                log.debug("dropping %s of unknown future %s", kind, futureId)
+            elif kind=="result":
+                self.__deliver(future.set_result, value)
+            elif kind=="exception":
+                self.__deliver(future.set_exception, value)
+            elif kind=="cancelled":
+                self.__deliver(future.set_cancelled)
+            elif kind=="progress":
+                self.__deliver(future.set_progress, *value)
+            else:
+                raise errors.ProtocolError("invalid future message kind: %s" % kind)
+
+    def __deliver(self, method, *args):
+        """call a method of a future on the executor, after the ones that were delivered before"""
+        with self.lock:
+            self.deliveries.append((method, args))
+            if self.delivering:
+                return
+            self.delivering=True
+        futures.submit(self.__deliverAll)
+
+    def __deliverAll(self):
+        while True:
+            with self.lock:
+                if not self.deliveries:
+                    self.delivering=False
+                    return
+                method, args = self.deliveries.popleft()
+            try:
+                method(*args)
+            except Exception:
+                log.exception("error delivering the outcome of a future")
 
 
 class _BatchedRemoteMethod(object):
@@ -498,23 +995,40 @@ class _BatchProxyAdapter(object):
             else:
                 yield result   # it is a regular result object, yield that and continue.
 
-    def __call__(self, oneway=False, async=False):
+    def __call__(self, oneway=False, async=False, parallel=False, stream=False):
+        """
+        Execute the batch. With parallel, the daemon runs the calls at the same time instead of one after the other,
+        at most parallel of them if it is a number (True = as many as the daemon allows). They must not depend on each
+        other. The results and exceptions still come back in the order of the calls, and an exception doesn't stop
+        the calls after it.
+        With stream, the results are fetched from the daemon in chunks while the generator is consumed, of stream
+        results if it is a number (True = ITER_STREAM_PREFETCH). The daemon runs the calls of a chunk when the
+        client asks for it, so it doesn't hold the results of the whole batch.
+        """
         if oneway and async:
             raise errors.PyroError("async oneway calls make no sense")
         if async:
-            return _AsyncRemoteMethod(self, "<asyncbatch>")()
+            return _AsyncRemoteMethod(self, "<asyncbatch>")(parallel, stream)
         else:
-            results=self.__proxy._pyroInvokeBatch(self.__calls, oneway)
+            results=self.__invokeBatch(oneway, parallel, stream)
             self.__calls=[]   # clear for re-use
             if not oneway:
                 return self.__resultsgenerator(results)
 
     def _pyroInvoke(self,name,args,kwargs):
-        # ignore all parameters, we just need to execute the batch
-        results=self.__proxy._pyroInvokeBatch(self.__calls)
+        # ignore the name, we just need to execute the batch (args holds the parallel and stream arguments)
+        results=self.__invokeBatch(False, *args)
         self.__calls=[]   # clear for re-use
         return self.__resultsgenerator(results)
 
+    def __invokeBatch(self, oneway, parallel=False, stream=False):
+        # only pass the arguments that are used, proxies may override _pyroInvokeBatch without them
+        if stream:
+            return self.__proxy._pyroInvokeBatch(self.__calls, oneway, parallel, stream)
+        if parallel:
+            return self.__proxy._pyroInvokeBatch(self.__calls, oneway, parallel)
+        return self.__proxy._pyroInvokeBatch(self.__calls, oneway)
+
 
 class _AsyncProxyAdapter(object):
     def __init__(self, proxy):
@@ -525,7 +1039,7 @@ class _AsyncProxyAdapter(object):
 
 
 class _AsyncRemoteMethod(object):
-    """async method call abstraction (call will run in a background thread)"""
+    """async method call abstraction (call will run in a thread of the shared executor, see futures.submit)"""
     def __init__(self, proxy, name):
         self.__proxy = proxy
         self.__name = name
@@ -535,17 +1049,24 @@ class _AsyncRemoteMethod(object):
 
     def __call__(self, *args, **kwargs):
         result=futures.FutureResult()
-        thread=threadutil.Thread(target=self.__asynccall, args=(result, args, kwargs))
-        thread.setDaemon(True)
-        thread.start()
+        futures.submit(functools.partial(self.__asynccall, result, args, kwargs))
         return result
 
     def __asynccall(self, asyncresult, args, kwargs):
         try:
-            # use a copy of the proxy otherwise calls would be serialized,
-            # and use contextmanager to close the proxy after we're done
-            with self.__proxy.__copy__() as proxy:
-                value = proxy._pyroInvoke(self.__name, args, kwargs)
+            proxy=self.__proxy
+            if isinstance(proxy, Proxy) and not (proxy._pyroPipelined or proxy._pyroPooled):
+                # calls over the connection of the proxy itself would wait for each other, use a copy of
+                # the proxy with its current settings that borrows a connection from the pool for the call
+                with proxy.__copy__() as copy:
+                    copy._pyroOneway=set(proxy._pyroOneway)
+                    copy._pyroPipelined=False
+                    copy._pyroPooled=True
+                    copy._pyroSerializer=proxy._pyroSerializer
+                    copy._pyroTimeout=proxy._pyroTimeout
+                    value=copy._pyroInvoke(self.__name, args, kwargs)
+            else:
+                value=proxy._pyroInvoke(self.__name, args, kwargs)
             asyncresult.value=value
         except Exception:
             # ignore any exceptions here, return them as part of the async result instead
@@ -581,6 +1102,7 @@ class MessageFactory(object):
     MSG_CONNECTFAIL = 3
     MSG_INVOKE = 4
     MSG_RESULT = 5
+    MSG_FUTURE = 6    # the outcome or progress of isasync calls, sent by the daemon on the connection of the calls
     FLAGS_EXCEPTION = 1<<0
     FLAGS_COMPRESSED = 1<<1
     FLAGS_ONEWAY = 1<<2
@@ -588,6 +1110,14 @@ class MessageFactory(object):
     FLAGS_BATCH = 1<<4
     FLAGS_ASYNC = 1<<5
     FLAGS_ASYNC_CANCEL = 1<<6 
+    FLAGS_PIPELINED = 1<<7   # the client accepts the replies in any order
+    FLAGS_OOB = 1<<8    # large buffers follow the serialized data as separate out-of-band frames
+    FLAGS_STREAMRESULT = 1<<9    # the result is the id of a stream of items, the client fetches them from the daemon
+    CODEC_SHIFT = 10
+    FLAGS_CODEC = 0x3<<CODEC_SHIFT    # the id of the compression codec, when FLAGS_COMPRESSED is set
+    FLAGS_STREAMCOMPRESSED = FLAGS_COMPRESSED | compression.STREAM_CODEC_ID<<CODEC_SHIFT    # compressed with the stream of the connection
+    SERIALIZER_SHIFT = 12
+    FLAGS_SERIALIZER = 0xf<<SERIALIZER_SHIFT    # the id of the serializer of the message data
     MAGIC = 0x34E9
     if sys.version_info>=(3,0):
         empty_bytes = bytes([])
@@ -598,21 +1128,94 @@ class MessageFactory(object):
         pyro_tag = "PYRO"
         empty_hmac = "\0"*hashlib.sha1().digest_size
 
+    # Messages with at least this much data are created as a list of the header and the data, that is
+    # sent with a single scatter-gather system call (sendmsg). Smaller messages are simply concatenated:
+    # below a few hundred kb, copying the data is cheaper than the extra work of a sendmsg call.
+    # Without sendmsg, the parts would be sent one by one, so then the messages are always concatenated.
+    GATHER_THRESHOLD = 256*1024 if hasattr(socket.socket, "sendmsg") else 0
+
+    oobFrameFmt = '!IH'     # out-of-band frame table: length of the serialized data, number of buffers. Followed by the buffer lengths.
+    OOBFRAMESIZE = struct.calcsize(oobFrameFmt)
+
     @classmethod
-    def createMessage(cls, msgType, databytes, flags, seq):
-        """creates a message containing a header followed by the given databytes"""
+    def createMessage(cls, msgType, databytes, flags, seq, macState=None, maxSize=0):
+        """
+        Creates a message containing a header followed by the given databytes.
+        The message is signed with the msgauth.MacState of the connection (hmac-sha1 if not given) when HMAC_KEY is set.
+        The size of the data is checked against the MAX_MESSAGE_SIZE config item, and against the maxSize
+        that the connection agreed on in the handshake (so that the other side won't reject the message).
+        The databytes can also be a list of buffers (a message with out-of-band frames), the message is
+        then returned as a list of buffers as well, so that they can be sent without joining them.
+        Large databytes aren't joined with the header either (see GATHER_THRESHOLD).
+        """
         databytes=databytes or cls.empty_bytes
-        if 0 < Pyro4.config.MAX_MESSAGE_SIZE < len(databytes):
-            raise errors.ProtocolError("max message size exceeded (%d where max=%d)" % (len(databytes), Pyro4.config.MAX_MESSAGE_SIZE))
+        if type(databytes) is list:
+            datalen=sum(len(part) for part in databytes)
+        else:
+            datalen=len(databytes)
+        limit=Pyro4.config.MAX_MESSAGE_SIZE
+        if maxSize and (not limit or maxSize<limit):
+            limit=maxSize
+        if 0 < limit < datalen:
+            raise errors.ProtocolError("max message size exceeded (%d where max=%d)" % (datalen, limit))
         if Pyro4.config.HMAC_KEY:
             flags|=MessageFactory.FLAGS_HMAC
-            bodyhmac=hmac.new(Pyro4.config.HMAC_KEY, databytes, digestmod=hashlib.sha1).digest()
+            bodyhmac=cls.computeHmac(databytes, macState)
         else:
             bodyhmac=MessageFactory.empty_hmac
-        headerchecksum=(msgType+constants.PROTOCOL_VERSION+len(databytes)+flags+seq+MessageFactory.MAGIC)&0xffff
-        msg=struct.pack(cls.headerFmt, cls.pyro_tag, constants.PROTOCOL_VERSION, msgType, flags, seq, len(databytes), headerchecksum, bodyhmac)
+        headerchecksum=(msgType+constants.PROTOCOL_VERSION+datalen+flags+seq+MessageFactory.MAGIC)&0xffff
+        msg=struct.pack(cls.headerFmt, cls.pyro_tag, constants.PROTOCOL_VERSION, msgType, flags, seq, datalen, headerchecksum, bodyhmac)
+        if type(databytes) is list:
+            return [msg]+databytes
+        if 0 < cls.GATHER_THRESHOLD <= datalen:
+            return [msg, databytes]     # don't copy the data just to put the header in front of it
         return msg+databytes
 
+    @classmethod
+    def sendMessage(cls, connection, msgType, databytes, flags, seq):
+        """
+        Creates the message and sends it on the connection, with the options that the connection agreed on
+        in the handshake. If the connection has a compression stream, the data is compressed with it first,
+        unless it is already compressed or has out-of-band frames.
+        """
+        options=connection.options
+        maxSize=options.maxMessageSize if options is not None else 0
+        stream=connection.compressStream
+        if stream is None or flags & cls.FLAGS_COMPRESSED or type(databytes) is list:
+            cls.__send(connection, cls.createMessage(msgType, databytes, flags, seq, connection.macState, maxSize))
+            return
+        with stream.lock:
+            # the other side decompresses the messages in the order they arrive in
+            cls.__send(connection, cls.createMessage(msgType, stream.compress(databytes), flags | cls.FLAGS_STREAMCOMPRESSED, seq, connection.macState, maxSize))
+
+    @classmethod
+    def __send(cls, connection, message):
+        handshakeMessage=connection.handshakeMessage
+        if handshakeMessage is not None:
+            # the capabilities of the client go out together with its first request
+            connection.handshakeMessage=None
+            message=[handshakeMessage]+message if type(message) is list else handshakeMessage+message
+        connection.send(message)
+
+    @classmethod
+    def decompressStreamData(cls, connection, databytes):
+        """
+        Decompresses the data of a received message that was compressed with the compression stream of the connection.
+        The decompressed data is limited to the max message size, like the messages that aren't compressed.
+        """
+        if connection.decompressStream is None:
+            connection.decompressStream=compression.DecompressStream()
+        maxSize=Pyro4.config.MAX_MESSAGE_SIZE
+        options=connection.options
+        if options is not None and options.maxMessageSize and (not maxSize or options.maxMessageSize<maxSize):
+            maxSize=options.maxMessageSize
+        return connection.decompressStream.decompress(databytes, maxSize)
+
+    @classmethod
+    def computeHmac(cls, databytes, macState=None):
+        """computes the mac of the message data, which can also be a list of buffers, with the mac state of the connection"""
+        return (macState or msgauth.default).digest(databytes)
+
     @classmethod
     def parseMessageHeader(cls, headerData):
         """Parses a message header. Returns a tuple of messagetype, messageflags, sequencenumber, datalength, datahmac."""
@@ -627,28 +1230,150 @@ class MessageFactory(object):
 
     @classmethod
     def getMessage(cls, connection, requiredMsgType):
-        headerdata = connection.recv(cls.HEADERSIZE)
-        msgType, flags, seq, datalen, datahmac = cls.parseMessageHeader(headerdata)
-        if 0 < Pyro4.config.MAX_MESSAGE_SIZE < datalen:
-            errorMsg = "max message size exceeded (%d where max=%d)" % (datalen, Pyro4.config.MAX_MESSAGE_SIZE)
-            log.error("connection "+str(connection)+": "+errorMsg)
-            connection.close()   # close the socket because at this point we can't return the correct sequence number for returning an error message
-            raise errors.ProtocolError(errorMsg)
-        if requiredMsgType is not None and msgType != requiredMsgType:
+        while True:
+            headerdata = connection.recvView(cls.HEADERSIZE)    # no copy, the header is parsed straight from the receive buffer
+            msgType, flags, seq, datalen, datahmac = cls.parseMessageHeader(headerdata)
+            if 0 < Pyro4.config.MAX_MESSAGE_SIZE < datalen:
+                errorMsg = "max message size exceeded (%d where max=%d)" % (datalen, Pyro4.config.MAX_MESSAGE_SIZE)
+                log.error("connection "+str(connection)+": "+errorMsg)
+                connection.close()   # close the socket because at this point we can't return the correct sequence number for returning an error message
+                raise errors.ProtocolError(errorMsg)
+            if requiredMsgType is None or msgType == requiredMsgType:
+                break
+            if msgType==cls.MSG_CONNECT and requiredMsgType==cls.MSG_INVOKE and connection.handshakePending:
+                # the capabilities of the client, its first request follows right behind them
+                databytes=connection.recv(datalen)
+                cls.checkHmac(flags, databytes, datahmac, connection.macState)
+                _acceptHandshake(connection, databytes)
+                continue
             err="invalid msg type %d received" % msgType
             log.error(err)
             raise errors.ProtocolError(err)
-        databytes=connection.recv(datalen)
+        if requiredMsgType==cls.MSG_INVOKE:
+            connection.handshakePending=False   # the capabilities can only come in front of the first request
+        if flags & cls.FLAGS_OOB:
+            databytes=cls.__recvOutOfBand(connection, datalen, flags, datahmac)
+        else:
+            databytes=connection.recv(datalen)
+            cls.checkHmac(flags, databytes, datahmac, connection.macState)
+            if flags & cls.FLAGS_STREAMCOMPRESSED == cls.FLAGS_STREAMCOMPRESSED:
+                # decompress here, the messages of a compression stream must be decompressed in the order they arrive in
+                databytes=cls.decompressStreamData(connection, databytes)
+                flags &= ~cls.FLAGS_STREAMCOMPRESSED
+        return msgType, flags, seq, databytes
+
+    @classmethod
+    def __recvOutOfBand(cls, connection, datalen, flags, datahmac):
+        """
+        Receives the data of a message with out-of-band frames. The buffers are received straight
+        into preallocated bytearrays. Returns a tuple of the serialized data and the list of buffers.
+        """
+        table=connection.recv(cls.OOBFRAMESIZE)
+        envelopelen, count = struct.unpack(cls.oobFrameFmt, table)
+        lengths=connection.recv(4*count) if count else cls.empty_bytes
+        buffersizes=struct.unpack("!%dI" % count, lengths)
+        if cls.OOBFRAMESIZE+len(lengths)+envelopelen+sum(buffersizes)!=datalen:
+            raise errors.ProtocolError("out-of-band frame sizes don't match the message size")
+        envelope=connection.recv(envelopelen)
+        buffers=[connection.recvInto(bytearray(size)) for size in buffersizes]
+        cls.checkHmac(flags, [table, lengths, envelope]+buffers, datahmac, connection.macState)
+        return envelope, buffers
+
+    @classmethod
+    def serializeData(cls, serializer, data, compress=None, method=None, codecs=None):
+        """
+        Serializes the data with the given serializer. If that serializer doesn't support some
+        of the data (it isn't the pickle serializer), it is serialized with pickle instead.
+        The serialized data is compressed by the given compression.Compressor (True means the default one),
+        that chooses the codec for the data of the given method, from the codec ids that the other side supports.
+        Returns the serialized data and the message flags for the serializer that was used and the compression.
+        Large buffers in the data are sent as out-of-band frames after the serialized data, the data is then
+        returned as a list of buffers.
+        """
+        threshold=Pyro4.config.OOB_THRESHOLD
+        if threshold and util.hasOutOfBandBuffers(data, threshold):
+            return cls.__serializeOutOfBand(data, threshold)
+        try:
+            databytes=serializer.dumps(data)
+        except (TypeError, ValueError):
+            if serializer.serializerId==util.PickleSerializer.serializerId:
+                raise
+            serializer=util.getSerializer(util.PickleSerializer.name)
+            databytes=serializer.dumps(data)
+        flags=serializer.serializerId<<cls.SERIALIZER_SHIFT
+        if compress:
+            if compress is True:
+                compress=compression.default
+            databytes, codecId = compress.compress(databytes, method, codecs)
+            if codecId is not None:
+                flags|=cls.FLAGS_COMPRESSED | codecId<<cls.CODEC_SHIFT
+        return databytes, flags
+
+    @classmethod
+    def __serializeOutOfBand(cls, data, threshold):
+        serializer=util.getSerializer(util.PickleSerializer.name)
+        envelope, buffers = serializer.dumpsOutOfBand(data, threshold)
+        sizes=[len(buffer) for buffer in buffers]
+        table=struct.pack(cls.oobFrameFmt, len(envelope), len(buffers)) + struct.pack("!%dI" % len(sizes), *sizes)
+        return [table+envelope]+buffers, serializer.serializerId<<cls.SERIALIZER_SHIFT | cls.FLAGS_OOB
+
+    @classmethod
+    def getSerializer(cls, flags):
+        """returns the serializer of a message with the given flags"""
+        return util.getSerializerById((flags & cls.FLAGS_SERIALIZER) >> cls.SERIALIZER_SHIFT)
+
+    @classmethod
+    def deserializeData(cls, databytes, flags):
+        """deserializes the data of a message with the given flags, with the serializer that was used to serialize it"""
+        if flags & cls.FLAGS_OOB:
+            envelope, buffers = databytes
+            return cls.getSerializer(flags).loadsOutOfBand(envelope, buffers)
+        if flags & cls.FLAGS_COMPRESSED:
+            databytes=compression.decompress(databytes, (flags & cls.FLAGS_CODEC) >> cls.CODEC_SHIFT)
+        return cls.getSerializer(flags).loads(databytes)
+
+    @classmethod
+    def checkHmac(cls, flags, databytes, datahmac, macState=None):
+        """
+        Checks the hmac of the message data against the local HMAC_KEY, with the mac state of the connection.
+        Raises SecurityError if it doesn't match.
+        """
         local_hmac_set=Pyro4.config.HMAC_KEY is not None and len(Pyro4.config.HMAC_KEY) > 0
         if flags&MessageFactory.FLAGS_HMAC and local_hmac_set:
-            if datahmac != hmac.new(Pyro4.config.HMAC_KEY, databytes, digestmod=hashlib.sha1).digest():
+            if not (macState or msgauth.default).verify(databytes, datahmac):
                 raise errors.SecurityError("message hmac mismatch")
         elif flags&MessageFactory.FLAGS_HMAC != local_hmac_set:
             # Message contains hmac and local HMAC_KEY not set, or vice versa. This is not allowed.
             err="hmac key config not symmetric"
             log.warn(err)
             raise errors.SecurityError(err)
-        return msgType, flags, seq, databytes
+
+_methodMarks=weakref.WeakKeyDictionary()    # class -> names of the oneway methods and of the async methods
+
+def _getMethodMarks(obj):
+    """
+    returns the names of the oneway methods and of the async methods of the object. They are looked up once per class,
+    objects such as the ClientFutures are turned into proxies for every call. An object that has marked methods
+    of its own (set on the instance) is looked at every time.
+    """
+    instanceDict=getattr(obj, "__dict__", None) or {}
+    for value in instanceDict.values():
+        if inspect.ismethod(value) and (getattr(value, "_pyroIsOneway", False) or getattr(value, "_pyroIsAsync", False)):
+            return _findMethodMarks(obj)
+    marks=_methodMarks.get(obj.__class__)
+    if marks is None:
+        marks=_methodMarks[obj.__class__]=_findMethodMarks(obj)
+    return marks
+
+def _findMethodMarks(obj):
+    oneways = []
+    asyncs = []
+    for name, method in inspect.getmembers(obj, inspect.ismethod):
+        if getattr(method, "_pyroIsOneway", False):
+            oneways.append(name)
+        if getattr(method, "_pyroIsAsync", False):
+            asyncs.append(name)
+    return frozenset(oneways), frozenset(asyncs)
 
 def get_oneways(self):
     """
@@ -656,11 +1381,7 @@ def get_oneways(self):
     self: the object (instance of a class)
     return (list of strings)
     """
-    oneways = []
-    for name, method in inspect.getmembers(self, inspect.ismethod):
-        if getattr(method, "_pyroIsOneway", False):
-            oneways.append(name)
-    return set(oneways)
+    return set(_getMethodMarks(self)[0])
 
 def get_asyncs(self):
     """
@@ -668,20 +1389,17 @@ def get_asyncs(self):
     self: the object (instance of a class)
     return (list of strings)
     """
-    asyncs = []
-    for name, method in inspect.getmembers(self, inspect.ismethod):
-        if getattr(method, "_pyroIsAsync", False):
-            asyncs.append(name)
-    return set(asyncs)
+    return set(_getMethodMarks(self)[1])
 
 def pyroObjectSerializer(self):
     """reduce function that automatically replaces Pyro objects by a Proxy"""
     daemon=getattr(self,"_pyroDaemon",None)
     if daemon:
         # only return a proxy if the object is a registered pyro object
-        return (Pyro4.core.Proxy, (daemon.uriFor(self),), 
-                (daemon.uriFor(self), get_oneways(self), get_asyncs(self),
-                 util.Serializer(), Pyro4.config.COMMTIMEOUT))
+        uri=daemon.uriFor(self)
+        return (Pyro4.core.Proxy, (uri,),
+                (uri, get_oneways(self), get_asyncs(self),
+                 util.getSerializer(Pyro4.config.SERIALIZER), Pyro4.config.COMMTIMEOUT))
     else:
         return self.__reduce__()
 
@@ -713,7 +1431,340 @@ class DaemonObject(object):
         """
         assert isinstance(objectId, basestring)
         return self.daemon.objectsById[objectId]
-    
+
+    def getNextStreamItems(self, streamId, count):
+        """
+        returns the next items of a streamed iterator result, at most count of them,
+        and whether the iterator is finished
+        """
+        return self.daemon._nextStreamItems(streamId, count)
+
+    def closeStream(self, streamId):
+        """closes a streamed iterator result before it is finished"""
+        self.daemon._closeStream(streamId)
+
+
+def _isIterator(obj):
+    """is the object an iterator or generator (not just an iterable such as a list)?"""
+    if inspect.isgenerator(obj):
+        return True
+    try:
+        return hasattr(obj, "__next__" if sys.version_info>=(3, 0) else "next") and iter(obj) is obj
+    except Exception:
+        return False
+
+
+class _Stream(object):
+    """an iterator result in the daemon, of which the client fetches the items"""
+    def __init__(self, iterator, connection):
+        self.iterator=iterator
+        self.connection=connection
+        self.lastUsed=time.time()
+        self.lock=threadutil.Lock()
+        self.error=None
+        self.closing=False
+
+    def close(self):
+        """
+        closes the iterator (if it's a generator). If items are being fetched from it at this time,
+        the fetch closes it when it's done
+        """
+        if self.lock.acquire(False):
+            try:
+                self._closeIterator()
+            finally:
+                self.lock.release()
+        else:
+            self.closing=True
+
+    def _closeIterator(self):
+        close=getattr(self.iterator, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                log.warn("error closing streamed iterator: %s", sys.exc_info()[1])
+
+
+_KWARGS_NEED_STR=sys.version_info<(2, 6, 5) and os.name!="java"    # Python before 2.6.5 doesn't accept unicode keyword arguments
+
+
+_inspectCoroutineFunction=getattr(inspect, "iscoroutinefunction", None)     # Python 3.5+
+
+
+def _isCoroutineFunction(function):
+    """is the function a coroutine function: an async def function, or a generator function decorated with asyncio.coroutine"""
+    if _inspectCoroutineFunction is not None and _inspectCoroutineFunction(function):
+        return True
+    asyncio=sys.modules.get("asyncio")     # asyncio.coroutine functions can't exist without asyncio being loaded
+    return asyncio is not None and asyncio.iscoroutinefunction(function)
+
+
+class _Request(object):
+    """a request that the daemon is handling: the decoded request message and what it calls"""
+    __slots__=["flags", "seq", "methodName", "vargs", "kwargs", "method", "callback", "coroutine",
+               "calls", "parallel", "chunk", "clientFuture"]
+
+    def __init__(self):
+        self.flags=0
+        self.seq=0
+        self.methodName=None
+        self.vargs=None
+        self.kwargs=None
+        self.method=None
+        self.callback=False
+        self.coroutine=None     # is the method a coroutine function (None if that isn't known)
+        self.calls=None         # the (method, coroutine, vargs, kwargs) calls of a batch
+        self.parallel=None      # how many calls of a batch may run at the same time, None = one after the other
+        self.chunk=None         # the number of results of a streamed batch that are fetched at a time
+        self.clientFuture=None  # the future of an isasync call
+
+
+class _OnewayCall(object):
+    """a oneway call for the oneway pool, its exception is logged because there's nobody to report it to"""
+    __slots__=["method", "vargs", "kwargs"]
+
+    def __init__(self, method, vargs, kwargs):
+        self.method=method
+        self.vargs=vargs
+        self.kwargs=kwargs
+
+    def __call__(self):
+        try:
+            self.method(*self.vargs, **self.kwargs)
+        except Exception:
+            log.warning("Exception occurred in oneway call: %r", sys.exc_info()[1])
+
+
+class _ConnectionFuture(object):
+    """
+    Stands in for the client future of an isasync call when the client wants the outcome on the connection
+    of the call (the "completions" extension): it is sent as a FUTURE message with the id of the future.
+    """
+    __slots__=["conn", "futureId", "serializer"]
+
+    def __init__(self, conn, futureId, serializer):
+        self.conn=conn
+        self.futureId=futureId
+        self.serializer=serializer
+
+    def set_result(self, result):
+        self.__send("result", result)
+
+    def set_exception(self, exception):
+        self.__send("exception", exception)
+
+    def set_cancelled(self):
+        self.__send("cancelled", None)
+
+    def set_progress(self, start=None, end=None):
+        self.__send("progress", (start, end))
+
+    def __send(self, kind, value):
+        self.sendEntries(self.conn, self.serializer, [(self.futureId, kind, value)])
+
+    @staticmethod
+    def sendEntries(conn, serializer, entries):
+        """send a FUTURE message with the (future id, kind, value) entries of one or more futures of the connection"""
+        data, flags=MessageFactory.serializeData(serializer, entries, codecs=conn.options.codecIds)
+        try:
+            MessageFactory.sendMessage(conn, MessageFactory.MSG_FUTURE, data, flags, 0)
+        except errors.CommunicationError:
+            log.debug("can't send %d future updates, the client is gone: %r", len(entries), sys.exc_info()[1])
+
+
+class _ProgressUpdates(object):
+    """
+    Coalesces the progress updates of the futures of isasync calls (PROGRESS_INTERVAL). Only the latest
+    (start, end) of a future is kept, and the updates for a client are sent at most once per interval:
+    those of all futures of a connection in one FUTURE message, to older clients one set_progress call per future.
+    A thread sends them, it is started when the first update is held back.
+    """
+    def __init__(self, interval):
+        self.interval=interval
+        self.condition=threadutil.Condition()
+        self.sendLock=threadutil.Lock()     # held while updates are sent, so that none of them overtakes the outcome of its future
+        self.pending={}     # target (connection, or the client future of an older client) -> {future id -> update}
+        self.due={}         # target -> the time its updates are sent
+        self.thread=None
+        self.closed=False
+
+    def update(self, target, futureId, client_future, start, end):
+        if self.interval<=0:
+            client_future.set_progress(start, end)
+            return
+        with self.condition:
+            if self.closed:
+                return
+            updates=self.pending.get(target)
+            if updates is None:
+                updates=self.pending[target]={}
+                self.due[target]=time.time()+self.interval
+                if self.thread is None:
+                    self.thread=threadutil.Thread(target=self.__run, name="Pyro4 progress updates")
+                    self.thread.setDaemon(True)
+                    self.thread.start()
+                self.condition.notify()
+            updates[futureId]=(client_future, start, end)
+
+    def take(self, target, futureId):
+        """
+        Takes the update of the future that is still held back, returns (start, end) or None.
+        Updates that are being sent have arrived at the client when this returns.
+        """
+        with self.sendLock:
+            with self.condition:
+                updates=self.pending.get(target)
+                if not updates or futureId not in updates:
+                    return None
+                _, start, end = updates.pop(futureId)
+                if not updates:
+                    del self.pending[target]
+                    del self.due[target]
+                return start, end
+
+    def discard(self, target):
+        """drops the updates for a client that is gone"""
+        with self.condition:
+            if self.pending.pop(target, None) is not None:
+                del self.due[target]
+
+    def close(self):
+        with self.condition:
+            self.closed=True
+            self.pending.clear()
+            self.due.clear()
+            self.condition.notify()
+
+    def __run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if self.closed:
+                        return
+                    now=time.time()
+                    if any(due<=now for due in self.due.values()):
+                        break
+                    self.condition.wait(min(self.due.values())-now if self.due else None)
+            with self.sendLock:
+                with self.condition:
+                    now=time.time()
+                    ready=[target for target, due in self.due.items() if due<=now]
+                    batches=[(target, self.pending.pop(target)) for target in ready]
+                    for target in ready:
+                        del self.due[target]
+                for target, updates in batches:
+                    try:
+                        self.__send(target, updates)
+                    except Exception:
+                        log.warning("can't send progress updates: %r", sys.exc_info()[1])
+
+    def __send(self, target, updates):
+        client_future=next(iter(updates.values()))[0]
+        if isinstance(client_future, _ConnectionFuture):
+            entries=[(futureId, "progress", (start, end)) for futureId, (_, start, end) in updates.items()]
+            _ConnectionFuture.sendEntries(target, client_future.serializer, entries)
+        else:
+            client_future.set_progress(*updates[None][1:])   # the proxy of the future of an older client
+
+
+def _batchParallelism(kwargs):
+    """
+    The number of calls of a batch request that may run at the same time (0 = as many as the daemon allows),
+    None if they must run one after the other. The client asks for a parallel batch in the keyword arguments
+    of the request, that older daemons ignore.
+    """
+    if kwargs:
+        parallel=kwargs.get("parallel")
+        if parallel is not None:
+            return max(0, int(parallel))
+    return None
+
+
+def _batchStreaming(kwargs):
+    """
+    The number of results of a batch request that the daemon produces at a time when the client fetches them
+    as a stream, None if the results are returned all at once.
+    """
+    if kwargs and Pyro4.config.ITER_STREAMING:
+        stream=kwargs.get("stream")
+        if stream is not None:
+            return max(1, int(stream))
+    return None
+
+
+def _runBatchedCall(method, vargs, kwargs):
+    """runs a call of a batch, returns its result or its exception in an _ExceptionWrapper"""
+    try:
+        return method(*vargs, **kwargs)   # this is the actual method call to the Pyro object
+    except Exception:
+        xt,xv=sys.exc_info()[0:2]
+        log.debug("Exception occurred while handling batched request: %s", xv)
+        xv._pyroTraceback=util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK)
+        if sys.platform=="cli":
+            util.fixIronPythonExceptionForPickle(xv, True)  # piggyback attributes
+        return futures._ExceptionWrapper(xv)
+
+
+class _ParallelBatch(object):
+    """
+    The calls of a parallel batch. Every thread that runs it takes the next call that hasn't started yet,
+    until there are none left. The results are stored in the order of the calls.
+    """
+    def __init__(self, calls):
+        self.calls=iter(enumerate(calls))
+        self.results=[None]*len(calls)
+        self.remaining=len(calls)
+        self.lock=threadutil.Lock()
+        self.finished=threadutil.Event()
+        if not calls:
+            self.finished.set()
+
+    def __call__(self):
+        while True:
+            with self.lock:
+                try:
+                    index, (method, vargs, kwargs) = next(self.calls)
+                except StopIteration:
+                    return
+            self.results[index]=_runBatchedCall(method, vargs, kwargs)
+            with self.lock:
+                self.remaining-=1
+                if not self.remaining:
+                    self.finished.set()
+
+
+_classMethods=weakref.WeakKeyDictionary()     # class -> the methods of _DispatchTable, prepared once per class
+
+
+class _DispatchTable(object):
+    """
+    The methods of a class of registered objects, for as long as objects of the class are registered.
+    It maps the name of every public method that the class defines as a plain function to its callback and coroutine
+    flags, so a call to such a method is a single dictionary lookup and a getattr. Other names (dotted names, private or
+    static methods, methods that are added to the class later) are resolved the normal way.
+    Every registered object keeps the table it was counted in, in case its class changes while it is registered.
+    """
+    __slots__=["cls", "methods", "objects"]
+
+    def __init__(self, cls):
+        self.cls=cls
+        self.objects=0      # the number of registered objects of the class
+        self.methods=_classMethods.get(cls)
+        if self.methods is None:
+            # objects such as the ClientFutures are registered and unregistered all the time, inspect their class only once
+            methods={}
+            seen=set()
+            for klass in inspect.getmro(cls):
+                for name, value in vars(klass).items():
+                    if name in seen:
+                        continue
+                    seen.add(name)
+                    if not name.startswith("_") and inspect.isfunction(value):
+                        methods[name]=(getattr(value, "_pyroCallback", False), _isCoroutineFunction(value))
+            self.methods=_classMethods[cls]=methods
+
+
 class Daemon(object):
     """
     Pyro daemon. Contains server side logic and dispatches incoming remote method calls
@@ -733,19 +1784,7 @@ class Daemon(object):
             raise ValueError("cannot use nathost together with unixsocket")
         if (nathost is None) ^ (natport is None):
             raise ValueError("must provide natport with nathost")
-        if Pyro4.config.SERVERTYPE=="thread":
-            self.transportServer=SocketServer_Threadpool()
-        elif Pyro4.config.SERVERTYPE=="multiplex":
-            # choose the 'best' multiplexing implementation
-            if os.name=="java":
-                raise NotImplementedError("select or poll-based server is not supported for jython, use thread server instead")
-            import select
-            if hasattr(select,"poll"):
-                self.transportServer=SocketServer_Poll()
-            else:
-                self.transportServer=SocketServer_Select()
-        else:
-            raise errors.PyroError("invalid server type '%s'" % Pyro4.config.SERVERTYPE)
+        self.transportServer=self._createTransportServer(Pyro4.config.SERVERTYPE)
         self.transportServer.init(self, host, port, unixsocket)
         #: The location (str of the form ``host:portnumber``) on which the Daemon is listening
         self.locationStr=self.transportServer.locationStr
@@ -758,15 +1797,73 @@ class Daemon(object):
         self.natLocationStr = "%s:%d" % (nathost, natport_for_loc) if nathost else None
         if self.natLocationStr:
             log.debug("NAT address is %s", self.natLocationStr)
-        self.serializer=util.Serializer()
+        self.serializer=util.PickleSerializer()   # for the exception responses, requests are answered with the serializer the client used
+        #: The compression.Compressor for the response data (None = no compression)
+        self.compression=compression.createCompressor()
+        #: Compress the responses on each new client connection with a compression stream
+        self.streamCompression=Pyro4.config.COMPRESSION_STREAM
+        #: The mac algorithms that clients can choose from, in order of preference
+        self.macAlgorithms=msgauth.getAlgorithms(Pyro4.config.MAC_ALGORITHMS)
+        if not self.macAlgorithms:
+            raise ValueError("none of the MAC_ALGORITHMS is available")
         pyroObject=interface(self)
         pyroObject._pyroId=constants.DAEMON_NAME
         #: Dictionary from Pyro object id to the actual Pyro object registered by this id
         self.objectsById={pyroObject._pyroId: pyroObject}
+        self._dispatchTables={}     # class -> _DispatchTable of the registered objects
+        self.__addDispatchTable(pyroObject)
+        self._registryVersion=0     # changes when objects are (un)registered, the connections resolve their handles again
         self.__mustshutdown=threadutil.Event()
         self.__loopstopped=threadutil.Event()
         self.__loopstopped.set()
-        self._uriToFuture = {}
+        self._futures=futures.FutureTable()    # the futures of the running isasync calls
+        self._progressUpdates=_ProgressUpdates(Pyro4.config.PROGRESS_INTERVAL)
+        self.streams={}     # stream id -> iterator result that is being fetched by a client
+        self.__streamsLock=threadutil.Lock()
+        #: The thread pool that runs the oneway calls (if ONEWAY_THREADED is enabled). Its jobcount and
+        #: dropped attributes are the number of calls waiting for a thread and the number of calls dropped.
+        self.onewayPool=tpjobqueue.ThreadPooledJobQueue(0, Pyro4.config.ONEWAY_THREADS, Pyro4.config.ONEWAY_QUEUESIZE,
+                                                        Pyro4.config.ONEWAY_OVERFLOW)
+        #: The thread pool that helps to run the calls of parallel batches.
+        self.batchPool=tpjobqueue.ThreadPooledJobQueue(0, Pyro4.config.BATCH_THREADS)
+
+    def _createTransportServer(self, servertype):
+        """create the (not yet initialized) transport server for the given server type"""
+        if servertype=="thread":
+            return SocketServer_Threadpool()
+        elif servertype=="multiplex":
+            # choose the 'best' multiplexing implementation
+            if os.name=="java":
+                raise NotImplementedError("select or poll-based server is not supported for jython, use thread server instead")
+            import select
+            if hasattr(select,"poll"):
+                return SocketServer_Poll()
+            else:
+                return SocketServer_Select()
+        elif servertype=="epoll":
+            import select
+            if not hasattr(select,"epoll"):
+                raise NotImplementedError("epoll-based server is only supported on Linux, use multiplex or thread server instead")
+            return SocketServer_Epoll()
+        elif servertype=="hybrid":
+            # multiplexed connections, requests are processed by a thread pool
+            if os.name=="java":
+                raise NotImplementedError("select or poll-based server is not supported for jython, use thread server instead")
+            import select
+            if hasattr(select,"epoll"):
+                return SocketServer_HybridEpoll()
+            elif hasattr(select,"poll"):
+                return SocketServer_HybridPoll()
+            else:
+                return SocketServer_HybridSelect()
+        elif servertype=="asyncio":
+            # asyncio event loop, the module is only imported when needed because it requires Python 3.5+
+            if sys.version_info<(3,5):
+                raise NotImplementedError("asyncio server requires Python 3.5 or newer")
+            from Pyro4.socketserver.asyncioserver import SocketServer_Asyncio
+            return SocketServer_Asyncio()
+        else:
+            raise errors.PyroError("invalid server type '%s'" % servertype)
 
     @property
     def sock(self):
@@ -841,107 +1938,163 @@ class Daemon(object):
         # We need a minimal amount of data or the socket will remain blocked
         # on some systems... (messages smaller than 40 bytes)
         # Return True for successful handshake, False if something was wrong.
-        data="ok"
+        # The data announces the capabilities of the daemon, one "name=value" per line after the "ok" (see Pyro4.handshake).
+        # Until the client sends its own capabilities, the connection runs with those of an older client.
+        # The mac algorithm that the client chose from the announced ones shows from its first message.
+        # the replies of pipelined requests and the completions of isasync calls are sent from other threads,
+        # only servers that can send on a connection from any thread support those
+        extensions=[name for name in handshake.EXTENSIONS if name not in ("pipelining", "completions") or self.transportServer.pipelining]
+        capabilities=handshake.Capabilities.local(self.macAlgorithms, extensions)
+        data="ok\n"+capabilities.encode()
         if sys.version_info>=(3,0):
             data=bytes(data,"utf-8")
         msg=MessageFactory.createMessage(MessageFactory.MSG_CONNECTOK, data, 0, 1)
         conn.send(msg)
+        conn.macState=msgauth.MacState(self.macAlgorithms)
+        conn.options=handshake.agree(capabilities, handshake.LEGACY, self.streamCompression)
+        conn.handshakePending=True
         return True
 
-    def handleRequest(self, conn):
+    def handleRequest(self, conn, message=None):
         """
         Handle incoming Pyro request. Catches any exception that may occur and
         wraps it in a reply to the calling side, as to not make this server side loop
         terminate due to exceptions caused by remote invocations.
+        The request message is read from the connection, unless the transport server
+        already did that and passes it in as the message argument.
         """
-        flags=0
-        seq=0
-        wasBatched=False
-        isCallback=False
-        client_future = None
+        request=_Request()
         try:
-            msgType, flags, seq, data = MessageFactory.getMessage(conn, MessageFactory.MSG_INVOKE)
-            objId, method, vargs, kwargs=self.serializer.deserialize(
-                                           data, compressed=flags & MessageFactory.FLAGS_COMPRESSED)
-            del data  # invite GC to collect the object, don't wait for out-of-scope
-            obj=self.objectsById.get(objId)
-            
-            if flags & MessageFactory.FLAGS_ASYNC:
-                client_future = vargs[0]
-                client_future._pyroOneway.update(["set_cancelled", "set_result", "set_exception", "set_progress"])
-                vargs = vargs[1:]
+            if message is None:
+                message=MessageFactory.getMessage(conn, MessageFactory.MSG_INVOKE)
+            self._decodeRequest(conn, request, message)
+            del message  # invite GC to collect the request data, don't wait for out-of-scope
+            flags=request.flags
+            if request.calls is not None:
+                data=self._runBatch(request)
             elif flags & MessageFactory.FLAGS_ASYNC_CANCEL:
-                client_future_uri = vargs[0]
-            
-            if obj is not None:
-                if kwargs and sys.version_info<(2, 6, 5) and os.name!="java":
-                    # Python before 2.6.5 doesn't accept unicode keyword arguments
-                    kwargs = dict((str(k), kwargs[k]) for k in kwargs)
-                if flags & MessageFactory.FLAGS_BATCH:
-                    # batched method calls, loop over them all and collect all results
-                    data=[]
-                    for method,vargs,kwargs in vargs:
-                        method=util.resolveDottedAttribute(obj, method, Pyro4.config.DOTTEDNAMES)
-                        try:
-                            result=method(*vargs, **kwargs)   # this is the actual method call to the Pyro object
-                        except Exception:
-                            xt,xv=sys.exc_info()[0:2]
-                            log.debug("Exception occurred while handling batched request: %s", xv)
-                            xv._pyroTraceback=util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK)
-                            if sys.platform=="cli":
-                                util.fixIronPythonExceptionForPickle(xv, True)  # piggyback attributes
-                            data.append(futures._ExceptionWrapper(xv))
-                            break   # stop processing the rest of the batch
-                        else:
-                            data.append(result)
-                    wasBatched=True
-                elif flags & MessageFactory.FLAGS_ASYNC_CANCEL:
-                    data=self._cancelFuture(client_future_uri)
-                else:
-                    # normal single method call
-                    method=util.resolveDottedAttribute(obj, method, Pyro4.config.DOTTEDNAMES)
-                    if flags & MessageFactory.FLAGS_ONEWAY and Pyro4.config.ONEWAY_THREADED:
-                        # oneway call to be run inside its own thread
-                        thread=threadutil.Thread(target=method, args=vargs, kwargs=kwargs)
-                        thread.setDaemon(True)
-                        thread.start()
-                    elif flags & MessageFactory.FLAGS_ASYNC:
-                        future=method(*vargs, **kwargs)
-                        self._followFuture(future, client_future)
-                    else:
-                        isCallback=getattr(method, "_pyroCallback", False)
-                        data=method(*vargs, **kwargs)   # this is the actual method call to the Pyro object
-            else:
-                log.debug("unknown object requested: %s", objId)
-                raise errors.DaemonError("unknown object")
-            if flags & MessageFactory.FLAGS_ONEWAY:
-                return   # oneway call, don't send a response
+                futureId=request.vargs[0]
+                data=self._cancelFuture(conn if type(futureId) is int else None, futureId)
+            elif flags & MessageFactory.FLAGS_ONEWAY and Pyro4.config.ONEWAY_THREADED:
+                # oneway call to be run by a thread of the oneway pool
+                self.onewayPool.process(_OnewayCall(request.method, request.vargs, request.kwargs))
+                return
             elif flags & MessageFactory.FLAGS_ASYNC:
+                future=request.method(*request.vargs, **request.kwargs)
+                self._followFuture(future, request.clientFuture)
                 return  # async call, don't send a response yet
             else:
-                data, compressed=self.serializer.serialize(data, compress=Pyro4.config.COMPRESSION)
-                flags=0
-                if compressed:
-                    flags |= MessageFactory.FLAGS_COMPRESSED
-                if wasBatched:
-                    flags |= MessageFactory.FLAGS_BATCH
-                msg=MessageFactory.createMessage(MessageFactory.MSG_RESULT, data, flags, seq)
-                del data
-                conn.send(msg)
-        except Exception as ex:
-            xt,xv=sys.exc_info()[0:2]
-            if xt is not errors.ConnectionClosedError:
-                log.debug("Exception occurred while handling request: %r", xv)
-                if client_future is not None:
-                    # send exception to the client future
-                    client_future.set_exception(ex)
-                elif not flags & MessageFactory.FLAGS_ONEWAY:
-                    # only return the error to the client if it wasn't a oneway call
-                    tblines=util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK)
-                    self._sendExceptionResponse(conn, seq, xv, tblines)
-            if isCallback or isinstance(xv, (errors.CommunicationError, errors.SecurityError)):
+                data=request.method(*request.vargs, **request.kwargs)   # this is the actual method call to the Pyro object
+            self._sendResult(conn, request, data)
+            del data
+        except Exception:
+            if self._requestFailed(conn, request):
                 raise       # re-raise if flagged as callback, communication or security error.
 
+    def _decodeRequest(self, conn, request, message):
+        """
+        Fills in the request from the request message: its flags, sequence number and arguments, and the method
+        of the Pyro object that it calls (or the calls of a batch). This is the part of handling a request that
+        all transport servers share, the asyncio server then awaits the calls itself.
+        Raises DaemonError if the object is unknown.
+        """
+        msgType, flags, request.seq, data = message
+        request.flags=flags
+        objId, method, vargs, kwargs=MessageFactory.deserializeData(data, flags)
+        del data  # invite GC to collect the object, don't wait for out-of-scope
+        if conn.handles is not None:
+            # the client refers to the object and method by their handles, they usually resolve from the cache
+            objId, method, obj, resolved = conn.handles.lookup(self, objId, method)
+        else:
+            obj=self.objectsById.get(objId)
+            resolved=None
+        request.methodName=method
+        if flags & MessageFactory.FLAGS_ASYNC:
+            clientFuture=vargs[0]
+            if type(clientFuture) is int:
+                # the client wants the outcome on this connection ("completions" extension)
+                clientFuture=_ConnectionFuture(conn, clientFuture, MessageFactory.getSerializer(flags))
+            else:
+                clientFuture._pyroOneway.update(["set_cancelled", "set_result", "set_exception", "set_progress"])
+            request.clientFuture=clientFuture
+            vargs=vargs[1:]
+        if obj is None:
+            log.debug("unknown object requested: %s", objId)
+            raise errors.DaemonError("unknown object")
+        if kwargs and _KWARGS_NEED_STR:
+            kwargs=dict((str(k), kwargs[k]) for k in kwargs)
+        request.vargs=vargs
+        request.kwargs=kwargs
+        if flags & MessageFactory.FLAGS_BATCH:
+            request.parallel=_batchParallelism(kwargs)
+            if not flags & MessageFactory.FLAGS_ONEWAY:
+                request.chunk=_batchStreaming(kwargs)
+            calls=[]
+            for name, args, kw in vargs:
+                batchMethod, _, coroutine = self._resolveMethod(obj, name)
+                calls.append((batchMethod, coroutine, args, kw))
+            request.calls=calls
+        elif not flags & MessageFactory.FLAGS_ASYNC_CANCEL:
+            request.method, request.callback, request.coroutine = resolved if resolved is not None else self._resolveMethod(obj, method)
+
+    def _runBatch(self, request):
+        """
+        Runs the calls of a batch request and returns the result or _ExceptionWrapper of every call.
+        A streamed batch returns a generator instead, that runs the calls when the client fetches their results.
+        """
+        calls=[(batchMethod, args, kw) for batchMethod, _, args, kw in request.calls]
+        if request.chunk is not None:
+            return self._streamBatch(calls, request.parallel, request.chunk)
+        if request.parallel is not None:
+            return self._runParallelBatch(calls, request.parallel)
+        results=[]
+        for method, vargs, kwargs in calls:
+            result=_runBatchedCall(method, vargs, kwargs)
+            results.append(result)
+            if isinstance(result, futures._ExceptionWrapper):
+                break   # stop processing the rest of the batch
+        return results
+
+    def _sendResult(self, conn, request, data):
+        """
+        Sends the result of a request to the client, unless it was a oneway call.
+        An iterator or generator result is registered as a stream, the client fetches its items in chunks.
+        """
+        flags=request.flags
+        if flags & MessageFactory.FLAGS_ONEWAY:
+            return   # oneway call, don't send a response
+        isStream=Pyro4.config.ITER_STREAMING and _isIterator(data)
+        if isStream:
+            data=self._registerStream(conn, data)
+        # reply with the serializer that the client used
+        data, replyflags=MessageFactory.serializeData(MessageFactory.getSerializer(flags), data, compress=self.compression,
+                                                      method=request.methodName, codecs=conn.options.codecIds)
+        if flags & MessageFactory.FLAGS_BATCH:
+            replyflags |= MessageFactory.FLAGS_BATCH
+        if isStream:
+            replyflags |= MessageFactory.FLAGS_STREAMRESULT
+        MessageFactory.sendMessage(conn, MessageFactory.MSG_RESULT, data, replyflags, request.seq)
+
+    def _requestFailed(self, conn, request):
+        """
+        Reports the exception that occurred while handling the request to the client: to the future of
+        an isasync call, or in an exception reply unless it was a oneway call. Returns whether the
+        exception must be re-raised, because the method is a callback or because it is a communication
+        or security error.
+        """
+        xt,xv=sys.exc_info()[0:2]
+        if xt is not errors.ConnectionClosedError:
+            log.debug("Exception occurred while handling request: %r", xv)
+            if request.clientFuture is not None:
+                # send exception to the client future
+                request.clientFuture.set_exception(xv)
+            elif not request.flags & MessageFactory.FLAGS_ONEWAY:
+                # only return the error to the client if it wasn't a oneway call
+                tblines=util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK)
+                self._sendExceptionResponse(conn, request.seq, xv, tblines)
+        isCallback=request.callback and not request.flags & MessageFactory.FLAGS_ASYNC
+        return isCallback or isinstance(xv, (errors.CommunicationError, errors.SecurityError))
+
     def _sendExceptionResponse(self, connection, seq, exc_value, tbinfo):
         """send an exception back including the local traceback info"""
         exc_value._pyroTraceback=tbinfo
@@ -958,15 +2111,52 @@ class Daemon(object):
             if sys.platform=="cli":
                 util.fixIronPythonExceptionForPickle(exc_value, True)  # piggyback attributes
             data, _=self.serializer.serialize(exc_value)
-        msg=MessageFactory.createMessage(MessageFactory.MSG_RESULT, data, MessageFactory.FLAGS_EXCEPTION, seq)
-        del data
-        connection.send(msg)
+        MessageFactory.sendMessage(connection, MessageFactory.MSG_RESULT, data, MessageFactory.FLAGS_EXCEPTION, seq)
+
+    def _runParallelBatch(self, calls, parallel):
+        """
+        Runs the (method, vargs, kwargs) calls of a parallel batch at the same time, at most parallel of them
+        (0 = as many as BATCH_THREADS). Returns the result or _ExceptionWrapper of every call, in order.
+        The threads of the batch pool help the calling thread, which runs calls as well.
+        """
+        batch=_ParallelBatch(calls)
+        helpers=min(parallel or Pyro4.config.BATCH_THREADS, Pyro4.config.BATCH_THREADS, len(calls))-1
+        for _ in range(helpers):
+            self.batchPool.process(batch)
+        batch()
+        batch.finished.wait()
+        return batch.results
+
+    def _streamBatch(self, calls, parallel, chunk):
+        """
+        Generator that runs the (method, vargs, kwargs) calls of a streamed batch as their results are fetched,
+        and produces the result or _ExceptionWrapper of every call. The calls of a parallel batch run in groups
+        of chunk calls at the same time, the other batches stop at the first exception like a normal batch.
+        """
+        if parallel is None:
+            for method, vargs, kwargs in calls:
+                result=_runBatchedCall(method, vargs, kwargs)
+                yield result
+                if isinstance(result, futures._ExceptionWrapper):
+                    return   # stop processing the rest of the batch
+        else:
+            for start in range(0, len(calls), chunk):
+                for result in self._runParallelBatch(calls[start:start+chunk], parallel):
+                    yield result
 
     def _followFuture(self, future, client_future):
-        uri = client_future._pyroUri.asString()
-        self._uriToFuture[uri] = future
+        if isinstance(client_future, _ConnectionFuture):
+            conn, futureId, target = client_future.conn, client_future.futureId, client_future.conn
+        else:
+            conn, futureId, target = None, client_future._pyroUri.asString(), client_future
+        self._futures.add(conn, futureId, future)
+        progressId=futureId if conn is not None else None      # an older client has a target per future
         def on_future_completion(f):
             try:
+                # the last progress update that was held back goes out before the outcome
+                progress=self._progressUpdates.take(target, progressId)
+                if progress is not None:
+                    client_future.set_progress(*progress)
                 client_future.set_result(f.result())
             except cfutures.CancelledError:
                 client_future.set_cancelled()
@@ -979,23 +2169,96 @@ class Daemon(object):
                     exc_value = errors.PyroError(msg)
                     client_future.set_exception(exc_value)
             finally:
-                del self._uriToFuture[uri] # that should be the only ref, so kill connection
-        future.add_done_callback(on_future_completion)
+                self._futures.remove(conn, futureId) # that should be the only ref, so kill connection
 
         if hasattr(future, "add_update_callback"):
             def on_future_progess(f, s, e):
-                client_future.set_progress(s, e)
-            # called at least once immediately, and once just before completion callback
+                self._progressUpdates.update(target, progressId, client_future, s, e)
+            # called at least once immediately, and once just before completion callback.
+            # Added first, so that the progress of a future that is done already goes out before its outcome.
             future.add_update_callback(on_future_progess)
+        future.add_done_callback(on_future_completion)
 
-    def _cancelFuture(self, client_future_uri):
-        if client_future_uri in self._uriToFuture:
-            future = self._uriToFuture[client_future_uri]
+    def _cancelFuture(self, conn, futureId):
+        future = self._futures.get(conn, futureId)
+        if future is not None:
             return future.cancel()
         else:
-            log.debug("Couldn't find future %s in %s", client_future_uri, str(self._uriToFuture))
+            log.debug("Couldn't find future %s (%d futures running)", futureId, len(self._futures))
             return False
 
+    def _registerStream(self, conn, iterator):
+        """register an iterator result of which the client will fetch the items, returns the stream id"""
+        streamId=str(uuid.uuid4())
+        with self.__streamsLock:
+            self.__expireStreams()
+            self.streams[streamId]=_Stream(iterator, conn)
+        return streamId
+
+    def _nextStreamItems(self, streamId, count):
+        """returns the next items of a stream (at most count) and whether the stream is finished"""
+        with self.__streamsLock:
+            stream=self.streams.get(streamId)
+        if stream is None:
+            raise errors.DaemonError("unknown stream (closed or expired)")
+        with stream.lock:
+            stream.lastUsed=time.time()
+            if stream.error is not None:
+                self.__removeStream(streamId)
+                raise stream.error
+            items=[]
+            try:
+                while len(items)<max(count, 1) and not stream.closing:
+                    items.append(next(stream.iterator))
+            except StopIteration:
+                self.__removeStream(streamId)
+                return items, True
+            except Exception:
+                if not items:
+                    self.__removeStream(streamId)
+                    raise
+                stream.error=sys.exc_info()[1]   # first return the items we got, the client gets the error next time
+            if stream.closing:
+                self.__removeStream(streamId)
+                stream._closeIterator()
+                return items, True
+            return items, False
+
+    def _closeStream(self, streamId):
+        stream=self.__removeStream(streamId)
+        if stream is not None:
+            stream.close()
+
+    def __removeStream(self, streamId):
+        with self.__streamsLock:
+            return self.streams.pop(streamId, None)
+
+    def __expireStreams(self):
+        """close the streams that the client hasn't used for longer than the idle timeout"""
+        timeout=Pyro4.config.ITER_STREAM_IDLETIMEOUT
+        if timeout:
+            now=time.time()
+            for streamId, stream in list(self.streams.items()):
+                if now-stream.lastUsed>timeout:
+                    log.debug("closing idle stream %s", streamId)
+                    del self.streams[streamId]
+                    stream.close()
+
+    def _clientDisconnect(self, conn):
+        """
+        called by the transport server when a client connection is closed, closes the streams of that client
+        and cancels the futures of its isasync calls, nobody is left to receive their outcome
+        """
+        with self.__streamsLock:
+            streams=[(streamId, stream) for streamId, stream in self.streams.items() if stream.connection is conn]
+            for streamId, stream in streams:
+                del self.streams[streamId]
+        for streamId, stream in streams:
+            stream.close()
+        for future in self._futures.removeConnection(conn):
+            future.cancel()
+        self._progressUpdates.discard(conn)
+
     def register(self, obj, objectId=None):
         """
         Register a Pyro object under the given id. Note that this object is now only
@@ -1011,10 +2274,15 @@ class Daemon(object):
             raise errors.DaemonError("object already has a Pyro id")
         if objectId in self.objectsById:
             raise errors.DaemonError("object already registered with that id")
+        self._addObject(obj, objectId)
+        return self.uriFor(objectId)
+
+    def _addObject(self, obj, objectId, autoproxy=True):
+        """registers the object under the object id, without the checks of register"""
         # set some pyro attributes
         obj._pyroId=objectId
         obj._pyroDaemon=self
-        if Pyro4.config.AUTOPROXY:
+        if autoproxy and Pyro4.config.AUTOPROXY:
             # register a custom serializer for the type to automatically return proxies
             try:
                 if isinstance(obj, tuple(self.serializers)):
@@ -1029,7 +2297,36 @@ class Daemon(object):
                 pass
         # register the object in the mapping
         self.objectsById[obj._pyroId]=obj
-        return self.uriFor(objectId)
+        self.__addDispatchTable(obj)
+        self._registryVersion+=1
+
+    def __addDispatchTable(self, obj):
+        table=self._dispatchTables.get(obj.__class__)
+        if table is None:
+            table=self._dispatchTables[obj.__class__]=_DispatchTable(obj.__class__)
+        table.objects+=1
+        obj._pyroDispatchTable=table
+
+    def __removeDispatchTable(self, obj):
+        table=getattr(obj, "_pyroDispatchTable", None)
+        if table is not None:
+            del obj._pyroDispatchTable
+            table.objects-=1
+            if table.objects<=0 and self._dispatchTables.get(table.cls) is table:
+                del self._dispatchTables[table.cls]
+
+    def _resolveMethod(self, obj, name):
+        """
+        Returns the method of the registered object that a request calls, whether it is a callback method and
+        whether it is a coroutine function (None if that isn't known). Raises AttributeError for unknown methods.
+        """
+        table=self._dispatchTables.get(obj.__class__)
+        if table is not None:
+            flags=table.methods.get(name)
+            if flags is not None:
+                return getattr(obj, name), flags[0], flags[1]
+        method=util.resolveDottedAttribute(obj, name, Pyro4.config.DOTTEDNAMES)
+        return method, getattr(method, "_pyroCallback", False), None
 
     def unregister(self, objectOrId):
         """
@@ -1048,7 +2345,8 @@ class Daemon(object):
         if objectId==constants.DAEMON_NAME:
             return
         if objectId in self.objectsById:
-            del self.objectsById[objectId]
+            self.__removeDispatchTable(self.objectsById.pop(objectId))
+            self._registryVersion+=1
             if objectOrId is not None:
                 del objectOrId._pyroId
                 del objectOrId._pyroDaemon
@@ -1081,6 +2379,13 @@ class Daemon(object):
     def close(self):
         """Close down the server and release resources"""
         log.debug("daemon closing")
+        with self.__streamsLock:
+            streams, self.streams = self.streams, {}
+        for stream in streams.values():
+            stream.close()
+        self.onewayPool.close()
+        self.batchPool.close()
+        self._progressUpdates.close()
         if self.transportServer:
             self.transportServer.close()
             self.transportServer=None
@@ -1101,6 +2406,50 @@ class Daemon(object):
         return {}   # a little hack to make it possible to serialize Pyro objects.
 
 
+class _FutureDaemon(Daemon):
+    """
+    The daemon of the ClientFutures of this process, it is shared by all proxies (see _futureDaemon).
+    The daemons that run the isasync calls only make oneway calls to the futures, so it uses a multiplexed
+    server; the calls themselves run in the oneway thread pool.
+    """
+    def __init__(self):
+        super(_FutureDaemon, self).__init__()
+        self.__futureIds=itertools.count(1)
+
+    def _createTransportServer(self, servertype):
+        return super(_FutureDaemon, self)._createTransportServer("multiplex")
+
+    def registerFuture(self, future):
+        """
+        registers a ClientFuture under a new short id, without the checks of register. Returns the proxy for it,
+        that is sent to the daemon that runs the call. The future is not turned into a proxy when it is pickled
+        (AUTOPROXY registers a reduce function for the class, for all pickling in the process).
+        """
+        self._addObject(future, "future_%d" % next(self.__futureIds), autoproxy=False)
+        return Proxy(self.uriFor(future))
+
+
+_futureDaemonInstance=None
+_futureDaemonPid=None
+_futureDaemonLock=threadutil.Lock()
+
+def _futureDaemon():
+    """returns the future daemon of this process, it is created when it is first needed"""
+    global _futureDaemonInstance, _futureDaemonPid
+    daemon=_futureDaemonInstance
+    if daemon is not None and _futureDaemonPid==os.getpid():
+        return daemon
+    with _futureDaemonLock:
+        if _futureDaemonInstance is None or _futureDaemonPid!=os.getpid():
+            # a forked child process doesn't have the request loop thread of its parent, it needs its own daemon
+            daemon=_FutureDaemon()
+            thread=threadutil.Thread(name="Pyro4 daemon for async calls", target=daemon.requestLoop)
+            thread.setDaemon(True)
+            thread.start()
+            _futureDaemonInstance, _futureDaemonPid = daemon, os.getpid()
+        return _futureDaemonInstance
+
+
 # decorators
 
 def callback(object):
@@ -8,7 +8,8 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 
 from __future__ import with_statement
 
-from Pyro4 import threadutil, util
+import Pyro4
+from Pyro4 import threadutil, util, tpjobqueue
 import functools
 import logging
 import sys
@@ -17,10 +18,58 @@ import time
 import concurrent.futures as cfutures
 
 
-__all__=["Future", "FutureResult", "_ExceptionWrapper"]
+__all__=["Future", "FutureResult", "FutureTable", "setExecutor", "submit", "wait_all", "wait_any", "as_completed",
+         "_ExceptionWrapper"]
 
 log=logging.getLogger("Pyro4.futures")
 
+_executor=None      # the executor that was set with setExecutor
+_pool=None          # the default thread pool, created when it is first needed
+_poolLock=threadutil.Lock()
+
+
+def setExecutor(executor):
+    """
+    Run the calls of Futures and async proxies with the given executor: a concurrent.futures.Executor,
+    or any other object with a submit method that takes a callable.
+    None restores the default, a shared pool of at most ASYNC_THREADS threads.
+    Jobs that are submitted by a job of that pool while all its threads are busy get a thread of their own,
+    because the submitting job may wait for their result. Another executor has to take care of that itself.
+    """
+    global _executor
+    _executor=executor
+
+
+def submit(job):
+    """Runs the job (a callable without arguments) with the executor of the Futures and async proxies."""
+    executor=_executor
+    if executor is not None:
+        executor.submit(job)
+        return
+    global _pool
+    if _pool is None:
+        with _poolLock:
+            if _pool is None:
+                _pool=tpjobqueue.ThreadPooledJobQueue(0, Pyro4.config.ASYNC_THREADS)
+    if not _pool.hasCapacity() and _isPoolThread(_pool):
+        # queueing the job could deadlock: the pool may be full of jobs that wait for the result of this one
+        thread=threadutil.Thread(target=job)
+        thread.setDaemon(True)
+        thread.pyroJobPool=_pool
+        thread.start()
+        return
+    _pool.process(job)
+
+
+def _isPoolThread(pool):
+    """Is the current thread one of the workers of the pool, or a thread that runs a job of it?"""
+    if pool is None:
+        return False
+    thread=threadutil.current_thread()
+    if isinstance(thread, tpjobqueue.Worker):
+        return thread.pool() is pool
+    return getattr(thread, "pyroJobPool", None) is pool
+
 
 class Future(object):
     """
@@ -41,9 +90,7 @@ class Future(object):
         chain = self.chain
         del self.chain  # make it impossible to add new calls to the chain once we started executing it
         result=FutureResult()  # notice that the call chain doesn't sit on the result object
-        thread=threadutil.Thread(target=self.__asynccall, args=(result, chain, args, kwargs))
-        thread.setDaemon(True)
-        thread.start()
+        submit(functools.partial(self.__asynccall, result, chain, args, kwargs))
         return result
 
     def __asynccall(self, asyncresult, chain, args, kwargs):
@@ -74,6 +121,7 @@ class FutureResult(object):
     def __init__(self):
         self.__ready=threadutil.Event()
         self.callchain=[]
+        self.callbacks=[]
         self.valueLock=threadutil.Lock()
 
     def wait(self, timeout=None):
@@ -92,6 +140,10 @@ class FutureResult(object):
         """Boolean that contains the readiness of the async result"""
         return self.__ready.isSet()
 
+    def done(self):
+        """Same as the ready property, like the done method of the other futures."""
+        return self.__ready.isSet()
+
     def get_value(self):
         self.__ready.wait()
         if isinstance(self.__value, _ExceptionWrapper):
@@ -102,34 +154,176 @@ class FutureResult(object):
     def set_value(self, value):
         with self.valueLock:
             self.__value=value
-            # walk the call chain but only as long as the result is not an exception
-            if not isinstance(value, _ExceptionWrapper):
-                for call, args, kwargs in self.callchain:
-                    call = functools.partial(call, self.__value)
-                    self.__value = call(*args, **kwargs)
-                    if isinstance(self.__value, _ExceptionWrapper):
-                        break
-            self.callchain=[]
-            self.__ready.set()
+            chained=self.callchain and not isinstance(value, _ExceptionWrapper)
+            if not chained:
+                callbacks=self.__setReady()
+        if not chained:
+            self.__invokeCallbacks(callbacks)
+        else:
+            # the call chain runs on the executor, not in this thread and not while holding the lock
+            # (when the pool is full, submit gives it an extra thread if this is a job of the pool)
+            submit(self.__runCallchain)
 
     value=property(get_value, set_value, None, "The result value of the call. Reading it will block if not available yet.")
 
+    def __runCallchain(self):
+        # calls that are added with then() while the chain runs are processed as well
+        while True:
+            with self.valueLock:
+                if not self.callchain or isinstance(self.__value, _ExceptionWrapper):
+                    callbacks=self.__setReady()
+                    break
+                call, args, kwargs = self.callchain.pop(0)
+                value=self.__value
+            try:
+                value=call(value, *args, **kwargs)
+            except Exception:
+                value=_ExceptionWrapper(sys.exc_info()[1])
+            with self.valueLock:
+                self.__value=value
+        self.__invokeCallbacks(callbacks)
+
+    def __setReady(self):
+        # must be called with the valueLock acquired, returns the callbacks to invoke
+        self.callchain=[]
+        callbacks, self.callbacks = self.callbacks, []
+        self.__ready.set()
+        return callbacks
+
+    def __invokeCallbacks(self, callbacks):
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                log.exception("exception calling callback for %r", self)
+
     def then(self, call, *args, **kwargs):
         """
         Add a callable to the call chain, to be invoked when the results become available.
         The result of the current call will be used as the first argument for the next call.
         Optional extra arguments can be provided in args and kwargs.
         """
-        if self.__ready.isSet():
-            # value is already known, we need to process it immediately (can't use the callchain anymore)
-            call = functools.partial(call, self.__value)
-            self.__value = call(*args, **kwargs)
-        else:
+        with self.valueLock:
             # add the call to the callchain, it will be processed later when the result arrives
-            with self.valueLock:
-                self.callchain.append((call, args, kwargs))
+            self.callchain.append((call, args, kwargs))
+            if not self.__ready.isSet():
+                return self
+            # value is already known, the result isn't ready again until the call has been processed on the executor
+            self.__ready.clear()
+        submit(self.__runCallchain)
         return self
 
+    def add_done_callback(self, fn):
+        """
+        Call fn with this result object as argument when the result is ready (after its call chain),
+        right away if it is ready already. Unlike the call chain, it doesn't change the value.
+        """
+        with self.valueLock:
+            if not self.__ready.isSet():
+                self.callbacks.append(fn)
+                return
+        fn(self)
+
+    def remove_done_callback(self, fn):
+        """Removes a callback that was added with add_done_callback and hasn't been called yet."""
+        with self.valueLock:
+            if fn in self.callbacks:
+                self.callbacks.remove(fn)
+
+
+class _Waiter(object):
+    """Done callback that collects the futures as they complete, for wait_all, wait_any and as_completed."""
+    def __init__(self):
+        self.condition=threadutil.Condition()
+        self.finished=[]
+
+    def __call__(self, future):
+        with self.condition:
+            self.finished.append(future)
+            self.condition.notify()
+
+
+def _watch(futures):
+    """returns the set of the futures and a _Waiter that is told when each of them completes"""
+    futures=set(futures)
+    waiter=_Waiter()
+    for future in futures:
+        future.add_done_callback(waiter)
+    return futures, waiter
+
+
+def _unwatch(futures, waiter):
+    """removes the _Waiter from the futures that are not done, so that repeated waits don't pile them up"""
+    for future in futures:
+        if isinstance(future, FutureResult):
+            future.remove_done_callback(waiter)
+            continue
+        # concurrent.futures.Future has no method for this, its own wait() removes its waiters the same way
+        condition=getattr(future, "_condition", None)
+        callbacks=getattr(future, "_done_callbacks", None)
+        if condition is not None and callbacks is not None:
+            with condition:
+                if waiter in callbacks:
+                    callbacks.remove(waiter)
+
+
+def _wait(futures, count, timeout):
+    futures, waiter = _watch(futures)
+    try:
+        deadline=None if timeout is None else time.time()+timeout
+        with waiter.condition:
+            while len(waiter.finished)<min(count, len(futures)):
+                remaining=None if deadline is None else deadline-time.time()
+                if remaining is not None and remaining<=0:
+                    break
+                waiter.condition.wait(remaining)
+            done=set(waiter.finished)
+    finally:
+        _unwatch(futures, waiter)
+    return done, futures-done
+
+
+def wait_all(futures, timeout=None):
+    """
+    Waits until all of the futures are done, or until the timeout (in seconds) expires.
+    The futures can be FutureResults (from async proxies and Futures), ClientFutures (from isasync methods)
+    and concurrent.futures.Futures, mixed. Returns the sets (done, not_done) of the futures.
+    No thread is used for the waiting: every future tells the waiting thread when it is done.
+    """
+    return _wait(futures, sys.maxsize, timeout)
+
+
+def wait_any(futures, timeout=None):
+    """
+    Waits until at least one of the futures is done, or until the timeout (in seconds) expires.
+    Returns the sets (done, not_done) of the futures, see wait_all.
+    """
+    return _wait(futures, 1, timeout)
+
+
+def as_completed(futures, timeout=None):
+    """
+    Generator that yields the futures (see wait_all) as they are done. Raises concurrent.futures.TimeoutError
+    if not all of them are done within the timeout (in seconds) from the time of the call.
+    """
+    futures, waiter = _watch(futures)
+    try:
+        deadline=None if timeout is None else time.time()+timeout
+        pending=len(futures)
+        while pending:
+            with waiter.condition:
+                while not waiter.finished:
+                    remaining=None if deadline is None else deadline-time.time()
+                    if remaining is not None and remaining<=0:
+                        raise cfutures.TimeoutError("%d of %d futures are not done" % (pending, len(futures)))
+                    waiter.condition.wait(remaining)
+                finished, waiter.finished = waiter.finished, []
+            for future in finished:
+                pending-=1
+                yield future
+    finally:
+        _unwatch(futures, waiter)
+
 
 class _ExceptionWrapper(object):
     """Class that wraps a remote exception. If this is returned, Pyro will
@@ -144,6 +338,61 @@ class _ExceptionWrapper(object):
             util.fixIronPythonExceptionForPickle(self.exception, False)
         raise self.exception
 
+class FutureTable(object):
+    """
+    The futures of the isasync calls that a daemon is running, so that their clients can cancel them.
+    A future is kept under the connection of its client and the id that the client gave it: a small
+    integer for clients that get the outcome on their connection, or the uri of the client's future
+    (with connection None) for clients that have it sent to their future daemon.
+    When a client disconnects, its futures are taken out all at once.
+    """
+    def __init__(self):
+        self.lock=threadutil.Lock()
+        self.connections={}     # connection -> {future id -> future}
+        self.count=0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, conn, futureId, future):
+        with self.lock:
+            futures=self.connections.get(conn)
+            if futures is None:
+                futures=self.connections[conn]={}
+            if futureId not in futures:
+                self.count+=1
+            futures[futureId]=future
+
+    def get(self, conn, futureId):
+        """returns the future, or None if it is unknown (finished already, or its client is gone)"""
+        futures=self.connections.get(conn)
+        if futures is None:
+            return None
+        return futures.get(futureId)
+
+    def remove(self, conn, futureId):
+        """takes the future out of the table, returns it (None if it was already gone)"""
+        with self.lock:
+            futures=self.connections.get(conn)
+            if futures is None:
+                return None
+            future=futures.pop(futureId, None)
+            if future is not None:
+                self.count-=1
+                if not futures:
+                    del self.connections[conn]
+            return future
+
+    def removeConnection(self, conn):
+        """takes all futures of the connection out of the table, returns them"""
+        with self.lock:
+            futures=self.connections.pop(conn, None)
+            if futures is None:
+                return []
+            self.count-=len(futures)
+        return list(futures.values())
+
+
 # This is support for functions returning a Future
 # Such function must be decorated by @isasync (or be part of proxy._pyroAsyncs)
 # When such a function is called (on the proxy), a new ClientFuture is first
@@ -171,6 +420,11 @@ class _ExceptionWrapper(object):
 # Note that when the ClientFuture is not used by the client (a very common case),
 # it is still kept (by the futureDaemon), until the real future sends one of
 # outcomes.
+#
+# If the daemon supports the "completions" handshake extension, the proxy sends
+# a small integer id instead of the ClientFuture, and the daemon sends the outcome
+# back on the connection of the call (see core._ConnectionFuture). The daemon keeps
+# the futures it runs in a FutureTable, by connection and id.
 
 # TODO: reorganise so that:
 # * The remote call only returns when the call is done. => slower but we get the
@@ -212,6 +466,8 @@ class ClientFuture(object):
         self._waiters = []
         self._done_callbacks = []
         self._proxy = proxy
+        # the id on the connection of the proxy, when the daemon sends the outcome back on it
+        self._completionId = None
 
         # For ProgressiveFuture
         self._upd_callbacks = []
@@ -240,7 +496,10 @@ class ClientFuture(object):
                 return False
             # get the uri before we release the lock
             # in case the future gets unregistered just after
-            uri = self._pyroDaemon.uriFor(self).asString()
+            if self._completionId is not None:
+                uri = self._completionId
+            else:
+                uri = self._pyroDaemon.uriFor(self).asString()
 
         # need to cancel the real future
         # One problem: we cannot take the lock when calling remote
@@ -0,0 +1,113 @@
+"""
+Compact handles for the object ids and method names that are used on a connection
+(the "intern" protocol extension, see Pyro4.handshake).
+
+A connection almost always calls the same object and a few of its methods. The client gives each
+object id and method name that it uses a small integer handle. The first requests with a name carry
+the (handle, name) pair, once a reply shows that the daemon knows it, the requests only carry the handle.
+The daemon keeps what the handles of a connection resolve to, so that it doesn't have to look up the
+object and its method again for every request.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+from Pyro4 import threadutil
+from Pyro4.errors import ProtocolError
+
+__all__=["ClientHandles", "DaemonHandles", "MAX_HANDLES"]
+
+MAX_HANDLES=4096    # names beyond this many are sent as they are
+
+
+class ClientHandles(object):
+    """
+    The handles that a client connection assigned. A name is sent together with its handle until
+    a successful reply to a request with that pair confirms that the daemon has it. Pipelined requests
+    can be processed out of order by the daemon, so sending a handle before that isn't safe.
+    """
+    def __init__(self):
+        self.lock=threadutil.Lock()
+        self.known={}       # name -> handle, the daemon knows these
+        self.sent={}        # name -> handle, sent to the daemon but not confirmed yet
+        self.nextHandle=0
+
+    def encode(self, name):
+        """returns the handle of the name, or the (handle, name) pair if the daemon doesn't know it yet"""
+        handle=self.known.get(name)
+        if handle is not None:
+            return handle
+        with self.lock:
+            handle=self.sent.get(name)
+            if handle is None:
+                if self.nextHandle>=MAX_HANDLES:
+                    return name
+                handle=self.sent[name]=self.nextHandle
+                self.nextHandle+=1
+        return handle, name
+
+    def confirm(self, *encoded):
+        """the request with these encoded names got a successful reply, the daemon knows their handles now"""
+        for value in encoded:
+            if type(value) is tuple:
+                handle, name = value
+                self.known[name]=handle
+                with self.lock:
+                    self.sent.pop(name, None)
+
+
+class DaemonHandles(object):
+    """
+    The names that the client of a connection gave a handle, and what the object and method handles of
+    the requests resolve to. The resolved methods are dropped when objects are registered or unregistered.
+    """
+    def __init__(self):
+        self.names={}       # handle -> name
+        self.targets={}     # (object handle, method handle) -> (registry version, target)
+
+    def decode(self, value):
+        """returns the name of an encoded object id or method name, and learns the pairs with a new handle"""
+        if type(value) is int:
+            try:
+                return self.names[value]
+            except KeyError:
+                raise ProtocolError("unknown handle %d" % value)
+        if type(value) in (tuple, list):     # some serializers turn the pair into a list
+            handle, name = value
+            if not 0<=handle<MAX_HANDLES:
+                raise ProtocolError("invalid handle %d" % handle)
+            self.names[handle]=name
+            return name
+        return value
+
+    def lookup(self, daemon, objId, method):
+        """
+        Returns the object id, method name, object (None if unknown) and the resolved method (as returned by
+        Daemon._resolveMethod, None if it couldn't be resolved, the daemon then tries it again itself to report
+        the error) of a request.
+        """
+        version=daemon._registryVersion
+        try:
+            entry=self.targets[objId, method]
+            if entry[0]==version:
+                return entry[1]
+        except (KeyError, TypeError):
+            pass    # not resolved yet, or a new pair that the serializer turned into a (unhashable) list
+        encoded=(objId, method)
+        objId=self.decode(objId)
+        method=self.decode(method)
+        obj=daemon.objectsById.get(objId)
+        resolved=None
+        if obj is not None:
+            try:
+                resolved=daemon._resolveMethod(obj, method)
+            except AttributeError:
+                pass
+        target=(objId, method, obj, resolved)
+        # Only plain method names are kept, they resolve the same regardless of DOTTEDNAMES.
+        # The version is the one from before the lookup, a concurrent (un)register makes the next request resolve again.
+        if resolved is not None and type(encoded[0]) is int and type(encoded[1]) is int and "." not in method and not method.startswith("_"):
+            if len(self.targets)>=MAX_HANDLES:
+                self.targets.clear()
+            self.targets[encoded]=(version, target)
+        return target
@@ -0,0 +1,149 @@
+"""
+The capabilities of both sides of a connection, and the options that they agree on in the connection handshake.
+
+The daemon announces its capabilities in the data of the CONNECTOK message: the mac algorithms,
+serializers and compression codecs that it supports, its maximum message size and the protocol
+extensions it knows. If it knows the "connect" extension, the client sends its own capabilities
+back in a CONNECT message. That message goes out in front of the first request of the client,
+so it doesn't cost a round trip and the daemon never has to wait for it. Both sides then work out
+the same options from the two sets of capabilities, and the connection runs with those.
+A peer that doesn't announce its capabilities (an older Pyro version) is taken to support only
+what every version supports: hmac-sha1, pickle and zlib.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import Pyro4
+from Pyro4 import compression, msgauth, util
+from Pyro4.errors import ProtocolError
+
+__all__=["Capabilities", "ConnectionOptions", "agree", "EXTENSIONS", "LEGACY"]
+
+#: The protocol extensions that this version knows.
+#: ``connect``: accepts the capabilities of the client in a CONNECT message.
+#: ``zstream``: understands messages that are compressed with a compression stream.
+#: ``pipelining``: processes the pipelined requests of a connection in parallel (depends on the server type of the daemon).
+#: ``intern``: object ids and method names can be sent as compact handles (see Pyro4.handles).
+#: ``completions``: sends the outcome of isasync calls back as FUTURE messages on the connection of the call
+#: (depends on the server type of the daemon, like ``pipelining``).
+EXTENSIONS=("connect", "zstream", "pipelining", "intern", "completions")
+
+# A daemon and its clients see the same few capabilities over and over again, so they are parsed
+# and agreed on only once. The cached objects are shared by the connections and must not be changed.
+_cache={}
+_CACHE_SIZE=64
+
+def _cached(key, create):
+    result=_cache.get(key)
+    if result is None:
+        if len(_cache)>=_CACHE_SIZE:
+            _cache.clear()
+        result=_cache[key]=create()
+    return result
+
+
+class Capabilities(object):
+    """What one side of a connection supports. The names are in the order of preference of that side."""
+    __slots__=["macs", "serializers", "codecs", "maxMessageSize", "extensions"]
+
+    def __init__(self, macs, serializers, codecs, maxMessageSize=0, extensions=()):
+        self.macs=list(macs)
+        self.serializers=list(serializers)
+        self.codecs=list(codecs)
+        self.maxMessageSize=maxMessageSize     # 0 = no maximum
+        self.extensions=frozenset(extensions)
+
+    def __repr__(self):
+        return "<%s.%s %s>" % (self.__class__.__module__, self.__class__.__name__, self.encode().replace("\n", "; "))
+
+    @classmethod
+    def local(cls, macAlgorithms=None, extensions=EXTENSIONS):
+        """the capabilities of this side, from the registered serializers and codecs and the config items"""
+        serializers=util.getSerializers()
+        codecs=compression.getCodecs()
+        macs=Pyro4.config.MAC_ALGORITHMS if macAlgorithms is None else tuple(macAlgorithms)
+        key=("local", macs, tuple(serializers), tuple(codecs), Pyro4.config.MAX_MESSAGE_SIZE, frozenset(extensions))
+
+        def create():
+            algorithms=msgauth.getAlgorithms(macs) if macAlgorithms is None else macAlgorithms
+            return cls([algorithm.name for algorithm in algorithms], [serializer.name for serializer in serializers],
+                       [codec.name for codec in codecs], Pyro4.config.MAX_MESSAGE_SIZE, extensions)
+        return _cached(key, create)
+
+    def encode(self):
+        """the capabilities as text, one "name=value" line per item"""
+        return _cached(("encode", self), self.__encode)
+
+    def __encode(self):
+        return "mac=%s\nserializers=%s\ncodecs=%s\nmaxsize=%d\next=%s" % (",".join(self.macs), ",".join(self.serializers),
+            ",".join(self.codecs), self.maxMessageSize, ",".join(sorted(self.extensions)))
+
+    @classmethod
+    def decode(cls, text):
+        """
+        Parses the capabilities from the text of a handshake message. Unknown items are ignored
+        (they come from a newer version), missing items are taken from LEGACY.
+        """
+        return _cached(("decode", text), lambda: cls.__decode(text))
+
+    @classmethod
+    def __decode(cls, text):
+        items=dict(line.split("=", 1) for line in text.split("\n") if "=" in line)
+
+        def names(key, default):
+            if key not in items:
+                return default
+            return [name.strip() for name in items[key].split(",") if name.strip()]
+        try:
+            maxMessageSize=int(items.get("maxsize", 0))
+        except ValueError:
+            raise ProtocolError("invalid maxsize in handshake: %s" % items["maxsize"])
+        return cls(names("mac", LEGACY.macs), names("serializers", LEGACY.serializers), names("codecs", LEGACY.codecs),
+                   maxMessageSize, names("ext", LEGACY.extensions))
+
+
+#: The capabilities of a peer that didn't announce them
+LEGACY=Capabilities(["hmac-sha1"], ["pickle"], ["zlib"])
+
+
+def agree(daemon, client, wantStreamCompression=False):
+    """returns the ConnectionOptions for the capabilities of the daemon and the client"""
+    return _cached(("agree", daemon, client, wantStreamCompression), lambda: ConnectionOptions(daemon, client, wantStreamCompression))
+
+
+class ConnectionOptions(object):
+    """
+    The options that a connection runs with, agreed from the capabilities of the daemon and of the client.
+    Both sides come to the same options: the mac algorithm is the first one of the daemon that the client
+    supports as well (None if there is none), the serializers, codecs and extensions are the ones that both
+    support, and the maximum message size is the smallest one of both.
+    The wantStreamCompression option is local: if this side wants to compress what it sends with a
+    compression stream. It only does so if the other side supports it.
+    """
+    __slots__=["daemon", "client", "mac", "serializers", "codecIds", "maxMessageSize", "extensions", "wantStreamCompression"]
+
+    def __init__(self, daemon, client, wantStreamCompression=False):
+        self.daemon=daemon
+        self.client=client
+        self.mac=None
+        for name in daemon.macs:
+            if name in client.macs:
+                self.mac=name
+                break
+        self.serializers=frozenset(daemon.serializers) & frozenset(client.serializers)
+        common=frozenset(daemon.codecs) & frozenset(client.codecs)
+        self.codecIds=frozenset(codec.codecId for codec in compression.getCodecs() if codec.name in common)
+        sizes=[size for size in (daemon.maxMessageSize, client.maxMessageSize) if size>0]
+        self.maxMessageSize=min(sizes) if sizes else 0
+        self.extensions=daemon.extensions & client.extensions
+        self.wantStreamCompression=wantStreamCompression
+
+    @property
+    def streamCompression(self):
+        """if this side compresses what it sends with a compression stream"""
+        return self.wantStreamCompression and "zstream" in self.extensions
+
+    def __repr__(self):
+        return "<%s.%s mac %s, serializers %s, codecs %s, maxsize %d, extensions %s>" % (self.__class__.__module__,
+            self.__class__.__name__, self.mac, ",".join(sorted(self.serializers)), sorted(self.codecIds),
+            self.maxMessageSize, ",".join(sorted(self.extensions)))
@@ -0,0 +1,138 @@
+"""
+Message authentication codes (MACs), that sign the messages with the shared HMAC_KEY.
+
+The MAC algorithm of a connection is negotiated in the connection handshake: the daemon
+announces the algorithms it supports, and the client uses the first one of those that it
+supports as well. Every connection keeps the keyed state of its algorithm, which is copied
+for each message instead of applying the key again.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import hashlib
+import hmac
+import Pyro4
+
+__all__=["MacAlgorithm", "MacState", "registerAlgorithm", "getAlgorithm", "getAlgorithms", "DIGEST_SIZE"]
+
+DIGEST_SIZE=20      # the size of the mac field in the message header
+
+_compareDigest=getattr(hmac, "compare_digest", lambda a, b: a==b)
+
+
+class MacAlgorithm(object):
+    """
+    Base class for the MAC algorithms. The keyed method returns a hash object that has
+    the key already applied, and that produces a digest of DIGEST_SIZE bytes.
+    """
+    name=None
+
+    def keyed(self, key):
+        raise NotImplementedError("implement in subclass")
+
+    def __repr__(self):
+        return "<%s.%s %r>" % (self.__class__.__module__, self.__class__.__name__, self.name)
+
+
+class HmacSha1(MacAlgorithm):
+    """HMAC with SHA-1, the algorithm of older Pyro versions. Always available."""
+    name="hmac-sha1"
+
+    def keyed(self, key):
+        return hmac.new(key, digestmod=hashlib.sha1)
+
+
+class Blake2b(MacAlgorithm):
+    """Keyed BLAKE2b (Python 3.6+), a lot faster than HMAC. Keys longer than 64 bytes are hashed first."""
+    name="blake2b"
+
+    def keyed(self, key):
+        if len(key)>hashlib.blake2b.MAX_KEY_SIZE:
+            key=hashlib.blake2b(key).digest()
+        return hashlib.blake2b(key=key, digest_size=DIGEST_SIZE)
+
+
+class Blake2s(MacAlgorithm):
+    """Keyed BLAKE2s (Python 3.6+), faster than BLAKE2b on 32-bit platforms. Keys longer than 32 bytes are hashed first."""
+    name="blake2s"
+
+    def keyed(self, key):
+        if len(key)>hashlib.blake2s.MAX_KEY_SIZE:
+            key=hashlib.blake2s(key).digest()
+        return hashlib.blake2s(key=key, digest_size=DIGEST_SIZE)
+
+
+_algorithms={}
+
+def registerAlgorithm(algorithm):
+    """Register a MAC algorithm instance, so that connections can use it"""
+    _algorithms[algorithm.name]=algorithm
+
+def getAlgorithm(name):
+    """returns the registered MAC algorithm with the given name"""
+    try:
+        return _algorithms[name]
+    except KeyError:
+        raise ValueError("unknown or unavailable mac algorithm: %s" % name)
+
+def getAlgorithms(names):
+    """returns the registered MAC algorithms from the comma separated names, unavailable ones are skipped"""
+    names=[name.strip() for name in names.split(",")]
+    return [_algorithms[name] for name in names if name in _algorithms]
+
+registerAlgorithm(HmacSha1())
+if hasattr(hashlib, "blake2b"):
+    registerAlgorithm(Blake2b())
+    registerAlgorithm(Blake2s())
+
+
+class MacState(object):
+    """
+    The MAC state of a connection: the algorithm, and its keyed hash object for the current HMAC_KEY.
+    A daemon connection starts with the candidate algorithms that it announced to the client.
+    The first message that it verifies shows which one the client chose, from then on only that one is used.
+    Until then, it signs what it sends with hmac-sha1: the client may be an older version that knows no other.
+    """
+    __slots__=["algorithms", "key", "keyedState"]
+
+    def __init__(self, algorithms):
+        self.algorithms=list(algorithms)
+        self.key=None
+        self.keyedState=None
+
+    @property
+    def algorithm(self):
+        """the algorithm of the connection, None if it is not known yet"""
+        return self.algorithms[0] if len(self.algorithms)==1 else None
+
+    def digest(self, databytes):
+        """computes the mac of the message data, which can also be a list of buffers"""
+        if len(self.algorithms)>1:
+            return default.digest(databytes)    # the algorithm of the client isn't known yet
+        key=Pyro4.config.HMAC_KEY
+        if key is not self.key:
+            self.keyedState=self.algorithms[0].keyed(key)
+            self.key=key
+        mac=self.keyedState.copy()
+        if type(databytes) is list:
+            for part in databytes:
+                mac.update(part)
+        else:
+            mac.update(databytes)
+        return mac.digest()
+
+    def verify(self, databytes, datamac):
+        """checks the mac of the message data"""
+        if len(self.algorithms)>1:
+            # the client chose one of the announced algorithms, find out which one
+            for algorithm in self.algorithms:
+                if _compareDigest(MacState([algorithm]).digest(databytes), datamac):
+                    self.algorithms=[algorithm]
+                    self.key=None
+                    return True
+            return False
+        return _compareDigest(self.digest(databytes), datamac)
+
+
+#: The MAC state for messages that aren't sent on a connection with a negotiated algorithm (such as the handshake)
+default=MacState([_algorithms[HmacSha1.name]])
@@ -0,0 +1,323 @@
+"""
+Socket server based on the asyncio event loop (requires Python 3.5 or newer).
+
+All client connections are handled by a single event loop. Requests are processed
+concurrently, also when they arrive over the same connection, so a client can
+pipeline its calls; the responses are sent back as soon as they are ready.
+Methods that are coroutine functions are awaited in the event loop itself,
+other methods are called in a thread pool so they can't block the event loop.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import inspect
+import logging
+import os
+import socket
+import sys
+import threading
+from Pyro4 import errors, util, futures
+from Pyro4.socketserver.multiplexserver import MultiplexedSocketServerBase
+import Pyro4.aio
+import Pyro4.core
+
+log=logging.getLogger("Pyro4.socketserver.asyncio")
+
+_allTasks=getattr(asyncio, "all_tasks", None) or asyncio.Task.all_tasks    # asyncio.all_tasks is new in Python 3.7
+
+
+class AsyncioConnection(object):
+    """Connection to a client over an asyncio stream. Messages can be sent from any thread."""
+    def __init__(self, reader, writer, loop, loopThread):
+        self.reader=reader
+        self.writer=writer
+        self.loop=loop
+        self.loopThread=loopThread
+        self.objectId=None
+        self.compressStream=None
+        self.decompressStream=None
+        self.macState=None
+        self.options=None
+        self.handshakeMessage=None
+        self.handshakePending=False
+        self.handles=None
+        self.sendLock=threading.Lock()
+        self.queued=0   # the number of messages that other threads handed to the event loop, and that it hasn't written yet
+
+    def __repr__(self):
+        return "<%s at 0x%x, peer %s>" % (self.__class__.__name__, id(self), self.writer.get_extra_info("peername"))
+
+    @property
+    def closed(self):
+        return self.writer.transport.is_closing()
+
+    def send(self, data):
+        """
+        send the data, or a list of buffers (a message with out-of-band frames).
+        The messages are written in the order of the calls, also when they come from different threads:
+        a compressed message stream can only be decompressed in that order.
+        """
+        if self.closed:
+            raise errors.ConnectionClosedError("sending: connection closed")
+        with self.sendLock:
+            if threading.get_ident()==self.loopThread and not self.queued:
+                self.__write(data)
+            else:
+                # the event loop writes it after the messages that were handed to it before
+                self.queued+=1
+                self.loop.call_soon_threadsafe(self.__writeQueued, data)
+
+    def __writeQueued(self, data):
+        with self.sendLock:
+            self.queued-=1
+            self.__write(data)
+
+    def __write(self, data):
+        if type(data) is list:
+            self.writer.writelines(data)
+        else:
+            self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+
+class SocketServer_Asyncio(MultiplexedSocketServerBase):
+    """transport server for socket connections, asyncio event loop version."""
+    pipelining=True     # the requests of a connection run as concurrent tasks
+
+    def init(self, daemon, host, port, unixsocket=None):
+        super(SocketServer_Asyncio, self).init(daemon, host, port, unixsocket)
+        self.clients=set()
+        self.unixsocket=unixsocket
+        self.eventloop=None  # the event loop, while serving
+        self.loopThread=None
+        self.stopped=None    # event to stop serving
+        self.closing=False
+        self.executor=concurrent.futures.ThreadPoolExecutor(max_workers=Pyro4.config.THREADPOOL_MAXTHREADS)
+
+    def loop(self, loopCondition=lambda: True):
+        """create an event loop in the current thread and serve requests on it"""
+        log.debug("entering asyncio-based requestloop")
+        if self.closing:
+            return
+        loop=asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.serve(loopCondition))
+        except KeyboardInterrupt:
+            log.debug("stopping on break signal")
+        finally:
+            # let the requests that are still running notice that we're done
+            tasks=_allTasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            asyncio.set_event_loop(None)
+            loop.close()
+        log.debug("exit asyncio-based requestloop")
+
+    async def serve(self, loopCondition=lambda: True):
+        """serve requests on the running event loop until the server is closed or the loop condition becomes false"""
+        if self.closing:
+            return
+        self.eventloop=asyncio.get_event_loop()
+        self.loopThread=threading.get_ident()
+        self.stopped=asyncio.Event()
+        try:
+            if self.unixsocket:
+                server=await asyncio.start_unix_server(self._handleClient, sock=self.sock)
+            else:
+                server=await asyncio.start_server(self._handleClient, sock=self.sock)
+            try:
+                while loopCondition() and not self.closing:
+                    try:
+                        await asyncio.wait_for(self.stopped.wait(), Pyro4.config.POLLTIMEOUT)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                server.close()
+                for conn in list(self.clients):
+                    conn.close()
+                await server.wait_closed()
+        finally:
+            self.eventloop=None
+            if self.closing:
+                self._close()
+
+    def events(self, eventsockets):
+        raise NotImplementedError("the asyncio server can't be used in an external select loop, use its serve() coroutine instead")
+
+    async def _handleClient(self, reader, writer):
+        conn=AsyncioConnection(reader, writer, self.eventloop, self.loopThread)
+        try:
+            if not self.daemon._handshake(conn):
+                conn.close()
+                return
+        except (socket.error, errors.PyroError):
+            x=sys.exc_info()[1]
+            log.warn("error during connect: %s", x)
+            conn.close()
+            return
+        self.clients.add(conn)
+        MF=Pyro4.core.MessageFactory
+        try:
+            while not self.closing:
+                message=await Pyro4.aio.getMessage(reader, MF.MSG_INVOKE, conn)
+                if message[1] & MF.FLAGS_ONEWAY and not Pyro4.config.ONEWAY_THREADED:
+                    # oneway calls that must not run in the background are processed in order
+                    await self._handleRequest(conn, message)
+                else:
+                    self.eventloop.create_task(self._handleRequest(conn, message))
+                del message
+        except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
+            # client went away or caused a security error
+            pass
+        except errors.PyroError:
+            # protocol error, the message stream of this connection can't be recovered
+            x=sys.exc_info()[1]
+            log.warn("error reading request from %s: %s", conn, x)
+        finally:
+            self.clients.discard(conn)
+            conn.close()
+            self.daemon._clientDisconnect(conn)
+
+    async def _handleRequest(self, conn, message):
+        """
+        Handles a request like Daemon.handleRequest does, the daemon decodes it and sends the reply.
+        Only the calls themselves are different: they are awaited, see _call.
+        """
+        MF=Pyro4.core.MessageFactory
+        daemon=self.daemon
+        if message[1] & (MF.FLAGS_ASYNC | MF.FLAGS_ASYNC_CANCEL):
+            # calls that return a future are handled by the daemon itself,
+            # the result is delivered later through the future of the client
+            try:
+                await self.eventloop.run_in_executor(self.executor, daemon.handleRequest, conn, message)
+            except Exception:
+                conn.close()
+            return
+        request=Pyro4.core._Request()
+        try:
+            daemon._decodeRequest(conn, request, message)
+            del message  # invite GC to collect the request data, don't wait for out-of-scope
+            if request.calls is not None:
+                data=await self._runBatch(request)
+            else:
+                data=await self._call(request.method, request.vargs, request.kwargs, request.coroutine)
+            daemon._sendResult(conn, request, data)
+            del data
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            try:
+                reraise=daemon._requestFailed(conn, request)
+            except (socket.error, errors.ConnectionClosedError):
+                reraise=False
+                conn.close()
+            if reraise:
+                conn.close()    # same as the other servers: drop the connection
+                if request.callback:
+                    raise       # the exception of a callback method is raised in the server, like the others do
+                return
+        try:
+            await conn.drain()
+        except (socket.error, errors.ConnectionClosedError):
+            conn.close()
+
+    async def _runBatch(self, request):
+        """runs the calls of a batch request, like Daemon._runBatch"""
+        if request.chunk is not None:
+            # the client fetches the results in chunks, the daemon runs the calls in a thread of the executor
+            # then (getNextStreamItems), coroutine methods are handed to the event loop
+            calls=[]
+            for method, coroutine, vargs, kwargs in request.calls:
+                if coroutine or (coroutine is None and asyncio.iscoroutinefunction(method)):
+                    method=self._blockingCall(method)
+                calls.append((method, vargs, kwargs))
+            return self.daemon._streamBatch(calls, request.parallel, request.chunk)
+        if request.parallel is not None:
+            return await self._runParallelBatch(request.calls, request.parallel)
+        results=[]
+        for call in request.calls:
+            result=await self._batchedCall(*call)
+            results.append(result)
+            if isinstance(result, futures._ExceptionWrapper):
+                break   # stop processing the rest of the batch
+        return results
+
+    async def _batchedCall(self, method, coroutine, vargs, kwargs):
+        """runs a call of a batch, returns its result or its exception in an _ExceptionWrapper"""
+        try:
+            return await self._call(method, vargs, kwargs, coroutine)
+        except Exception:
+            xv=sys.exc_info()[1]
+            log.debug("Exception occurred while handling batched request: %s", xv)
+            xv._pyroTraceback=util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK)
+            return futures._ExceptionWrapper(xv)
+
+    async def _runParallelBatch(self, calls, parallel):
+        """runs the calls of a parallel batch at the same time (at most parallel or BATCH_THREADS of them), results in order"""
+        limit=asyncio.Semaphore(min(parallel or Pyro4.config.BATCH_THREADS, Pyro4.config.BATCH_THREADS))
+
+        async def run(call):
+            async with limit:
+                return await self._batchedCall(*call)
+        return await asyncio.gather(*[run(call) for call in calls])
+
+    def _blockingCall(self, method):
+        """wraps a coroutine method in a function that runs it in the event loop and waits for its result"""
+        loop=self.eventloop
+
+        def call(*vargs, **kwargs):
+            return asyncio.run_coroutine_threadsafe(method(*vargs, **kwargs), loop).result()
+        return call
+
+    async def _call(self, method, vargs, kwargs, coroutine=None):
+        """
+        await a coroutine method in the event loop, or run a normal method in the thread pool.
+        coroutine tells if the method is a coroutine function, None if that isn't known yet.
+        """
+        if coroutine or (coroutine is None and asyncio.iscoroutinefunction(method)):
+            return await method(*vargs, **kwargs)
+        result=await self.eventloop.run_in_executor(self.executor, functools.partial(method, *vargs, **kwargs))
+        if inspect.isawaitable(result):
+            result=await result
+        return result
+
+    def wakeup(self):
+        """trigger the server to check its loop condition"""
+        loop=self.eventloop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self.stopped.set)
+            except RuntimeError:
+                pass    # event loop is already closed
+
+    def close(self):
+        self.closing=True
+        if self.eventloop is not None:
+            # still serving, the event loop stops the server and closes the connections itself
+            self.wakeup()
+        else:
+            self._close()
+
+    def _close(self):
+        log.debug("closing socketserver")
+        if self.sock:
+            self.sock.close()
+            self.sock=None
+        if self.unixsocket and os.path.exists(self.unixsocket):
+            os.remove(self.unixsocket)
+        self.clients=set()
+        self.executor.shutdown(wait=False)
+
+    @property
+    def sockets(self):
+        return [self.sock] if self.sock else []
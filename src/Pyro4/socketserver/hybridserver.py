@@ -0,0 +1,141 @@
+"""
+Socket server that combines socket multiplexing with a worker thread pool.
+
+A single thread multiplexes all client connections and reads the incoming
+request messages. Every complete request is then processed by a worker thread
+from a thread pool, that also sends the response back to the client.
+The number of worker threads is independent of the number of connections.
+Requests of a single connection are still processed in the order they arrived,
+unless the client pipelines its calls.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+import socket, logging, sys
+import collections
+from Pyro4 import errors, threadutil
+from Pyro4.socketutil import LockedSocketConnection
+from Pyro4.socketserver.multiplexserver import SocketServer_Select, SocketServer_Poll, SocketServer_Epoll
+from Pyro4.socketserver.threadpoolserver import isPipelinedRequest, PipelinedRequestJob
+import Pyro4.core
+import Pyro4.tpjobqueue
+
+log=logging.getLogger("Pyro4.socketserver.hybrid")
+
+
+class RequestJob(object):
+    """
+    Processes the request messages that were read by the multiplexing loop for a single connection.
+    Requests from the same connection are processed one after another, in the order they arrived.
+    """
+    def __init__(self, server, conn, message):
+        self.server=server
+        self.conn=conn
+        self.message=message
+
+    def __call__(self):
+        message, self.message = self.message, None   # don't keep the request data around
+        while message is not None:
+            try:
+                self.server.daemon.handleRequest(self.conn, message)
+            except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
+                # client went away or caused a security error.
+                # Shut the socket down; the multiplexing loop then notices it and cleans up the connection.
+                log.debug("closing connection %s", self.conn)
+                try:
+                    self.conn.sock.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+            message=self.server._nextRequest(self.conn)
+
+    def interrupt(self):
+        pass   # a single request can't be interrupted, let it run to completion
+
+
+class HybridSocketServerMixin(object):
+    """Reads requests in the multiplexing loop and lets the thread pool process them."""
+    connectionType=LockedSocketConnection
+    pipelining=True     # pipelined requests of a connection are processed in parallel
+
+    def init(self, daemon, host, port, unixsocket=None):
+        super(HybridSocketServerMixin, self).init(daemon, host, port, unixsocket)
+        self.pendingLock=threadutil.Lock()
+        self.pending={}     # connection -> requests waiting for the one that is being processed
+        self.jobqueue=Pyro4.tpjobqueue.ThreadPooledJobQueue()
+        log.info("%d workers started", self.jobqueue.workercount)
+
+    def __repr__(self):
+        return "<%s on %s, %d connections, %d workers, %d jobs>" % (self.__class__.__name__, self.locationStr,
+            len(self.clients), self.jobqueue.workercount, self.jobqueue.jobcount)
+
+    def _handleRequest(self, conn):
+        self._readRequest(conn)
+        while conn.buffered:
+            # more requests were received together with the previous one, the socket won't signal them anymore
+            self._readRequest(conn)
+
+    def _readRequest(self, conn):
+        """read a request from the connection and hand it to the thread pool"""
+        MF=Pyro4.core.MessageFactory
+        try:
+            message=MF.getMessage(conn, MF.MSG_INVOKE)
+        except (errors.ConnectionClosedError, errors.SecurityError):
+            raise
+        except errors.PyroError:
+            # protocol error or timeout while reading; there's no way to recover the
+            # message stream of this connection so just let the loop close it
+            x=sys.exc_info()[1]
+            log.warn("error reading request from %s: %s", conn, x)
+            raise errors.ConnectionClosedError(str(x))
+        if isPipelinedRequest(message):
+            # the client accepts replies in any order, process this request in parallel with the others
+            self._process(PipelinedRequestJob(self.daemon, conn, message))
+            return
+        with self.pendingLock:
+            if conn in self.pending:
+                # a worker is still busy with a previous request of this connection, it will pick this one up next
+                self.pending[conn].append(message)
+                return
+            self.pending[conn]=collections.deque()
+        try:
+            self._process(RequestJob(self, conn, message))
+        except errors.ConnectionClosedError:
+            with self.pendingLock:
+                del self.pending[conn]
+            raise
+
+    def _process(self, job):
+        try:
+            self.jobqueue.process(job)
+        except Pyro4.tpjobqueue.JobQueueError:
+            raise errors.ConnectionClosedError("server is shutting down")
+
+    def _nextRequest(self, conn):
+        """Called by a worker when it's done with a request, returns the next pending request of the connection, if any."""
+        with self.pendingLock:
+            pending=self.pending[conn]
+            if pending:
+                return pending.popleft()
+            del self.pending[conn]
+            return None
+
+    def close(self):
+        super(HybridSocketServerMixin, self).close()
+        if not self.jobqueue.closed:
+            self.jobqueue.close()
+
+
+class SocketServer_HybridSelect(HybridSocketServerMixin, SocketServer_Select):
+    """transport server for socket connections, select loop with a worker thread pool."""
+    pass
+
+
+class SocketServer_HybridPoll(HybridSocketServerMixin, SocketServer_Poll):
+    """transport server for socket connections, poll loop with a worker thread pool."""
+    pass
+
+
+class SocketServer_HybridEpoll(HybridSocketServerMixin, SocketServer_Epoll):
+    """transport server for socket connections, epoll loop with a worker thread pool."""
+    pass
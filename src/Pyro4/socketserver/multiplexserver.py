@@ -13,6 +13,9 @@ log=logging.getLogger("Pyro4.socketserver.multiplexed")
 
 class MultiplexedSocketServerBase(object):
     """base class for multiplexed transport server for socket connections"""
+    connectionType=socketutil.SocketConnection   # wrapper class for the client sockets
+    pipelining=False    # the requests of a connection are processed one after another
+
     def init(self, daemon, host, port, unixsocket=None):
         log.info("starting multiplexed socketserver")
         self.sock=None
@@ -53,18 +56,20 @@ class MultiplexedSocketServerBase(object):
             else:
                 # must be client socket, means remote call
                 try:
-                    self.daemon.handleRequest(s)
+                    self._handleRequest(s)
                 except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
                     # client went away or caused a security error
                     s.close()
                     if s in self.clients:
                         self.clients.remove(s)
+                    self.daemon._clientDisconnect(s)
 
     def _handleConnection(self, sock):
         try:
             if sock is None:
                 return
             csock, caddr = sock.accept()
+            socketutil.setNoDelay(csock)
             if Pyro4.config.COMMTIMEOUT:
                 csock.settimeout(Pyro4.config.COMMTIMEOUT)
         except socket.error:
@@ -78,8 +83,12 @@ class MultiplexedSocketServerBase(object):
                 # our server socket got destroyed
                 raise errors.ConnectionClosedError("server socket closed")
             raise
+        return self._createConnection(csock)
+
+    def _createConnection(self, csock):
+        """wrap a newly accepted client socket and do the connection handshake"""
         try:
-            conn=socketutil.SocketConnection(csock)
+            conn=self.connectionType(csock)
             if self.daemon._handshake(conn):
                 return conn
         except (socket.error, errors.PyroError):
@@ -88,6 +97,13 @@ class MultiplexedSocketServerBase(object):
             csock.close()
         return None
 
+    def _handleRequest(self, conn):
+        """handle a request that arrived on the given client connection"""
+        self.daemon.handleRequest(conn)
+        while conn.buffered:
+            # more requests were received together with the previous one, the socket won't signal them anymore
+            self.daemon.handleRequest(conn)
+
     def close(self):
         log.debug("closing socketserver")
         if self.sock:
@@ -151,7 +167,7 @@ class SocketServer_Poll(MultiplexedSocketServerBase):
                             fileno2connection[conn.fileno()]=conn
                     else:
                         try:
-                            self.daemon.handleRequest(conn)
+                            self._handleRequest(conn)
                         except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
                             # client went away or caused a security error
                             try:
@@ -163,6 +179,7 @@ class SocketServer_Poll(MultiplexedSocketServerBase):
                                     poll.unregister(fn)
                                     del fileno2connection[fn]
                                 conn.close()
+                                self.daemon._clientDisconnect(conn)
         except KeyboardInterrupt:
             log.debug("stopping on break signal")
             pass
@@ -206,15 +223,160 @@ class SocketServer_Select(MultiplexedSocketServerBase):
                     if conn in self.clients:
                         rlist.remove(conn)
                         try:
-                            self.daemon.handleRequest(conn)
+                            self._handleRequest(conn)
                         except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
                             # client went away or caused a security error
                             conn.close()
                             if conn in self.clients:
                                 self.clients.remove(conn)
+                            self.daemon._clientDisconnect(conn)
             except socket.timeout:
                 pass   # just continue the loop on a timeout
             except KeyboardInterrupt:
                 log.debug("stopping on break signal")
                 break
         log.debug("exit select-based requestloop")
+
+
+class SocketServer_Epoll(MultiplexedSocketServerBase):
+    """
+    transport server for socket connections, epoll loop multiplex version (Linux only).
+    The client connections stay registered in a persistent epoll set for as long as
+    they live, so idle connections cost nothing in the loop; only the sockets that
+    actually have events are returned by the kernel.
+    The server socket is non-blocking and edge-triggered: every wakeup accepts all
+    connections that are pending at that time. Client sockets are level-triggered,
+    because handling a request consumes exactly one message from the connection.
+    A new connection stays non-blocking until the capabilities of the client and its
+    first request have been received completely, so that a client that connects and
+    then sends nothing, or only part of a message, doesn't hold up the loop.
+    """
+    def init(self, daemon, host, port, unixsocket=None):
+        super(SocketServer_Epoll, self).init(daemon, host, port, unixsocket)
+        self.clients=set()
+        self.fileno2connection={}   # map fd to original connection object
+        self.sock.setblocking(False)
+        self.serverfd=self.sock.fileno()
+        self.epoll=select.epoll()
+        self.epoll.register(self.serverfd, select.EPOLLIN | select.EPOLLET)
+
+    def loop(self, loopCondition=lambda: True):
+        log.debug("enter epoll-based requestloop")
+        try:
+            while loopCondition():
+                try:
+                    events=self.epoll.poll(Pyro4.config.POLLTIMEOUT)
+                except (IOError, OSError, ValueError):
+                    # interrupted system call, or the epoll object was closed because we're shutting down
+                    if not loopCondition():
+                        break
+                    x=sys.exc_info()[1]
+                    if getattr(x, "errno", None) in socketutil.ERRNO_RETRIES:
+                        continue
+                    raise
+                for fd, mask in events:
+                    if fd==self.serverfd:
+                        try:
+                            self._acceptConnections()
+                        except errors.ConnectionClosedError:
+                            log.info("server socket was closed, stopping requestloop")
+                            return
+                    else:
+                        conn=self.fileno2connection.get(fd)
+                        if conn is not None:
+                            self._handleClientEvent(fd, conn)
+        except KeyboardInterrupt:
+            log.debug("stopping on break signal")
+            pass
+        log.debug("exit epoll-based requestloop")
+
+    def events(self, eventsockets):
+        """used for external event loops: handle events that occur on one of the sockets of this server"""
+        for s in eventsockets:
+            if s is self.sock:
+                self._acceptConnections()
+            else:
+                try:
+                    fd=s.fileno()
+                except socket.error:
+                    continue
+                if fd in self.fileno2connection:
+                    self._handleClientEvent(fd, s)
+
+    def _acceptConnections(self):
+        """accept all connections that are waiting on the (non-blocking) server socket"""
+        while self.sock is not None:
+            try:
+                csock, caddr = self.sock.accept()
+            except socket.error:
+                x=sys.exc_info()[1]
+                err=getattr(x, "errno", x.args[0])
+                if err in socketutil.ERRNO_RETRIES:
+                    return   # no more pending connections
+                if err in socketutil.ERRNO_BADF or err in socketutil.ERRNO_ENOTSOCK:
+                    # our server socket got destroyed
+                    raise errors.ConnectionClosedError("server socket closed")
+                raise
+            # the accepted socket may inherit the non-blocking mode of the server socket
+            csock.settimeout(Pyro4.config.COMMTIMEOUT or None)
+            socketutil.setNoDelay(csock)
+            conn=self._createConnection(csock)
+            if conn:
+                csock.setblocking(False)    # until the first request is in, see _handleClientEvent
+                fd=conn.fileno()
+                self.epoll.register(fd, select.EPOLLIN)
+                self.fileno2connection[fd]=conn
+                self.clients.add(conn)
+
+    def _handleClientEvent(self, fd, conn):
+        try:
+            if conn.handshakePending:
+                try:
+                    if not self._firstRequestReceived(conn):
+                        return    # wait for the rest of it
+                except errors.ProtocolError:
+                    x=sys.exc_info()[1]
+                    log.warn("error during connect: %s", x)
+                    self._removeConnection(fd, conn)
+                    return
+                conn.sock.settimeout(Pyro4.config.COMMTIMEOUT or None)
+            self._handleRequest(conn)
+        except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
+            # client went away or caused a security error
+            self._removeConnection(fd, conn)
+
+    def _firstRequestReceived(self, conn):
+        """
+        Receives what is available on the new (non-blocking) connection. Returns True when its first request is buffered,
+        with the capabilities of the client in front of it. Only the first part of a large request has to be buffered,
+        the rest is received like that of the other requests.
+        """
+        MF=Pyro4.core.MessageFactory
+        offset=0
+        while True:
+            buffered=conn.receiveAvailable(offset+MF.HEADERSIZE)
+            if len(buffered)<offset+MF.HEADERSIZE:
+                return False
+            msgType, flags, seq, datalen, datahmac = MF.parseMessageHeader(buffered[offset:offset+MF.HEADERSIZE])
+            end=offset+MF.HEADERSIZE+datalen
+            if end>=socketutil.RECV_BUFFER_MAXSIZE:
+                return True
+            if msgType!=MF.MSG_CONNECT:
+                return len(conn.receiveAvailable(end))>=end
+            offset=end
+
+    def _removeConnection(self, fd, conn):
+        if self.fileno2connection.pop(fd, None) is not None:
+            try:
+                self.epoll.unregister(fd)
+            except (IOError, OSError, ValueError):
+                pass
+        self.clients.discard(conn)
+        conn.close()
+        self.daemon._clientDisconnect(conn)
+
+    def close(self):
+        super(SocketServer_Epoll, self).close()
+        self.clients=set()
+        self.fileno2connection={}
+        self.epoll.close()
@@ -9,7 +9,8 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 from __future__ import with_statement
 import socket, logging, sys, os
 import struct
-from Pyro4 import socketutil, errors
+from Pyro4 import socketutil, errors, util
+import Pyro4.core
 import Pyro4.tpjobqueue
 
 log=logging.getLogger("Pyro4.socketserver.threadpool")
@@ -19,17 +20,25 @@ class ClientConnectionJob(object):
     """
     Takes care of a single client connection and all requests
     that may arrive during its life span.
+    Requests from a pipelining client are handed to the other workers if there are any available,
+    so that they are processed in parallel and replied to as soon as they're done.
     """
-    def __init__(self, clientSocket, clientAddr, daemon):
-        self.csock = socketutil.SocketConnection(clientSocket)
+    def __init__(self, clientSocket, clientAddr, daemon, jobqueue):
+        self.csock = socketutil.LockedSocketConnection(clientSocket)
         self.caddr = clientAddr
         self.daemon = daemon
+        self.jobqueue = jobqueue
 
     def __call__(self):
         if self.handleConnection():
             while True:
                 try:
-                    self.daemon.handleRequest(self.csock)
+                    message=self.readRequest()
+                    if isPipelinedRequest(message) and self.jobqueue.hasCapacity():
+                        self.jobqueue.process(PipelinedRequestJob(self.daemon, self.csock, message))
+                    else:
+                        self.daemon.handleRequest(self.csock, message)
+                    del message
                 except (socket.error, errors.ConnectionClosedError):
                     # client went away.
                     log.debug("disconnected %s", self.caddr)
@@ -37,7 +46,27 @@ class ClientConnectionJob(object):
                 except errors.SecurityError:
                     log.debug("security error on client %s", self.caddr)
                     break
+                except (errors.TimeoutError, errors.ProtocolError, Pyro4.tpjobqueue.JobQueueError):
+                    # timeout or protocol error, the message stream can't be trusted anymore, or the server is shutting down
+                    x=sys.exc_info()[1]
+                    log.debug("closing connection to %s: %s", self.caddr, x)
+                    break
             self.csock.close()
+            self.daemon._clientDisconnect(self.csock)
+
+    def readRequest(self):
+        """
+        Reads the next request message. If it can't be read because of a protocol error, the error is
+        reported to the client (as the daemon does for the errors of a request) and raised again.
+        """
+        MF=Pyro4.core.MessageFactory
+        try:
+            return MF.getMessage(self.csock, MF.MSG_INVOKE)
+        except errors.ProtocolError:
+            xv=sys.exc_info()[1]
+            log.debug("protocol error reading request from %s: %s", self.caddr, xv)
+            self.daemon._sendExceptionResponse(self.csock, 0, xv, util.formatTraceback(detailed=Pyro4.config.DETAILED_TRACEBACK))
+            raise
 
     def handleConnection(self):
         # connection handshake
@@ -66,9 +95,45 @@ class ClientConnectionJob(object):
         self.csock.close()
 
 
+def isPipelinedRequest(message):
+    """
+    Is the request from a pipelining client, that accepts its replies in any order?
+    Oneway calls that must not run in the background are still processed in order.
+    """
+    MF=Pyro4.core.MessageFactory
+    flags=message[1]
+    if flags & MF.FLAGS_PIPELINED:
+        return Pyro4.config.ONEWAY_THREADED or not flags & MF.FLAGS_ONEWAY
+    return False
+
+
+class PipelinedRequestJob(object):
+    """Processes a single request from a pipelining client, in parallel with the other requests of its connection."""
+    def __init__(self, daemon, conn, message):
+        self.daemon=daemon
+        self.conn=conn
+        self.message=message
+
+    def __call__(self):
+        message, self.message = self.message, None   # don't keep the request data around
+        try:
+            self.daemon.handleRequest(self.conn, message)
+        except (socket.error, errors.ConnectionClosedError, errors.SecurityError):
+            # client went away or caused a security error.
+            # Shut the socket down; the job that reads the connection then notices it and cleans up.
+            try:
+                self.conn.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    def interrupt(self):
+        pass   # a single request can't be interrupted, let it run to completion
+
 
 class SocketServer_Threadpool(object):
     """transport server for socket connections, worker thread pool version."""
+    pipelining=True     # pipelined requests of a connection are processed in parallel
+
     def init(self, daemon, host, port, unixsocket=None):
         log.info("starting thread pool socketserver")
         self.daemon = daemon
@@ -130,9 +195,10 @@ class SocketServer_Threadpool(object):
         try:
             csock, caddr=self.sock.accept()
             log.debug("connected %s", caddr)
+            socketutil.setNoDelay(csock)
             if Pyro4.config.COMMTIMEOUT:
                 csock.settimeout(Pyro4.config.COMMTIMEOUT)
-            self.jobqueue.process(ClientConnectionJob(csock, caddr, self.daemon))
+            self.jobqueue.process(ClientConnectionJob(csock, caddr, self.daemon, self.jobqueue))
         except socket.timeout:
             pass  # just continue the loop on a timeout on accept
 
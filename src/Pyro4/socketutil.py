@@ -4,9 +4,11 @@ Low level socket utilities.
 Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
+from __future__ import with_statement
 import socket, os, errno, time, sys
 import re
 from Pyro4.errors import ConnectionClosedError, TimeoutError, CommunicationError
+from Pyro4 import threadutil
 import Pyro4
 
 import select
@@ -196,14 +198,67 @@ def receiveData(sock, size):
         raise TimeoutError("receiving: timeout")
 
 
+def receiveDataInto(sock, buffer):
+    """Receive data from a socket straight into the given (writable) buffer, until it is full.
+    Avoids the extra copies of receiveData for large amounts of data.
+    It is expected the socket is able to supply enough bytes, if it isn't, an exception is raised."""
+    view=memoryview(buffer)
+    size=len(view)
+    msglen=0
+    retrydelay=0.0
+    while msglen<size:
+        try:
+            if USE_MSG_WAITALL:
+                chunksize=sock.recv_into(view[msglen:], size-msglen, socket.MSG_WAITALL)
+            else:
+                # 60k buffer limit avoids problems on certain OSes like VMS, Windows
+                chunksize=sock.recv_into(view[msglen:], min(60000, size-msglen))
+            if not chunksize:
+                raise ConnectionClosedError("receiving: not enough data")
+            msglen+=chunksize
+        except socket.timeout:
+            raise TimeoutError("receiving: timeout")
+        except socket.error:
+            x=sys.exc_info()[1]
+            err=getattr(x, "errno", x.args[0])
+            if err not in ERRNO_RETRIES:
+                raise ConnectionClosedError("receiving: connection lost: "+str(x))
+            time.sleep(0.00001+retrydelay)  # a slight delay to wait before retrying
+            retrydelay=__nextRetrydelay(retrydelay)
+    return buffer
+
+
+def receiveAvailableInto(sock, buffer):
+    """Receive the data that is available on a socket into the given (writable) buffer, as much as fits.
+    Waits until at least some data is available. Returns the number of bytes received, 0 if the connection was closed."""
+    retrydelay=0.0
+    while True:
+        try:
+            chunksize=sock.recv_into(buffer)
+        except socket.timeout:
+            raise TimeoutError("receiving: timeout")
+        except socket.error:
+            x=sys.exc_info()[1]
+            err=getattr(x, "errno", x.args[0])
+            if err not in ERRNO_RETRIES:
+                raise ConnectionClosedError("receiving: connection lost: "+str(x))
+            time.sleep(0.00001+retrydelay)  # a slight delay to wait before retrying
+            retrydelay=__nextRetrydelay(retrydelay)
+            continue
+        return chunksize
+
+
 def sendData(sock, data):
     """
     Send some data over a socket.
     Some systems have problems with ``sendall()`` when the socket is in non-blocking mode.
     For instance, Mac OS X seems to be happy to throw EAGAIN errors too often.
     This function falls back to using a regular send loop if needed.
+    The data can also be a list of buffers, that are sent one after another without joining them first.
     """
-    if sock.gettimeout() is None:
+    if type(data) is list:
+        sendDataParts(sock, data)
+    elif sock.gettimeout() is None:
         # socket is in blocking mode, we can use sendall normally.
         while True:
             try:
@@ -232,6 +287,50 @@ def sendData(sock, data):
                 retrydelay=__nextRetrydelay(retrydelay)
 
 
+MAX_SENDMSG_PARTS=512    # stay well below the IOV_MAX limit of the OS
+
+def sendDataParts(sock, parts):
+    """
+    Send a list of buffers over a socket with scatter-gather I/O (sendmsg), so that they don't have to be
+    joined into a single buffer first. Falls back to sending them one by one if sendmsg isn't available.
+    """
+    if not hasattr(sock, "sendmsg"):
+        for part in parts:
+            sendData(sock, part)
+        return
+    if all(type(part) is bytes for part in parts):
+        views=[part for part in parts if part]     # the common case: a message header and its data
+    else:
+        views=[]
+        for part in parts:
+            view=memoryview(part)
+            if view.itemsize!=1 or view.ndim!=1:
+                view=view.cast("B")
+            if len(view):
+                views.append(view)
+    retrydelay=0.0
+    while views:
+        try:
+            sent=sock.sendmsg(views[:MAX_SENDMSG_PARTS])
+        except socket.timeout:
+            raise TimeoutError("sending: timeout")
+        except socket.error:
+            x=sys.exc_info()[1]
+            err=getattr(x, "errno", x.args[0])
+            if err not in ERRNO_RETRIES:
+                raise ConnectionClosedError("sending: connection lost: "+str(x))
+            time.sleep(0.00001+retrydelay)  # a slight delay to wait before retrying
+            retrydelay=__nextRetrydelay(retrydelay)
+            continue
+        # drop the buffers that have been sent completely, and the sent part of the next one
+        while sent:
+            if sent>=len(views[0]):
+                sent-=len(views.pop(0))
+            else:
+                views[0]=memoryview(views[0])[sent:]
+                sent=0
+
+
 _GLOBAL_DEFAULT_TIMEOUT=object()
 
 def createSocket(bind=None, connect=None, reuseaddr=False, keepalive=True, timeout=_GLOBAL_DEFAULT_TIMEOUT, noinherit=False, ipv6=False):
@@ -321,6 +420,8 @@ def createSocket(bind=None, connect=None, reuseaddr=False, keepalive=True, timeo
                 raise
     if keepalive:
         setKeepalive(sock)
+    if connect:
+        setNoDelay(sock)
     return sock
 
 
@@ -390,6 +491,13 @@ def setKeepalive(sock):
     except Exception:
         pass
 
+def setNoDelay(sock):
+    """sets the TCP_NODELAY option on the socket, if possible (small messages that follow each other aren't held back)"""
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except Exception:
+        pass
+
 try:
     import fcntl
 
@@ -422,13 +530,34 @@ except ImportError:
             pass
 
 
+RECV_BUFFER_SIZE=16384    # initial size of the receive buffer of a connection, larger messages are received into their own buffer
+RECV_BUFFER_MAXSIZE=131072     # the receive buffer grows up to this size
+
 class SocketConnection(object):
-    """A wrapper class for plain sockets, containing various methods such as :meth:`send` and :meth:`recv`"""
-    __slots__=["sock", "objectId"]
+    """
+    A wrapper class for plain sockets, containing various methods such as :meth:`send` and :meth:`recv`.
+    Receiving is buffered: every receive from the socket gets as much data as is available, so that a message
+    header and the data that follows it, or even several small messages, are received with a single system call.
+    The buffer is allocated for a receive and dropped again when it has been read empty, so that idle connections
+    don't hold one. When a receive fills the buffer completely, it is kept and grows for the next receive
+    (up to RECV_BUFFER_MAXSIZE).
+    """
+    __slots__=["sock", "objectId", "recvBuffer", "bufferView", "recvStart", "recvEnd", "recvGrow", "compressStream", "decompressStream",
+               "macState", "options", "handshakeMessage", "handshakePending", "handles"]
 
     def __init__(self, sock, objectId=None):
         self.sock=sock
         self.objectId=objectId
+        self.compressStream=None     # compresses the sent messages, if the connection uses stream compression
+        self.decompressStream=None   # decompresses the received messages, created when the first one arrives
+        self.macState=None     # the negotiated mac algorithm, None = hmac-sha1
+        self.options=None      # the handshake.ConnectionOptions that were agreed on in the handshake
+        self.handshakeMessage=None     # the capabilities of the client, sent in front of its first request
+        self.handshakePending=False    # does the daemon still accept the capabilities of the client (before its first request)
+        self.handles=None      # the handles.ClientHandles or DaemonHandles, if the connection interns names
+        self.recvBuffer=self.bufferView=None    # the receive buffer and a memoryview on it, while it holds data
+        self.recvStart=self.recvEnd=0     # the received data that hasn't been read yet
+        self.recvGrow=False     # did the last receive fill the buffer, so that there probably is more data waiting?
 
     def __del__(self):
         self.close()
@@ -437,7 +566,116 @@ class SocketConnection(object):
         sendData(self.sock, data)
 
     def recv(self, size):
-        return receiveData(self.sock, size)
+        """receive the given number of bytes"""
+        if size>RECV_BUFFER_SIZE:
+            return self.__recvLarge(size)
+        return self.__take(size).tobytes()
+
+    def recvView(self, size):
+        """
+        Receive the given number of bytes, as a memoryview on the receive buffer instead of a copy.
+        The view is only valid until the next receive on this connection.
+        """
+        if size>RECV_BUFFER_SIZE:
+            return memoryview(self.__recvLarge(size))
+        return self.__take(size)
+
+    def recvInto(self, buffer):
+        """receive bytes into the given buffer until it is full"""
+        view=memoryview(buffer)
+        buffered=min(self.recvEnd-self.recvStart, len(view))
+        if buffered:
+            view[:buffered]=self.__take(buffered)
+        if buffered<len(view):
+            receiveDataInto(self.sock, view[buffered:])
+        return buffer
+
+    @property
+    def buffered(self):
+        """the number of bytes that have been received but not yet read"""
+        return self.recvEnd-self.recvStart
+
+    def __take(self, size):
+        """returns a view on the next size bytes in the buffer, receives them first if needed"""
+        start=self.recvStart
+        if self.recvEnd-start<size:
+            start=self.__fill(size)
+        end=start+size
+        view=self.bufferView[start:end]
+        if end==self.recvEnd:
+            self.recvStart=self.recvEnd=0
+            if not self.recvGrow:
+                self.recvBuffer=self.bufferView=None    # don't keep a buffer around for an idle connection
+        else:
+            self.recvStart=end
+        return view
+
+    def receiveAvailable(self, size):
+        """
+        For a non-blocking socket: receives the data that is available, without waiting for more, if the buffer holds
+        less than size bytes (at most RECV_BUFFER_MAXSIZE). Returns a view on all buffered data, that stays buffered.
+        Raises ConnectionClosedError when the connection was closed.
+        """
+        size=max(1, min(size, RECV_BUFFER_MAXSIZE))
+        if self.recvEnd-self.recvStart<size:
+            if self.recvBuffer is None or len(self.recvBuffer)<size:
+                self.__setBuffer(bytearray(max(size, RECV_BUFFER_SIZE)))
+            elif len(self.recvBuffer)-self.recvStart<size:
+                self.__setBuffer(self.recvBuffer)    # not enough room behind the buffered data, move it to the front
+            try:
+                received=self.sock.recv_into(self.bufferView[self.recvEnd:])
+            except socket.error:
+                x=sys.exc_info()[1]
+                err=getattr(x, "errno", x.args[0])
+                if err not in ERRNO_RETRIES:
+                    raise ConnectionClosedError("receiving: connection lost: "+str(x))
+            else:
+                if not received:
+                    raise ConnectionClosedError("receiving: connection closed")
+                self.recvEnd+=received
+        return self.bufferView[self.recvStart:self.recvEnd]
+
+    def __setBuffer(self, buffer):
+        """use a new receive buffer, the buffered data is moved to the front of it"""
+        buffered=self.recvEnd-self.recvStart
+        view=memoryview(buffer)
+        if buffered:
+            view[:buffered]=self.bufferView[self.recvStart:self.recvEnd]
+        self.recvBuffer, self.bufferView = buffer, view
+        self.recvStart, self.recvEnd = 0, buffered
+
+    def __fill(self, size):
+        """
+        receive into the buffer until it contains at least size bytes (at most RECV_BUFFER_SIZE).
+        Returns the start of the buffered data.
+        """
+        if self.recvBuffer is None:
+            self.recvBuffer=bytearray(RECV_BUFFER_SIZE)
+            self.bufferView=memoryview(self.recvBuffer)
+        capacity=len(self.recvBuffer)
+        if self.recvGrow and capacity<RECV_BUFFER_MAXSIZE:
+            # the previous receive filled the buffer, a larger one takes the waiting data in fewer receives
+            self.__setBuffer(bytearray(min(2*capacity, RECV_BUFFER_MAXSIZE)))
+        elif capacity-self.recvStart<size:
+            self.__setBuffer(self.recvBuffer)    # not enough room behind the buffered data, move it to the front
+        start, end = self.recvStart, self.recvEnd
+        while end-start<size:
+            received=receiveAvailableInto(self.sock, self.bufferView[end:])
+            if not received:
+                raise ConnectionClosedError("receiving: not enough data")
+            end+=received
+            self.recvEnd=end
+        self.recvGrow = end==len(self.recvBuffer)
+        return start
+
+    def __recvLarge(self, size):
+        """receive a large message into its own buffer, the part of it that isn't buffered yet is received straight into it"""
+        if self.recvEnd==self.recvStart:
+            return receiveData(self.sock, size)
+        data=self.recvInto(bytearray(size))
+        if sys.version_info<(3, 0):
+            return bytes(data)    # the Python 2 unpicklers want a str
+        return data
 
     def close(self):
         self.sock.close()
@@ -453,6 +691,19 @@ class SocketConnection(object):
     timeout=property(getTimeout, setTimeout)
 
 
+class LockedSocketConnection(SocketConnection):
+    """Socket connection that can safely be used by multiple threads to send complete messages."""
+    __slots__=["lock"]
+
+    def __init__(self, sock, objectId=None):
+        super(LockedSocketConnection, self).__init__(sock, objectId)
+        self.lock=threadutil.Lock()
+
+    def send(self, data):
+        with self.lock:
+            sendData(self.sock, data)
+
+
 def findProbablyUnusedPort(family=socket.AF_INET, socktype=socket.SOCK_STREAM):
     """Returns an unused port that should be suitable for binding (likely, but not guaranteed).
     This code is copied from the stdlib's test.test_support module."""
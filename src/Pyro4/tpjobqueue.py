@@ -28,6 +28,10 @@ class JobQueueError(Exception):
     pass
 
 
+#: What process() does with a job when the queue is full: wait for room, drop the job, or run it in the calling thread
+OVERFLOW_POLICIES=("block", "drop", "inline")
+
+
 class Worker(Pyro4.threadutil.Thread):
     """
     Worker thread that picks jobs from the job queue and executes them.
@@ -74,17 +78,35 @@ class ThreadPooledJobQueue(object):
     """
     A job queue that is serviced by a pool of worker threads that grows or
     shrings as demanded by the work load, between limits set by the
-    THREADPOOL_MINTHREADS and THREADPOOL_MAXTHREADS config items.
+    THREADPOOL_MINTHREADS and THREADPOOL_MAXTHREADS config items
+    (or the minthreads and maxthreads arguments, if given).
+    The queue holds at most maxjobs jobs (0 = no limit), the overflow policy
+    decides what happens with a job when it is full (see OVERFLOW_POLICIES).
     """
-    def __init__(self):
+    def __init__(self, minthreads=None, maxthreads=None, maxjobs=0, overflow="block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("invalid overflow policy: %s" % overflow)
         self.lock = Pyro4.threadutil.Lock()
         self.idle = set()
         self.busy = set()
-        self.jobs = queue.Queue()
+        self.jobs = queue.Queue(maxjobs)
         self.closed = False
-        for _ in range(Pyro4.config.THREADPOOL_MINTHREADS):
+        self.overflow = overflow
+        self.dropped = 0    # the number of jobs that were dropped because the queue was full
+        self.__atMaximum = False    # warned that the pool can't grow, until a worker halts
+        self.__minthreads = minthreads
+        self.__maxthreads = maxthreads
+        for _ in range(self.minthreads):
             self.__spawnIdle()
 
+    @property
+    def minthreads(self):
+        return Pyro4.config.THREADPOOL_MINTHREADS if self.__minthreads is None else self.__minthreads
+
+    @property
+    def maxthreads(self):
+        return Pyro4.config.THREADPOOL_MAXTHREADS if self.__maxthreads is None else self.__maxthreads
+
     def __enter__(self):
         return self
 
@@ -93,9 +115,14 @@ class ThreadPooledJobQueue(object):
 
     def close(self):
         """Close down the thread pool, signaling to all remaining worker threads to shut down."""
+        if self.closed:
+            return
         count = self.workercountSafe
         for _ in range(count):
-            self.jobs.put(None)  # None as a job means: terminate the worker
+            try:
+                self.jobs.put_nowait(None)  # None as a job means: terminate the worker
+            except queue.Full:
+                break   # the workers stop anyway, they don't take new jobs once the queue is closed
         log.debug("closing down, %d halt-jobs issued", count)
         self.closed = True
 
@@ -124,19 +151,30 @@ class ThreadPooledJobQueue(object):
         return self.jobs.qsize()
 
     def __repr__(self):
-        return "<%s.%s at 0x%x, %d idle, %d busy, %d jobs>" % \
-            (self.__class__.__module__, self.__class__.__name__, id(self), len(self.idle), len(self.busy), self.jobcount)
+        return "<%s.%s at 0x%x, %d idle, %d busy, %d jobs, %d dropped>" % \
+            (self.__class__.__module__, self.__class__.__name__, id(self), len(self.idle), len(self.busy), self.jobcount, self.dropped)
 
     def process(self, job):
         """
         Add the job to the general job queue. Job is any callable object.
         If there's no idle worker available to service it, a new one is spawned
         as long as the pool size permits it.
+        If the queue is full, the overflow policy decides: wait until there is room,
+        drop the job (it is counted in the dropped attribute), or run it right away in the calling thread.
         """
+        if self.closed:
+            raise JobQueueError("job queue is closed")
+        try:
+            self.jobs.put(job, self.overflow=="block")     # outside the lock, the workers need it to take jobs
+        except queue.Full:
+            if self.overflow=="drop":
+                with self.lock:
+                    self.dropped += 1
+                log.debug("job queue is full, job dropped")
+            else:
+                job()
+            return
         with self.lock:
-            if self.closed:
-                raise JobQueueError("job queue is closed")
-            self.jobs.put(job)
             if self.jobcount > 0:
                 if not self.idle:
                     self.__spawnIdle()
@@ -145,6 +183,11 @@ class ThreadPooledJobQueue(object):
                     self.__spawnIdle()
                     spawnamount -= 1
 
+    def hasCapacity(self):
+        """Is there a worker available (or can one be spawned) to process a new job without waiting?"""
+        with self.lock:
+            return len(self.idle) > self.jobcount or self.workercount < self.maxthreads
+
     def setIdle(self, worker):
         with self.lock:
             self.busy.remove(worker)
@@ -154,6 +197,12 @@ class ThreadPooledJobQueue(object):
         with self.lock:
             self.idle.remove(worker)
             self.busy.add(worker)
+            # process() adds jobs outside the lock, it may have counted this worker as idle just after
+            # it took its job: make sure that the jobs that are still queued have a worker to run them
+            spawnamount = self.jobcount - len(self.idle)
+            while spawnamount > 0:
+                self.__spawnIdle()
+                spawnamount -= 1
 
     def halted(self, worker, crashed=False):
         """Called by a worker when it halts (exits). This removes the worker from the bookkeeping."""
@@ -166,6 +215,7 @@ class ThreadPooledJobQueue(object):
             self.idle.remove(worker)
         if worker in self.busy:
             self.busy.remove(worker)
+        self.__atMaximum = False
         log.debug("worker halted: %s", worker.name)
 
     def attemptHalt(self, worker):
@@ -174,7 +224,7 @@ class ThreadPooledJobQueue(object):
         Returns true or false depending on whether the worker was actually allowed to halt.
         """
         with self.lock:
-            if self.workercount > Pyro4.config.THREADPOOL_MINTHREADS:
+            if self.workercount > self.minthreads:
                 self.__halted(worker)
                 return True
             return False
@@ -197,9 +247,10 @@ class ThreadPooledJobQueue(object):
         Spawn a new idle worker if there is still room in the pool.
         (must only be called with self.lock acquired)
         """
-        if self.workercount >= Pyro4.config.THREADPOOL_MAXTHREADS:
-            log.warning("Cannot grow the thread pool bigger than %d",
-                            Pyro4.config.THREADPOOL_MAXTHREADS)
+        if self.workercount >= self.maxthreads:
+            if not self.__atMaximum:
+                log.warning("Cannot grow the thread pool bigger than %d", self.maxthreads)
+                self.__atMaximum = True
             return
         worker = Worker(self)
         self.idle.add(worker)
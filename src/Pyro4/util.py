@@ -4,9 +4,10 @@ Miscellaneous utilities.
 Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
-import sys, zlib, logging
+import sys, zlib, logging, io
 import traceback, linecache
 import Pyro4
+from Pyro4.errors import ProtocolError
 
 log=logging.getLogger("Pyro4.util")
 
@@ -115,23 +116,28 @@ def formatTraceback(ex_type=None, ex_value=None, ex_tb=None, detailed=False):
         return traceback.format_exception(ex_type, ex_value, ex_tb)
 
 
-class Serializer(object):
+class SerializerBase(object):
     """
-    A (de)serializer that wraps a certain serialization protocol.
-    Currently it only supports the standard pickle protocol.
-    It can optionally compress the serialized data, and is thread safe.
+    Base class for the (de)serializers that wrap a certain serialization protocol.
+    They can optionally compress the serialized data, and are thread safe.
+    The serializerId identifies the protocol in the message header, so that the
+    other side knows how to deserialize a message.
     """
-    try:
-        import cPickle as pickle
-    except ImportError:
-        import pickle
-    if pickle.HIGHEST_PROTOCOL<2:
-        raise RuntimeError("pickle serializer needs to support protocol 2 or higher")
+    serializerId=None
+    name=None
+
+    def dumps(self, data):
+        """serialize the data object to bytes"""
+        raise NotImplementedError("implement in subclass")
+
+    def loads(self, data):
+        """deserialize the bytes to a data object"""
+        raise NotImplementedError("implement in subclass")
 
     def serialize(self, data, compress=False):
         """Serialize the given data object, try to compress if told so.
         Returns a tuple of the serialized data (bytes) and a bool indicating if it is compressed or not."""
-        data=self.pickle.dumps(data, self.pickle.HIGHEST_PROTOCOL)
+        data=self.dumps(data)
         if not compress or len(data)<200:
             return data, False  # don't waste time compressing small messages
         compressed=zlib.compress(data)
@@ -143,16 +149,171 @@ class Serializer(object):
         """Deserializes the given data (bytes). Set compressed to True to decompress the data first."""
         if compressed:
             data=zlib.decompress(data)
-        return self.pickle.loads(data)
+        return self.loads(data)
+
+    def dumpsOutOfBand(self, data, threshold):
+        """
+        Serialize the data object, but leave out the large buffers (see isOutOfBandBuffer).
+        Returns the serialized data and the list of buffers, that are sent separately.
+        """
+        raise ProtocolError("serializer %s doesn't support out-of-band buffers" % self.name)
+
+    def loadsOutOfBand(self, data, buffers):
+        """deserialize the bytes to a data object, with the buffers that were sent out-of-band"""
+        raise ProtocolError("serializer %s doesn't support out-of-band buffers" % self.name)
+
+    def __repr__(self):
+        return "<%s.%s %r, id %d>" % (self.__class__.__module__, self.__class__.__name__, self.name, self.serializerId)
 
     def __eq__(self, other):
         """this equality method is only to support the unit tests of this class"""
-        return type(other) is Serializer and vars(self)==vars(other)
+        return type(other) is type(self) and vars(self)==vars(other)
     def __ne__(self, other):
         return not self.__eq__(other)
     __hash__=object.__hash__
 
 
+class PickleSerializer(SerializerBase):
+    """
+    A (de)serializer that uses the standard pickle protocol.
+    It can serialize almost any Python object, and is the fallback for data that other serializers can't handle.
+    """
+    try:
+        import cPickle as pickle
+    except ImportError:
+        import pickle
+    if pickle.HIGHEST_PROTOCOL<2:
+        raise RuntimeError("pickle serializer needs to support protocol 2 or higher")
+    serializerId=0
+    name="pickle"
+
+    def dumps(self, data):
+        return self.pickle.dumps(data, self.pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data):
+        return self.pickle.loads(data)
+
+    def dumpsOutOfBand(self, data, threshold):
+        # the large buffers are replaced by a persistent id: their index in the buffer list and their type
+        buffers=[]
+        indexes={}
+        def persistent_id(obj):
+            if isOutOfBandBuffer(obj, threshold):
+                index=indexes.get(id(obj))
+                if index is None:
+                    index=indexes[id(obj)]=len(buffers)
+                    buffers.append(obj.cast("B") if type(obj) is memoryview and obj.format!="B" else obj)
+                return index, _outOfBandTypeCodes[type(obj)]
+            return None
+        out=io.BytesIO()
+        pickler=self.pickle.Pickler(out, self.pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id=persistent_id
+        pickler.dump(data)
+        return out.getvalue(), buffers
+
+    def loadsOutOfBand(self, data, buffers):
+        def persistent_load(pid):
+            try:
+                index, typecode = pid
+                return _outOfBandTypes[typecode](buffers[index])
+            except (ValueError, TypeError, KeyError, IndexError):
+                raise self.pickle.UnpicklingError("invalid out-of-band buffer reference")
+        unpickler=self.pickle.Unpickler(io.BytesIO(data))
+        unpickler.persistent_load=persistent_load
+        return unpickler.load()
+
+Serializer=PickleSerializer     # the name of the pickle serializer in older Pyro versions
+
+
+class MarshalSerializer(SerializerBase):
+    """
+    A compact and fast (de)serializer that uses the marshal module. It only supports the builtin
+    primitive and container types (None, bool, int, float, complex, str, bytes, tuple, list, set, dict).
+    The marshal format can differ between Python versions, so only use it between identical Python versions.
+    Data that it can't serialize raises a ValueError.
+    """
+    import marshal
+    serializerId=1
+    name="marshal"
+
+    def dumps(self, data):
+        return self.marshal.dumps(data)
+
+    def loads(self, data):
+        return self.marshal.loads(data)
+
+
+# the buffer types that can be sent out-of-band, the code that identifies them in the serialized data,
+# and how they are recreated from the bytearray they are received in (bytes need a copy, the others don't)
+_outOfBandTypeCodes={bytes: "b", bytearray: "a"}
+_outOfBandTypes={"b": bytes, "a": lambda buffer: buffer if type(buffer) is bytearray else bytearray(buffer)}
+if sys.version_info>=(3, 3):
+    _outOfBandTypeCodes[memoryview]="m"
+    _outOfBandTypes["m"]=memoryview
+
+def isOutOfBandBuffer(obj, threshold):
+    """Is the object a buffer (bytes, bytearray or memoryview) that's large enough to be sent out-of-band?"""
+    objtype=type(obj)
+    if objtype is memoryview:
+        return objtype in _outOfBandTypeCodes and obj.contiguous and obj.nbytes>=threshold
+    return objtype in _outOfBandTypeCodes and len(obj)>=threshold
+
+def hasOutOfBandBuffers(data, threshold, depth=3):
+    """
+    Checks if the data contains buffers that are large enough to be sent out-of-band.
+    Only looks a few levels deep into small tuples, lists and dicts (such as the arguments of a call),
+    to keep this cheap for data that doesn't contain them.
+    """
+    if isOutOfBandBuffer(data, threshold):
+        return True
+    if depth:
+        datatype=type(data)
+        if datatype is dict:
+            data=data.values()
+        elif datatype is not tuple and datatype is not list:
+            return False
+        if len(data)<=100:
+            for item in data:
+                if hasOutOfBandBuffers(item, threshold, depth-1):
+                    return True
+    return False
+
+
+_serializersByName={}
+_serializersById={}
+
+def registerSerializer(serializer):
+    """
+    Register a serializer instance so that it can be selected by name, and so that
+    messages that were serialized with it can be deserialized. The id must be in the range 0..15.
+    """
+    if not 0<=serializer.serializerId<=15:
+        raise ValueError("serializer id must be in the range 0..15")
+    _serializersByName[serializer.name]=serializer
+    _serializersById[serializer.serializerId]=serializer
+
+def getSerializer(name):
+    """returns the registered serializer with the given name (such as 'pickle' or 'marshal')"""
+    try:
+        return _serializersByName[name]
+    except KeyError:
+        raise ValueError("unknown serializer: %s" % name)
+
+def getSerializerById(serializerId):
+    """returns the registered serializer with the given id, used to deserialize a received message"""
+    try:
+        return _serializersById[serializerId]
+    except KeyError:
+        raise ProtocolError("unsupported serializer id %d" % serializerId)
+
+def getSerializers():
+    """returns the registered serializers, ordered by id"""
+    return [_serializersById[serializerId] for serializerId in sorted(_serializersById)]
+
+registerSerializer(PickleSerializer())
+registerSerializer(MarshalSerializer())
+
+
 def resolveDottedAttribute(obj, attr, allowDotted):
     """
     Resolves a dotted attribute name to an object.  Raises
@@ -0,0 +1,226 @@
+"""
+Tests for the asyncio daemon and proxy.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+import sys, time
+import unittest
+import concurrent.futures
+import Pyro4.core
+import Pyro4.errors
+from Pyro4 import threadutil
+from testsupport import *
+
+if sys.version_info>=(3,5):
+    import asyncio
+    import Pyro4.aio
+
+    class AsyncThing(object):
+        def __init__(self):
+            self.threads={}
+        def multiply(self, x, y):
+            self.threads["multiply"]=threadutil.current_thread()
+            return x*y
+        @asyncio.coroutine
+        def slow(self, delay, value):
+            self.threads["slow"]=threadutil.current_thread()
+            return asyncio.sleep(delay, result=value)
+        def fail(self):
+            return 1//0
+        @Pyro4.isasync
+        def later(self, value):
+            future=concurrent.futures.Future()
+            threadutil.Thread(target=future.set_result, args=(value,)).start()
+            return future
+        def oneway(self, value):
+            self.value=value
+        def generator(self, count):
+            try:
+                for i in range(count):
+                    yield i
+            finally:
+                self.generatorClosed=True
+
+    class AsyncioTests(unittest.TestCase):
+        def setUp(self):
+            Pyro4.config.POLLTIMEOUT=0.1
+            Pyro4.config.HMAC_KEY=tobytes("testsuite")
+            self.thing=AsyncThing()
+            self.daemon=Pyro4.aio.AsyncDaemon(port=0)
+            self.uri=self.daemon.register(self.thing, "thing")
+            self.daemonthread=threadutil.Thread(target=self.daemon.requestLoop)
+            self.daemonthread.setDaemon(True)
+            self.daemonthread.start()
+            self.loop=asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+
+        def tearDown(self):
+            self.call(asyncio.sleep(0.01))   # let released connections finish closing
+            asyncio.set_event_loop(None)
+            self.loop.close()
+            self.daemon.shutdown()
+            self.daemonthread.join()
+            Pyro4.config.HMAC_KEY=None
+
+        def call(self, coroutine):
+            return self.loop.run_until_complete(coroutine)
+
+        def testCalls(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            p._pyroOneway.add("oneway")
+            try:
+                self.assertEqual(42, self.call(p.multiply(6, 7)))
+                self.assertEqual("hello", self.call(p.slow(0.01, "hello")))
+                self.assertEqual(None, self.call(p.oneway("value")))
+                self.assertEqual(42, self.call(p.multiply(6, 7)))
+                self.assertEqual("value", self.thing.value)
+            finally:
+                p._pyroRelease()
+
+        def testCoroutineMethodRunsInEventLoop(self):
+            with Pyro4.core.Proxy(self.uri) as p:
+                self.assertEqual(42, p.multiply(6, 7))
+                self.assertEqual("hello", p.slow(0.01, "hello"))
+            self.assertTrue(self.thing.threads["slow"] is self.daemonthread)
+            self.assertFalse(self.thing.threads["multiply"] is self.daemonthread)
+
+        def testException(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            try:
+                self.call(p.fail())
+                self.fail("expected ZeroDivisionError")
+            except ZeroDivisionError:
+                x=sys.exc_info()[1]
+                self.assertTrue("1//0" in "".join(x._pyroTraceback))
+            # the connection is still usable after a remote exception
+            self.assertEqual(42, self.call(p.multiply(6, 7)))
+            p._pyroRelease()
+
+        def testStreamedIterator(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            try:
+                numbers=self.call(p.generator(5))
+                self.assertTrue(isinstance(numbers, Pyro4.aio.AsyncStreamResultIterator))
+                numbers.prefetch=2
+                self.assertEqual([0, 1, 2, 3, 4], [self.call(numbers.__anext__()) for _ in range(5)])
+                self.assertRaises(StopAsyncIteration, self.call, numbers.__anext__())
+                numbers=self.call(p.generator(1000))
+                self.assertEqual(0, self.call(numbers.__anext__()))
+                self.assertEqual(1, len(self.daemon.streams))
+                self.call(numbers.aclose())
+                self.assertEqual(0, len(self.daemon.streams))
+                self.assertTrue(self.thing.generatorClosed)
+                # a normal proxy streams the results from the asyncio server as well
+                with Pyro4.core.Proxy(self.uri) as syncproxy:
+                    self.assertEqual(list(range(50)), list(syncproxy.generator(50)))
+            finally:
+                p._pyroRelease()
+
+        def testPipelining(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            try:
+                self.call(p._pyroBind())
+                begin=time.time()
+                calls=[p.slow(0.5, i) for i in range(20)]
+                results=self.call(asyncio.gather(*calls))
+                duration=time.time()-begin
+                self.assertEqual(list(range(20)), results)
+                self.assertTrue(duration<1.5, "calls over one connection should run concurrently")
+                self.assertEqual(1, len(self.daemon.transportServer.clients))
+            finally:
+                p._pyroRelease()
+
+        def testStreamCompression(self):
+            self.daemon.streamCompression=True
+            Pyro4.config.COMPRESSION_STREAM=True
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            try:
+                calls=[p.slow(0.01*(i%3), i) for i in range(30)]
+                self.assertEqual(list(range(30)), self.call(asyncio.gather(*calls)))
+                with Pyro4.core.Proxy(self.uri) as syncproxy:
+                    self.assertEqual(42, syncproxy.multiply(6, 7))
+                    self.assertTrue(syncproxy._pyroConnection.decompressStream is not None)
+            finally:
+                p._pyroRelease()
+                Pyro4.config.COMPRESSION_STREAM=False
+
+        def testStreamCompressionMixedThreads(self):
+            # replies of coroutines are sent by the event loop, the outcomes of isasync calls by other threads,
+            # they have to reach the socket in the order they were compressed in
+            self.daemon.streamCompression=True
+            Pyro4.config.COMPRESSION_STREAM=True
+            try:
+                with Pyro4.core.Proxy(self.uri) as p:
+                    p._pyroAsyncs.add("later")
+                    for i in range(100):
+                        results=[p.later(j) for j in range(10)]
+                        self.assertEqual(i, p.slow(0, i))
+                        self.assertEqual(list(range(10)), [result.result(2) for result in results])
+            finally:
+                Pyro4.config.COMPRESSION_STREAM=False
+
+        def testRepliesOutOfOrder(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            try:
+                slow=self.loop.create_task(p.slow(0.5, "slow"))
+                fast=self.loop.create_task(p.slow(0.01, "fast"))
+                done, pending = self.call(asyncio.wait([slow, fast], return_when=asyncio.FIRST_COMPLETED))
+                self.assertEqual(set([fast]), done)
+                self.assertEqual("slow", self.call(slow))
+            finally:
+                p._pyroRelease()
+
+        def testTimeout(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            p._pyroTimeout=0.2
+            try:
+                self.assertRaises(Pyro4.errors.TimeoutError, self.call, p.slow(1.0, "late"))
+                # the late reply is dropped and the connection stays usable
+                self.assertEqual("in time", self.call(p.slow(0.01, "in time")))
+            finally:
+                p._pyroRelease()
+
+        def testReleaseFailsPendingCalls(self):
+            p=Pyro4.aio.AsyncProxy(self.uri)
+            call=self.loop.create_task(p.slow(1.0, "never"))
+            self.call(asyncio.sleep(0.2))
+            p._pyroRelease()
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, self.call, call)
+
+        def testBatchWithSyncProxy(self):
+            with Pyro4.core.Proxy(self.uri) as p:
+                batch=Pyro4.batch(p)
+                batch.multiply(6, 7)
+                batch.slow(0.01, "coroutine")
+                batch.fail()
+                batch.multiply(1, 2)
+                results=batch()
+                self.assertEqual(42, next(results))
+                self.assertEqual("coroutine", next(results))
+                self.assertRaises(ZeroDivisionError, next, results)
+                self.assertRaises(StopIteration, next, results)
+                batch.slow(0.01, "coroutine")
+                batch.multiply(6, 7)
+                batch.slow(0.01, "streamed")
+                self.assertEqual(["coroutine", 42, "streamed"], list(batch(stream=2)))
+
+        def testServeOnRunningLoop(self):
+            daemon=Pyro4.aio.AsyncDaemon(port=0)
+            uri=daemon.register(AsyncThing(), "thing")
+            serving=self.loop.create_task(daemon.serve())
+            p=Pyro4.aio.AsyncProxy(uri)
+            try:
+                self.assertEqual("hello", self.call(p.slow(0.01, "hello")))
+                self.assertEqual(42, self.call(p.multiply(6, 7)))
+            finally:
+                p._pyroRelease()
+            daemon.close()
+            self.call(asyncio.wait_for(serving, 2.0))
+            self.assertTrue(serving.done())
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Tests for the client connection pool.
+
+Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
+"""
+
+from __future__ import with_statement
+import socket
+import time
+import unittest
+import Pyro4.core
+import Pyro4.connpool
+import Pyro4.errors
+import Pyro4.socketutil
+from Pyro4 import threadutil
+from testsupport import *
+
+
+class PooledThing(object):
+    def multiply(self, x, y):
+        return x*y
+    def delay(self, delay):
+        time.sleep(delay)
+        return delay
+    def fail(self):
+        return 1//0
+    def generator(self, count):
+        for i in range(count):
+            yield i
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        Pyro4.config.POLLTIMEOUT=0.1
+        Pyro4.config.HMAC_KEY=tobytes("testsuite")
+        Pyro4.config.CONNPOOL=True
+        Pyro4.connpool.pool.clear()
+        self.daemon=Pyro4.core.Daemon(port=0)
+        self.uri=self.daemon.register(PooledThing(), "thing")
+        self.daemonthread=threadutil.Thread(target=self.daemon.requestLoop)
+        self.daemonthread.setDaemon(True)
+        self.daemonthread.start()
+
+    def tearDown(self):
+        Pyro4.connpool.pool.clear()
+        self.daemon.shutdown()
+        self.daemonthread.join()
+        Pyro4.config.reset(useenvironment=False)
+
+    def testProxiesShareConnections(self):
+        pool=Pyro4.connpool.pool
+        p1=Pyro4.core.Proxy(self.uri)
+        p2=Pyro4.core.Proxy(self.uri)
+        self.assertTrue(p1._pyroPooled)
+        self.assertEqual(42, p1.multiply(6, 7))
+        self.assertTrue(p1._pyroConnection is None)
+        self.assertEqual(1, pool.idleCount(self.uri))
+        conn=pool.idle[pool.location(self.uri)][0].connection
+        self.assertEqual(10, p2.multiply(2, 5))
+        self.assertEqual(1, pool.idleCount(self.uri))
+        self.assertTrue(conn is pool.idle[pool.location(self.uri)][0].connection)
+        p1._pyroRelease()
+        p2._pyroRelease()
+        self.assertEqual(1, pool.idleCount(self.uri), "releasing a pooled proxy leaves the connections in the pool")
+
+    def testConcurrentCalls(self):
+        Pyro4.config.CONNPOOL_MAXSIZE=3
+        p=Pyro4.core.Proxy(self.uri)
+        results=[]
+        def call():
+            results.append(p.delay(0.5))
+        threads=[threadutil.Thread(target=call) for _ in range(5)]
+        begin=time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(time.time()-begin<2.0, "calls should run in parallel over their own connections")
+        self.assertEqual([0.5]*5, results)
+        self.assertEqual(3, Pyro4.connpool.pool.idleCount(self.uri))
+
+    def testExceptionKeepsConnection(self):
+        p=Pyro4.core.Proxy(self.uri)
+        self.assertRaises(ZeroDivisionError, p.fail)
+        self.assertEqual(1, Pyro4.connpool.pool.idleCount(self.uri))
+        self.assertEqual(42, p.multiply(6, 7))
+
+    def testTimeoutDiscardsConnection(self):
+        p=Pyro4.core.Proxy(self.uri)
+        p._pyroTimeout=0.2
+        self.assertRaises(Pyro4.errors.TimeoutError, p.delay, 1.0)
+        self.assertEqual(0, Pyro4.connpool.pool.idleCount(self.uri))
+        self.assertEqual(42, p.multiply(6, 7))
+
+    def testStaleConnection(self):
+        pool=Pyro4.connpool.pool
+        uri=Pyro4.core.URI(self.uri)
+        conn=pool.acquire(uri, None)
+        self.assertTrue(Pyro4.connpool.ConnectionPool.isHealthy(conn))
+        pool.release(uri, conn)
+        # a pooled connection that the daemon closed, is readable (EOF)
+        sock1, sock2 = socket.socketpair()
+        stale=Pyro4.socketutil.SocketConnection(sock1)
+        sock2.close()
+        self.assertFalse(Pyro4.connpool.ConnectionPool.isHealthy(stale))
+        pool.release(uri, stale)
+        p=Pyro4.core.Proxy(self.uri)
+        self.assertEqual(42, p.multiply(6, 7))
+        self.assertEqual(1, pool.idleCount(uri))
+        self.assertTrue(pool.idle[pool.location(uri)][0].connection is conn)
+
+    def testIdleEviction(self):
+        Pyro4.config.CONNPOOL_IDLETIMEOUT=0.2
+        pool=Pyro4.connpool.ConnectionPool()
+        uri=Pyro4.core.URI(self.uri)
+        conns=[pool.acquire(uri, None) for _ in range(3)]
+        for conn in conns:
+            pool.release(uri, conn)
+        self.assertEqual(3, pool.idleCount())
+        Pyro4.config.CONNPOOL_MINSIZE=1
+        time.sleep(0.3)
+        pool.release(uri, pool.acquire(uri, None))
+        self.assertEqual(1, pool.idleCount(), "the minimum number of connections is kept")
+        Pyro4.config.CONNPOOL_MINSIZE=0
+        time.sleep(0.3)
+        pool.release(uri, pool.acquire(uri, None))
+        self.assertEqual(1, pool.idleCount(), "the expired one was evicted, a new one was made")
+        pool.clear()
+        self.assertEqual(0, pool.idleCount())
+
+    def testStreamKeepsConnection(self):
+        pool=Pyro4.connpool.pool
+        p=Pyro4.core.Proxy(self.uri)
+        numbers=p.generator(10)
+        numbers.prefetch=2
+        self.assertEqual(0, next(numbers))
+        self.assertEqual(0, pool.idleCount(self.uri), "the stream keeps the connection of its call")
+        pool.clear()    # the daemon would close the stream if its connection was closed
+        self.assertEqual(42, p.multiply(6, 7))
+        self.assertEqual(list(range(1, 10)), list(numbers))
+        self.assertEqual(2, pool.idleCount(self.uri), "a finished stream gives its connection back")
+        numbers=p.generator(10)
+        self.assertEqual(0, next(numbers))
+        numbers.close()
+        self.assertEqual(2, pool.idleCount(self.uri))
+
+    def testPrefill(self):
+        Pyro4.config.CONNPOOL_MINSIZE=3
+        pool=Pyro4.connpool.ConnectionPool()
+        uri=Pyro4.core.URI(self.uri)
+        self.assertEqual(3, pool.prefill(uri))
+        self.assertEqual(3, pool.idleCount(uri))
+        self.assertEqual(0, pool.prefill(uri))
+        pool.clear()
+        # a call that has to make a new connection, makes the pool open more in the background
+        p=Pyro4.core.Proxy(self.uri)
+        self.assertEqual(42, p.multiply(6, 7))
+        for _ in range(50):
+            if Pyro4.connpool.pool.idleCount(self.uri)>=3 and not Pyro4.connpool.pool.filling:
+                break
+            time.sleep(0.05)
+        self.assertTrue(Pyro4.connpool.pool.idleCount(self.uri)>=3)
+        self.assertFalse(Pyro4.connpool.pool.filling)
+        p._pyroRelease()
+
+    def testPipeliningTakesPrecedence(self):
+        Pyro4.config.PIPELINING=True
+        with Pyro4.core.Proxy(self.uri) as p:
+            self.assertEqual(42, p.multiply(6, 7))
+            self.assertTrue(p._pyroConnection is not None)
+        self.assertEqual(0, Pyro4.connpool.pool.idleCount())
+
+    def testAsyncCallUsesPool(self):
+        p=Pyro4.core.Proxy(self.uri)
+        p.multiply(1, 1)
+        asyncproxy=Pyro4.async(p)
+        results=[asyncproxy.multiply(6, 7) for _ in range(3)]
+        self.assertEqual([42, 42, 42], [result.value for result in results])
+        self.assertTrue(Pyro4.connpool.pool.idleCount(self.uri)>=1)
+
+    def testAsyncCallOnUnpooledProxy(self):
+        Pyro4.config.CONNPOOL=False
+        handshakes=[]
+        handshake=self.daemon._handshake
+        self.daemon._handshake=lambda conn: handshakes.append(conn) or handshake(conn)
+        with Pyro4.core.Proxy(self.uri) as p:
+            p._pyroBind()
+            asyncproxy=Pyro4.async(p)
+            for _ in range(10):
+                self.assertEqual(42, asyncproxy.multiply(6, 7).value)
+            # the calls borrow the connections from the pool, they don't connect for every call
+            self.assertEqual(1, Pyro4.connpool.pool.idleCount(self.uri))
+            self.assertEqual(2, len(handshakes))
+            self.assertTrue(p._pyroConnection is not None)
+            p._pyroTimeout=0.2
+            self.assertRaises(Pyro4.errors.TimeoutError, lambda: asyncproxy.delay(1).value)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -9,9 +9,15 @@ import unittest
 import copy
 import logging
 import os, sys, time
+import types
+import threading
+import concurrent.futures
 import warnings
 import Pyro4.configuration
 import Pyro4.core
+import Pyro4.msgauth
+import Pyro4.handshake
+import Pyro4.handles
 import Pyro4.errors
 import Pyro4.constants
 import Pyro4.futures
@@ -60,6 +66,35 @@ class CoreTests(unittest.TestCase):
         self.assertTrue("COMPRESSION" in config)
         self.assertEqual(Pyro4.config.COMPRESSION, config["COMPRESSION"])
 
+    def testConfigPipelining(self):
+        self.assertFalse(Pyro4.config.PIPELINING)
+        self.assertFalse(Pyro4.core.Proxy("PYRO:obj@localhost:5555")._pyroPipelined)
+        Pyro4.config.PIPELINING=True
+        try:
+            self.assertTrue(Pyro4.core.Proxy("PYRO:obj@localhost:5555")._pyroPipelined)
+        finally:
+            Pyro4.config.PIPELINING=False
+
+    def testConfigConnpool(self):
+        self.assertFalse(Pyro4.config.CONNPOOL)
+        self.assertFalse(Pyro4.core.Proxy("PYRO:obj@localhost:5555")._pyroPooled)
+        Pyro4.config.CONNPOOL=True
+        try:
+            self.assertTrue(Pyro4.core.Proxy("PYRO:obj@localhost:5555")._pyroPooled)
+        finally:
+            Pyro4.config.CONNPOOL=False
+
+    def testIsIterator(self):
+        def generator():
+            yield 1
+        self.assertTrue(Pyro4.core._isIterator(generator()))
+        self.assertTrue(Pyro4.core._isIterator(iter([1, 2])))
+        self.assertTrue(Pyro4.core._isIterator(iter({"a": 1})))
+        self.assertFalse(Pyro4.core._isIterator([1, 2]))
+        self.assertFalse(Pyro4.core._isIterator("abc"))
+        self.assertFalse(Pyro4.core._isIterator({"a": 1}))
+        self.assertFalse(Pyro4.core._isIterator(Pyro4.core.Proxy("PYRO:obj@localhost:5555")))
+
     def testConfigValid(self):
         try:
             Pyro4.config.XYZ_FOOBAR=True  # don't want to allow weird config names
@@ -276,6 +311,79 @@ class CoreTests(unittest.TestCase):
         self.assertFalse(Pyro4.core.URI.isUnixsockLocation("./x:name"))
         self.assertFalse(Pyro4.core.URI.isUnixsockLocation("foobar"))
 
+    def testMacState(self):
+        import hashlib, hmac
+        key=Pyro4.config.HMAC_KEY
+        data=tobytes("some message data")
+        sha1=Pyro4.msgauth.MacState([Pyro4.msgauth.getAlgorithm("hmac-sha1")])
+        self.assertEqual(hmac.new(key, data, digestmod=hashlib.sha1).digest(), sha1.digest(data))
+        self.assertEqual(sha1.digest(data), sha1.digest([data[:4], data[4:]]))
+        self.assertTrue(sha1.verify(data, sha1.digest(data)))
+        self.assertFalse(sha1.verify(data+tobytes("!"), sha1.digest(data)))
+        try:
+            blake=Pyro4.msgauth.MacState([Pyro4.msgauth.getAlgorithm("blake2b")])
+        except ValueError:
+            return  # blake2b needs Python 3.6+
+        self.assertEqual(hashlib.blake2b(data, key=key, digest_size=20).digest(), blake.digest(data))
+        # a daemon connection finds out which of the announced algorithms the client uses
+        state=Pyro4.msgauth.MacState(Pyro4.msgauth.getAlgorithms("blake2b, hmac-sha1"))
+        self.assertEqual(None, state.algorithm)
+        self.assertEqual(sha1.digest(data), state.digest(data), "until then it signs with the algorithm of older clients")
+        self.assertFalse(state.verify(data, tobytes("x")*20))
+        self.assertTrue(state.verify(data, sha1.digest(data)))
+        self.assertEqual("hmac-sha1", state.algorithm.name)
+        self.assertFalse(state.verify(data, blake.digest(data)))
+        # a new key is picked up
+        Pyro4.config.HMAC_KEY=tobytes("otherkey")
+        try:
+            self.assertEqual(hmac.new(Pyro4.config.HMAC_KEY, data, digestmod=hashlib.sha1).digest(), state.digest(data))
+        finally:
+            Pyro4.config.HMAC_KEY=key
+
+    def testHandshakeOptions(self):
+        Capabilities=Pyro4.handshake.Capabilities
+        daemon=Capabilities(["blake2b", "hmac-sha1"], ["pickle", "marshal"], ["zlib", "bz2"], 5000, ["connect", "zstream", "pipelining"])
+        decoded=Capabilities.decode(daemon.encode())
+        self.assertEqual(daemon.encode(), decoded.encode())
+        self.assertEqual(5000, decoded.maxMessageSize)
+        # unknown items are ignored, missing ones are those of an older version
+        legacy=Capabilities.decode("mac=hmac-sha1\nfuture=something")
+        self.assertEqual(["hmac-sha1"], legacy.macs)
+        self.assertEqual(["pickle"], legacy.serializers)
+        self.assertEqual(["zlib"], legacy.codecs)
+        self.assertEqual(frozenset(), legacy.extensions)
+        self.assertRaises(Pyro4.errors.ProtocolError, Capabilities.decode, "maxsize=lots")
+        client=Capabilities(["hmac-sha1", "blake2b"], ["pickle"], ["zlib"], 0, ["connect", "zstream", "completions"])
+        options=Pyro4.handshake.ConnectionOptions(daemon, client, True)
+        self.assertEqual("blake2b", options.mac, "the order of preference of the daemon decides")
+        self.assertEqual(frozenset(["pickle"]), options.serializers)
+        self.assertEqual(frozenset([0]), options.codecIds)
+        self.assertEqual(5000, options.maxMessageSize)
+        self.assertEqual(frozenset(["connect", "zstream"]), options.extensions)
+        self.assertTrue(options.streamCompression)
+        options=Pyro4.handshake.ConnectionOptions(daemon, Pyro4.handshake.LEGACY, True)
+        self.assertEqual("hmac-sha1", options.mac)
+        self.assertFalse(options.streamCompression, "an older peer doesn't understand compression streams")
+        self.assertEqual(None, Pyro4.handshake.ConnectionOptions(daemon, Capabilities(["foo"], [], [])).mac)
+
+    def testHandles(self):
+        client=Pyro4.handles.ClientHandles()
+        self.assertEqual((0, "obj"), client.encode("obj"))
+        self.assertEqual((0, "obj"), client.encode("obj"), "unconfirmed names are sent with their handle")
+        self.assertEqual((1, "method"), client.encode("method"))
+        client.confirm((0, "obj"), (1, "method"))
+        self.assertEqual(0, client.encode("obj"))
+        self.assertEqual(1, client.encode("method"))
+        daemon=Pyro4.handles.DaemonHandles()
+        self.assertEqual("obj", daemon.decode((0, "obj")))
+        self.assertEqual("method", daemon.decode([1, "method"]))
+        self.assertEqual("obj", daemon.decode(0))
+        self.assertEqual("name", daemon.decode("name"))
+        self.assertRaises(Pyro4.errors.ProtocolError, daemon.decode, 2)
+        self.assertRaises(Pyro4.errors.ProtocolError, daemon.decode, (-1, "name"))
+        client.nextHandle=Pyro4.handles.MAX_HANDLES
+        self.assertEqual("other", client.encode("other"), "names beyond the maximum are sent as they are")
+
     def testMsgFactory(self):
         import hashlib, hmac
         def pyrohmac(data):
@@ -311,6 +419,16 @@ class CoreTests(unittest.TestCase):
         msg=MF.createMessage(MF.MSG_INVOKE, data, 0,0)
         msg2=MF.createMessage(MF.MSG_INVOKE, data, MF.FLAGS_COMPRESSED,0)
         self.assertEqual(len(msg),len(msg2))
+        if MF.GATHER_THRESHOLD:
+            # large data isn't copied behind the header
+            data=tobytes("x")*MF.GATHER_THRESHOLD
+            msg=MF.createMessage(MF.MSG_INVOKE, data, 0, 0)
+            self.assertEqual(2, len(msg))
+            self.assertEqual(MF.HEADERSIZE, len(msg[0]))
+            self.assertTrue(msg[1] is data)
+            # smaller data is simply joined with the header
+            msg=MF.createMessage(MF.MSG_INVOKE, data[:-1], 0, 0)
+            self.assertEqual(MF.HEADERSIZE+len(data)-1, len(msg))
 
     def testMsgFactoryProtocolVersion(self):
         version=Pyro4.constants.PROTOCOL_VERSION
@@ -443,6 +561,28 @@ class CoreTests(unittest.TestCase):
         self.assertEqual(True, getattr(t.method,"_pyroCallback"))
         self.assertEqual(False, getattr(t.method2,"_pyroCallback", False))
 
+    def testMethodMarks(self):
+        class Test(object):
+            @Pyro4.oneway
+            def oneway(self):
+                pass
+            @Pyro4.isasync
+            def asyncmethod(self):
+                pass
+            def method(self):
+                pass
+        def instancemethod(self):
+            pass
+        t1=Test()
+        t2=Test()
+        self.assertEqual(set(["oneway"]), Pyro4.core.get_oneways(t1))
+        self.assertEqual(set(["asyncmethod"]), Pyro4.core.get_asyncs(t1))
+        # methods that are marked on the instance only count for that instance
+        t2.instancemethod=types.MethodType(Pyro4.oneway(instancemethod), t2)
+        self.assertEqual(set(["oneway", "instancemethod"]), Pyro4.core.get_oneways(t2))
+        self.assertEqual(set(["oneway"]), Pyro4.core.get_oneways(t1))
+        self.assertEqual(set(["oneway"]), Pyro4.core.get_oneways(Test()))
+
     def testProxyEquality(self):
         p1=Pyro4.core.Proxy("PYRO:thing@localhost:15555")
         p2=Pyro4.core.Proxy("PYRO:thing@localhost:15555")
@@ -700,6 +840,152 @@ class TestFutures(unittest.TestCase):
             self.fail("expected exception")
         except ZeroDivisionError:
             pass   #ok
+    def testExecutor(self):
+        class Executor(object):
+            submitted=0
+            def submit(self, job):
+                self.submitted+=1
+                job()
+        executor=Executor()
+        Pyro4.futures.setExecutor(executor)
+        try:
+            self.assertEqual(9, Pyro4.Future(futurestestfunc)(4,5).value)
+            self.assertEqual(1, executor.submitted)
+        finally:
+            Pyro4.futures.setExecutor(None)
+        # the default executor is a shared pool with a limited number of threads
+        results=[Pyro4.Future(time.sleep)(0.01) for _ in range(50)]
+        for result in results:
+            result.wait()
+        self.assertTrue(Pyro4.futures._pool.workercountSafe<=Pyro4.config.ASYNC_THREADS)
+
+    def testNestedFuturesDontStarveThePool(self):
+        def inner(value):
+            time.sleep(0.01)
+            return value
+        def outer(value):
+            return Pyro4.Future(inner)(value).value
+        oldpool=Pyro4.futures._pool
+        Pyro4.futures._pool=Pyro4.tpjobqueue.ThreadPooledJobQueue(0, 4)
+        try:
+            results=[Pyro4.Future(outer)(i) for i in range(12)]
+            for result in results:
+                self.assertTrue(result.wait(5), "outer futures waiting on inner futures shouldn't deadlock the pool")
+            self.assertEqual(list(range(12)), [result.value for result in results])
+            self.assertTrue(Pyro4.futures._pool.workercountSafe<=4)
+        finally:
+            Pyro4.futures._pool.close()
+            Pyro4.futures._pool=oldpool
+
+    def testCallchainDoesntStarveThePool(self):
+        def inner(value):
+            time.sleep(0.01)
+            return value
+        def outer(value):
+            result=Pyro4.Future(inner)(value)
+            result.then(lambda value: value*2)
+            return result.value
+        oldpool=Pyro4.futures._pool
+        Pyro4.futures._pool=Pyro4.tpjobqueue.ThreadPooledJobQueue(0, 4)
+        try:
+            results=[Pyro4.Future(outer)(i) for i in range(12)]
+            for result in results:
+                self.assertTrue(result.wait(5), "waiting on results with a call chain shouldn't deadlock the pool")
+            self.assertEqual([i*2 for i in range(12)], [result.value for result in results])
+        finally:
+            Pyro4.futures._pool.close()
+            Pyro4.futures._pool=oldpool
+
+    def testWaitFunctions(self):
+        def delayed(value, delay):
+            time.sleep(delay)
+            return value
+        slow=Pyro4.Future(delayed)("slow", 0.6)
+        fast=Pyro4.Future(delayed)("fast", 0.05)
+        clientFuture=Pyro4.futures.ClientFuture(None)
+        concurrentFuture=concurrent.futures.Future()
+        threading.Timer(0.3, clientFuture.set_result, ("client",)).start()
+        concurrentFuture.set_result("concurrent")
+        done, notDone = Pyro4.futures.wait_any([fast, slow, clientFuture], 2)
+        self.assertEqual(set([fast]), done)
+        self.assertEqual(set([slow, clientFuture]), notDone)
+        done, notDone = Pyro4.futures.wait_all([slow, clientFuture], 0.1)
+        self.assertEqual(set([slow, clientFuture]), notDone)
+        completed=list(Pyro4.futures.as_completed([slow, clientFuture, fast, concurrentFuture], 2))
+        self.assertEqual(4, len(completed))
+        self.assertEqual([clientFuture, slow], completed[2:])
+        done, notDone = Pyro4.futures.wait_all([slow, fast, clientFuture, concurrentFuture])
+        self.assertEqual(4, len(done))
+        self.assertEqual(0, len(notDone))
+        pending=concurrent.futures.Future()
+        self.assertRaises(concurrent.futures.TimeoutError, list, Pyro4.futures.as_completed([fast, pending], 0.1))
+
+    def testWaitRemovesWaiters(self):
+        result=Pyro4.futures.FutureResult()
+        clientFuture=Pyro4.futures.ClientFuture(None)
+        concurrentFuture=concurrent.futures.Future()
+        futures=[result, clientFuture, concurrentFuture]
+        for _ in range(5):
+            self.assertEqual(set(), Pyro4.futures.wait_any(futures, 0.01)[0])
+            self.assertEqual(set(), Pyro4.futures.wait_all(futures, 0.01)[0])
+            self.assertRaises(concurrent.futures.TimeoutError, list, Pyro4.futures.as_completed(futures, 0.01))
+        self.assertEqual([], result.callbacks)
+        self.assertEqual([], clientFuture._done_callbacks)
+        self.assertEqual([], concurrentFuture._done_callbacks)
+
+    def testCallchainOnExecutor(self):
+        result=Pyro4.futures.FutureResult()
+        threads=[]
+        result.then(lambda value: threads.append(threading.current_thread()) or value+1)
+        done=[]
+        called=threading.Event()
+        result.add_done_callback(lambda r: (done.append(r.value), called.set()))
+        result.value=41     # returns right away, the call chain runs on the executor
+        self.assertEqual(42, result.value)
+        self.assertFalse(threads[0] is threading.current_thread())
+        self.assertTrue(called.wait(1))
+        self.assertEqual([42], done)
+        result.add_done_callback(lambda r: done.append(r.value))    # ready already, called right away
+        self.assertEqual([42, 42], done)
+        result.then(lambda value: threads.append(threading.current_thread()) or value*2)   # ready already, runs on the executor
+        self.assertEqual(84, result.value)
+        self.assertFalse(threads[1] is threading.current_thread())
+        self.assertTrue(result.ready)
+
+    def testCallchainFromPoolJob(self):
+        # a value that is set by a job of the pool doesn't run the chain in that job
+        valueSet=threading.Event()
+        def setter(result):
+            result.value=1
+            valueSet.set()
+        result=Pyro4.futures.FutureResult()
+        result.then(lambda value: value+valueSet.wait(2))
+        Pyro4.Future(setter)(result)
+        self.assertEqual(2, result.value)
+        self.assertTrue(valueSet.is_set())
+
+    def testFutureTable(self):
+        table=Pyro4.futures.FutureTable()
+        conn1, conn2 = object(), object()
+        table.add(conn1, 0, "f0")
+        table.add(conn1, 1, "f1")
+        table.add(conn2, 0, "g0")
+        table.add(None, "PYRO:future_1@localhost:1234", "h")
+        self.assertEqual(4, len(table))
+        self.assertEqual("f1", table.get(conn1, 1))
+        self.assertEqual("g0", table.get(conn2, 0))
+        self.assertEqual("h", table.get(None, "PYRO:future_1@localhost:1234"))
+        self.assertEqual(None, table.get(conn2, 1))
+        self.assertEqual(None, table.get(object(), 0))
+        self.assertEqual("f0", table.remove(conn1, 0))
+        self.assertEqual(None, table.remove(conn1, 0))
+        self.assertEqual(3, len(table))
+        self.assertEqual(["f1"], table.removeConnection(conn1))
+        self.assertEqual([], table.removeConnection(conn1))
+        self.assertEqual(None, table.remove(conn1, 1))    # the completion of a future of a client that is gone
+        self.assertEqual(2, len(table))
+        self.assertEqual("g0", table.remove(conn2, 0))
+        self.assertFalse(conn2 in table.connections)
 
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 from __future__ import with_statement
-import os, time, socket
+import os, sys, time, socket, select
 import unittest
 import Pyro4.core
 import Pyro4.constants
@@ -90,6 +90,45 @@ class DaemonTests(unittest.TestCase):
                 self.assertTrue(len(d.sockets)==1, "daemon without connections should have just 1 socket")
         Pyro4.config.SERVERTYPE=old_servertype
                 
+    def testServertypeEpoll(self):
+        old_servertype=Pyro4.config.SERVERTYPE
+        Pyro4.config.SERVERTYPE="epoll"
+        if not hasattr(select, "epoll"):
+            self.assertRaises(NotImplementedError, Pyro4.core.Daemon, port=0)
+        else:
+            with Pyro4.core.Daemon(port=0) as d:
+                sock=d.sock
+                self.assertTrue(sock in d.sockets, "daemon's socketlist should contain the server socket")
+                self.assertTrue(len(d.sockets)==1, "daemon without connections should have just 1 socket")
+        Pyro4.config.SERVERTYPE=old_servertype
+
+    def testServertypeHybrid(self):
+        old_servertype=Pyro4.config.SERVERTYPE
+        Pyro4.config.SERVERTYPE="hybrid"
+        if os.name=="java":
+            self.assertRaises(NotImplementedError, Pyro4.core.Daemon, port=0)
+        else:
+            with Pyro4.core.Daemon(port=0) as d:
+                sock=d.sock
+                self.assertTrue(sock in d.sockets, "daemon's socketlist should contain the server socket")
+                self.assertTrue(len(d.sockets)==1, "daemon without connections should have just 1 socket")
+                self.assertTrue(d.transportServer.jobqueue.workercount>0)
+        Pyro4.config.SERVERTYPE=old_servertype
+
+    def testServertypeAsyncio(self):
+        old_servertype=Pyro4.config.SERVERTYPE
+        Pyro4.config.SERVERTYPE="asyncio"
+        if sys.version_info<(3,5):
+            self.assertRaises(NotImplementedError, Pyro4.core.Daemon, port=0)
+        else:
+            with Pyro4.core.Daemon(port=0) as d:
+                sock=d.sock
+                self.assertTrue(sock in d.sockets, "daemon's socketlist should contain the server socket")
+                self.assertTrue(len(d.sockets)==1, "daemon without connections should have just 1 socket")
+                self.assertRaises(NotImplementedError, d.events, [sock])
+            self.assertEqual(-1, sock.fileno())
+        Pyro4.config.SERVERTYPE=old_servertype
+
     def testServertypeFoobar(self):
         old_servertype=Pyro4.config.SERVERTYPE
         Pyro4.config.SERVERTYPE="foobar"
@@ -169,6 +208,48 @@ class DaemonTests(unittest.TestCase):
         finally:
             d.close()
 
+    def testDispatchTables(self):
+        class Base(object):
+            def method(self):
+                return "base"
+            def _private(self):
+                return "private"
+        class Sub(Base):
+            def method(self):
+                return "sub"
+            @Pyro4.callback
+            def callback(self):
+                pass
+        with Pyro4.core.Daemon(port=0) as d:
+            o1=Sub()
+            o2=Sub()
+            d.register(o1)
+            d.register(o2)
+            table=d._dispatchTables[Sub]
+            self.assertEqual(2, table.objects)
+            self.assertEqual(set(["method", "callback"]), set(table.methods))
+            self.assertEqual(("sub", False), (d._resolveMethod(o1, "method")[0](), d._resolveMethod(o1, "method")[1]))
+            self.assertTrue(d._resolveMethod(o1, "callback")[1])
+            self.assertEqual("private", d._resolveMethod(o1, "_private")[0](), "other names are resolved the normal way")
+            self.assertRaises(AttributeError, d._resolveMethod, o1, "unexisting")
+            o2.method=lambda: "instance"
+            self.assertEqual("instance", d._resolveMethod(o2, "method")[0]())
+            del o2.method
+            o2.__class__=Base
+            self.assertEqual("base", d._resolveMethod(o2, "method")[0](), "the table of the new class applies")
+            d.unregister(o1)
+            self.assertEqual(1, d._dispatchTables[Sub].objects)
+            d.unregister(o2)
+            self.assertFalse(Sub in d._dispatchTables, "the object is counted in the table of the class it was registered with")
+            self.assertFalse(hasattr(o2, "_pyroDispatchTable"))
+            if sys.version_info>=(3, 5):
+                # native coroutine functions are recognised without asyncio
+                namespace={}
+                exec("async def method(self): pass", namespace)
+                d.register(type("Native", (object,), {"method": namespace["method"]})())
+                table=[table for cls, table in d._dispatchTables.items() if cls.__name__=="Native"][0]
+                self.assertEqual((False, True), table.methods["method"])
+
     def testRegisterUnicode(self):
         with Pyro4.core.Daemon(port=0) as d:
             myobj1=MyObj("hello1")
@@ -5,10 +5,13 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 from __future__ import with_statement
+import os
+import sys
 import unittest
 import Pyro4.util
 import Pyro4.errors
 import Pyro4.core
+import Pyro4.compression
 from testsupport import *
 
 
@@ -113,6 +116,260 @@ class SerializeTests(unittest.TestCase):
                 Pyro4.config.AUTOPROXY=True
 
 
+class SerializerRegistryTests(unittest.TestCase):
+    def testRegistry(self):
+        pickler=Pyro4.util.getSerializer("pickle")
+        marshaller=Pyro4.util.getSerializer("marshal")
+        self.assertTrue(isinstance(pickler, Pyro4.util.PickleSerializer))
+        self.assertTrue(isinstance(marshaller, Pyro4.util.MarshalSerializer))
+        self.assertTrue(pickler is Pyro4.util.getSerializerById(0))
+        self.assertTrue(marshaller is Pyro4.util.getSerializerById(1))
+        self.assertTrue(Pyro4.util.Serializer is Pyro4.util.PickleSerializer)
+        self.assertRaises(ValueError, Pyro4.util.getSerializer, "nonexisting")
+        self.assertRaises(Pyro4.errors.ProtocolError, Pyro4.util.getSerializerById, 15)
+
+    def testRegisterSerializer(self):
+        class ReprSerializer(Pyro4.util.SerializerBase):
+            serializerId=15
+            name="repr"
+            def dumps(self, data):
+                return tobytes(repr(data))
+            def loads(self, data):
+                return eval(data)
+        bad=ReprSerializer()
+        bad.serializerId=16
+        self.assertRaises(ValueError, Pyro4.util.registerSerializer, bad)
+        Pyro4.util.registerSerializer(ReprSerializer())
+        try:
+            MF=Pyro4.core.MessageFactory
+            data, flags=MF.serializeData(Pyro4.util.getSerializer("repr"), [1, "two", 3.0])
+            self.assertEqual(15<<MF.SERIALIZER_SHIFT, flags)
+            self.assertEqual([1, "two", 3.0], MF.deserializeData(data, flags))
+        finally:
+            del Pyro4.util._serializersByName["repr"]
+            del Pyro4.util._serializersById[15]
+
+    def testMarshal(self):
+        ser=Pyro4.util.MarshalSerializer()
+        data=("object", "method", (1, 2.5, None, True, tobytes("bytes"), unicode("text")), {"list": [1, 2, 3], "set": set([4, 5])})
+        d, c=ser.serialize(data)
+        self.assertFalse(c)
+        self.assertEqual(data, ser.deserialize(d))
+        d, c=ser.serialize(data*100, compress=True)
+        self.assertTrue(c)
+        self.assertEqual(data*100, ser.deserialize(d, compressed=True))
+        self.assertTrue(len(d)<len(Pyro4.util.PickleSerializer().serialize(data*100)[0]))
+        self.assertRaises(ValueError, ser.serialize, Something())
+
+    def testSerializeDataFallback(self):
+        MF=Pyro4.core.MessageFactory
+        marshaller=Pyro4.util.getSerializer("marshal")
+        data, flags=MF.serializeData(marshaller, {"value": 42})
+        self.assertEqual(marshaller, MF.getSerializer(flags))
+        self.assertEqual({"value": 42}, MF.deserializeData(data, flags))
+        # marshal can't serialize instances of custom classes, pickle is used instead
+        obj=Something()
+        obj.value=42
+        data, flags=MF.serializeData(marshaller, obj)
+        self.assertEqual(0, flags & MF.FLAGS_SERIALIZER)
+        self.assertEqual(42, MF.deserializeData(data, flags).value)
+        data, flags=MF.serializeData(marshaller, "x"*1000, compress=True)
+        self.assertEqual(marshaller.serializerId<<MF.SERIALIZER_SHIFT | MF.FLAGS_COMPRESSED, flags)
+        self.assertEqual("x"*1000, MF.deserializeData(data, flags))
+        self.assertRaises(Pyro4.errors.ProtocolError, MF.deserializeData, data, 14<<MF.SERIALIZER_SHIFT)
+
+
+class CompressionTests(unittest.TestCase):
+    def testCodecs(self):
+        zlibcodec=Pyro4.compression.getCodec("zlib")
+        self.assertEqual(0, zlibcodec.codecId)
+        self.assertTrue(zlibcodec is Pyro4.compression.getCodecById(0))
+        self.assertRaises(ValueError, Pyro4.compression.getCodec, "foobar")
+        self.assertRaises(Pyro4.errors.ProtocolError, Pyro4.compression.getCodecById, 3)
+        candidates=Pyro4.compression.parseCodecs("zlib:9, none ,zlib")
+        self.assertEqual([(zlibcodec, 9), (Pyro4.compression.getCodec("none"), 0), (zlibcodec, 1), (zlibcodec, 6)], candidates)
+        data=tobytes("x")*1000
+        self.assertEqual(data, Pyro4.compression.decompress(zlibcodec.compress(data, 1), 0))
+
+    def testCodecInHeader(self):
+        MF=Pyro4.core.MessageFactory
+        marshaller=Pyro4.util.getSerializer("marshal")
+        for name in ("bz2", "lzma"):
+            try:
+                codec=Pyro4.compression.getCodec(name)
+            except ValueError:
+                continue    # not available in this Python
+            compressor=Pyro4.compression.Compressor(name, adaptive=False)
+            data, flags=MF.serializeData(marshaller, "x"*1000, compress=compressor)
+            self.assertEqual(marshaller.serializerId<<MF.SERIALIZER_SHIFT | MF.FLAGS_COMPRESSED | codec.codecId<<MF.CODEC_SHIFT, flags)
+            self.assertEqual("x"*1000, MF.deserializeData(data, flags))
+        compressor=Pyro4.compression.Compressor("none")
+        data, flags=MF.serializeData(marshaller, "x"*1000, compress=compressor, method="method")
+        self.assertEqual(marshaller.serializerId<<MF.SERIALIZER_SHIFT, flags)
+        self.assertRaises(Pyro4.errors.ProtocolError, MF.deserializeData, data, MF.FLAGS_COMPRESSED | 3<<MF.CODEC_SHIFT)
+
+    def testAdaptive(self):
+        compressor=Pyro4.compression.Compressor("zlib:1, zlib:9", bandwidth=1000)
+        compressor.reprobeInterval=10
+        text=tobytes("compressible text "*100)
+        noise=os.urandom(1000)    # random data doesn't shrink
+        for _ in range(compressor.probes*2):
+            self.assertEqual(None, compressor.codecFor("text"))
+            data, codecId=compressor.compress(text, "text")
+            self.assertEqual(0, codecId)
+            compressor.compress(noise, "noise")
+        self.assertEqual("zlib", compressor.codecFor("text")[0].name)
+        self.assertEqual(None, compressor.codecFor("noise"))
+        self.assertEqual(-1, compressor.methods["noise"].choice)
+        self.assertEqual(20, compressor.methods["noise"].countdown)     # backs off
+        # small data is never compressed, the other methods are unaffected by it
+        self.assertEqual((tobytes("x"), None), compressor.compress(tobytes("x"), "small"))
+        self.assertFalse("small" in compressor.methods)
+        # compression doesn't pay off on a fast network
+        compressor=Pyro4.compression.Compressor("zlib:9", bandwidth=1e15)
+        for _ in range(compressor.probes):
+            compressor.compress(text, "text")
+        self.assertEqual(None, compressor.codecFor("text"))
+        self.assertEqual((text, None), compressor.compress(text, "text"))
+        # the default bandwidth still compresses data that compresses well
+        compressor=Pyro4.compression.Compressor("zlib")
+        for _ in range(compressor.probes*len(compressor.candidates)):
+            compressor.compress(text, "text")
+        self.assertEqual("zlib", compressor.codecFor("text")[0].name)
+        # the number of method names that is measured is limited
+        compressor=Pyro4.compression.Compressor("zlib:1", bandwidth=1000)
+        compressor.maxMethods=3
+        for number in range(10):
+            compressor.compress(text, "method%d" % number)
+        self.assertEqual(set(["method0", "method1", "method2", None]), set(compressor.methods))
+        self.assertEqual("zlib", compressor.codecFor(None)[0].name, "the other methods are measured together")
+
+    def testCompressStream(self):
+        MF=Pyro4.core.MessageFactory
+        class ConnectionMock(object):
+            def __init__(self):
+                self.data=tobytes("")
+                self.compressStream=Pyro4.compression.CompressStream()
+                self.decompressStream=None
+                self.macState=None
+                self.options=None
+                self.handshakeMessage=None
+            def send(self, data):
+                self.data+=data
+            def recv(self, size):
+                chunk, self.data = self.data[:size], self.data[size:]
+                return chunk
+            recvView=recv
+        conn=ConnectionMock()
+        ser=Pyro4.util.getSerializer("pickle")
+        messages=[MF.serializeData(ser, ("object", "method", (i, "argument"), {}))[0] for i in range(20)]
+        for seq, data in enumerate(messages):
+            MF.sendMessage(conn, MF.MSG_INVOKE, data, 0, seq)
+        # messages that were compressed already aren't compressed again
+        MF.sendMessage(conn, MF.MSG_INVOKE, messages[0], MF.FLAGS_COMPRESSED, 99)
+        self.assertTrue(len(conn.data) < len(messages)*MF.HEADERSIZE+sum(len(data) for data in messages)//2)
+        for seq, data in enumerate(messages):
+            msgType, flags, replyseq, databytes = MF.getMessage(conn, MF.MSG_INVOKE)
+            self.assertEqual(seq, replyseq)
+            self.assertEqual(0, flags & (MF.FLAGS_COMPRESSED | MF.FLAGS_CODEC), "the stream is decompressed by getMessage")
+            self.assertEqual(data, databytes)
+        msgType, flags, replyseq, databytes = MF.getMessage(conn, MF.MSG_INVOKE)
+        self.assertEqual((MF.FLAGS_COMPRESSED, messages[0]), (flags, databytes))
+        self.assertEqual(tobytes(""), conn.data)
+        # a message that is out of stream order can't be decompressed
+        stream=Pyro4.compression.CompressStream()
+        stream.compress(messages[0])
+        self.assertRaises(Pyro4.errors.ProtocolError, Pyro4.compression.DecompressStream().decompress, stream.compress(messages[1]))
+        # the decompressed data is limited to the max message size
+        stream=Pyro4.compression.CompressStream()
+        bomb=stream.compress(tobytes("\0")*1000000)
+        self.assertTrue(len(bomb)<2000)
+        self.assertEqual(1000000, len(Pyro4.compression.DecompressStream().decompress(bomb, 1000000)))
+        self.assertRaises(Pyro4.errors.ProtocolError, Pyro4.compression.DecompressStream().decompress, bomb, 999999)
+        conn=ConnectionMock()
+        MF.sendMessage(conn, MF.MSG_INVOKE, tobytes("\0")*1000000, 0, 1)
+        Pyro4.config.MAX_MESSAGE_SIZE=100000
+        try:
+            self.assertRaises(Pyro4.errors.ProtocolError, MF.getMessage, conn, MF.MSG_INVOKE)
+        finally:
+            Pyro4.config.MAX_MESSAGE_SIZE=0
+
+
+class OutOfBandTests(unittest.TestCase):
+    def setUp(self):
+        Pyro4.config.HMAC_KEY=tobytes("testsuite")
+    def tearDown(self):
+        Pyro4.config.HMAC_KEY=None
+
+    def testFindBuffers(self):
+        big=tobytes("x")*1000
+        self.assertTrue(Pyro4.util.isOutOfBandBuffer(big, 1000))
+        self.assertTrue(Pyro4.util.isOutOfBandBuffer(bytearray(big), 1000))
+        self.assertFalse(Pyro4.util.isOutOfBandBuffer(big, 1001))
+        self.assertFalse(Pyro4.util.isOutOfBandBuffer([big], 1000))
+        self.assertTrue(Pyro4.util.hasOutOfBandBuffers(("obj", "method", (1, big), {}), 1000))
+        self.assertTrue(Pyro4.util.hasOutOfBandBuffers(("obj", "method", (), {"data": [big]}), 1000))
+        self.assertFalse(Pyro4.util.hasOutOfBandBuffers(("obj", "method", (1, 2), {}), 1000))
+        self.assertFalse(Pyro4.util.hasOutOfBandBuffers([[[[big]]]], 1000), "only looks a few levels deep")
+        if sys.version_info>=(3, 3):
+            self.assertTrue(Pyro4.util.isOutOfBandBuffer(memoryview(big), 1000))
+            self.assertFalse(Pyro4.util.isOutOfBandBuffer(memoryview(big)[::2], 100), "must be contiguous")
+
+    def testPickleOutOfBand(self):
+        ser=Pyro4.util.PickleSerializer()
+        big=tobytes("x")*1000
+        bigarray=bytearray(tobytes("y"))*1000
+        data=("obj", "method", (big, bigarray, big, tobytes("small")), {})
+        envelope, buffers = ser.dumpsOutOfBand(data, 1000)
+        self.assertEqual(2, len(buffers), "the same buffer should be sent once")
+        self.assertTrue(buffers[0] is big)
+        self.assertTrue(buffers[1] is bigarray)
+        self.assertTrue(len(envelope)<200)
+        result=ser.loadsOutOfBand(envelope, [bytearray(buffer) for buffer in buffers])
+        self.assertEqual(data, result)
+        self.assertTrue(type(result[2][0]) is bytes)
+        self.assertTrue(type(result[2][1]) is bytearray)
+        self.assertRaises(ser.pickle.UnpicklingError, ser.loadsOutOfBand, envelope, [])
+        self.assertRaises(Pyro4.errors.ProtocolError, Pyro4.util.MarshalSerializer().dumpsOutOfBand, data, 1000)
+
+    def testOutOfBandMessage(self):
+        MF=Pyro4.core.MessageFactory
+        big=bytearray(tobytes("z"))*100000
+        data=("obj", "method", (big,), {})
+        parts, flags = MF.serializeData(Pyro4.util.getSerializer("marshal"), data)
+        self.assertEqual(MF.FLAGS_OOB, flags, "out-of-band data is always pickled")
+        self.assertTrue(parts[-1] is big)
+        msg=MF.createMessage(MF.MSG_INVOKE, parts, flags, 42)
+        self.assertEqual(len(parts)+1, len(msg))
+        class ConnectionMock(object):
+            def __init__(self, data):
+                self.data=data
+            def recv(self, size):
+                chunk, self.data = self.data[:size], self.data[size:]
+                return chunk
+            def recvInto(self, buffer):
+                buffer[:]=self.recv(len(buffer))
+                return buffer
+            recvView=recv
+            macState=None
+        conn=ConnectionMock(tobytes("").join(bytes(part) for part in msg))
+        msgType, flags, seq, databytes = MF.getMessage(conn, MF.MSG_INVOKE)
+        self.assertEqual(42, seq)
+        self.assertTrue(flags & MF.FLAGS_OOB)
+        envelope, buffers = databytes
+        self.assertEqual([big], buffers)
+        self.assertEqual(data, MF.deserializeData(databytes, flags))
+        # a message with a tampered buffer fails the hmac check
+        conn=ConnectionMock(tobytes("").join(bytes(part) for part in msg)[:-1]+tobytes("!"))
+        self.assertRaises(Pyro4.errors.SecurityError, MF.getMessage, conn, MF.MSG_INVOKE)
+        Pyro4.config.OOB_THRESHOLD=0
+        try:
+            data, flags = MF.serializeData(Pyro4.util.getSerializer("pickle"), data)
+            self.assertEqual(0, flags)
+        finally:
+            Pyro4.config.OOB_THRESHOLD=65536
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -6,11 +6,17 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 
 from __future__ import with_statement
 import pickle
+try:
+    import copyreg
+except ImportError:
+    import copy_reg as copyreg
 import unittest
 import Pyro4.core
 import Pyro4.errors
 import Pyro4.util
-import time, os, sys, platform
+import Pyro4.msgauth
+import time, os, sys, platform, select, socket
+import concurrent.futures
 from Pyro4 import threadutil
 from testsupport import *
 
@@ -43,6 +49,57 @@ class MyThing(object):
         return x,args,kwargs
     def nonserializableException(self):
         raise NonserializableError(("xantippe", lambda x: 0))
+    def generator(self, count, failAt=None):
+        self.generated=0
+        try:
+            for i in range(count):
+                if i==failAt:
+                    raise ValueError("generator failed at %d" % i)
+                self.generated+=1
+                yield i
+        finally:
+            self.generatorClosed=True
+    def iterator(self):
+        return iter(["one", "two", "three"])
+    @Pyro4.isasync
+    def asyncMultiply(self, x, y):
+        future=concurrent.futures.Future()
+        thread=threadutil.Thread(target=lambda: (time.sleep(0.1), future.set_result(x*y)))
+        thread.start()
+        return future
+    @Pyro4.isasync
+    def asyncPending(self):
+        self.pendingFuture=concurrent.futures.Future()
+        return self.pendingFuture
+    @Pyro4.isasync
+    def asyncProgress(self, count, delay=0):
+        future=ProgressFuture()
+        def run():
+            for i in range(count):
+                future.set_progress(0, i)
+                time.sleep(delay)
+            future.set_result(count)
+        threadutil.Thread(target=run).start()
+        return future
+    @Pyro4.isasync
+    def asyncFail(self):
+        future=concurrent.futures.Future()
+        future.set_exception(ValueError("async failure"))
+        return future
+
+class ProgressFuture(concurrent.futures.Future):
+    """a future that reports its progress, like the ProgressiveFuture of odemis"""
+    def __init__(self):
+        super(ProgressFuture, self).__init__()
+        self.progress=(0, 0)
+        self.updateCallbacks=[]
+    def add_update_callback(self, fn):
+        self.updateCallbacks.append(fn)
+        fn(self, *self.progress)
+    def set_progress(self, start, end):
+        self.progress=(start, end)
+        for fn in self.updateCallbacks:
+            fn(self, start, end)
 
 class MyThing2(object):
     pass
@@ -114,6 +171,69 @@ class ServerTestsOnce(unittest.TestCase):
             self.daemonthread.join()
         Pyro4.config.HMAC_KEY=None
 
+    def testMacNegotiation(self):
+        names=[algorithm.name for algorithm in self.daemon.macAlgorithms]
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            self.assertEqual(55, p.multiply(5, 11))
+            self.assertEqual(names[0], p._pyroConnection.macState.algorithm.name)
+        try:
+            # the client takes the first announced algorithm that it supports
+            Pyro4.config.MAC_ALGORITHMS="hmac-sha1"
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                self.assertEqual(55, p.multiply(5, 11))
+                self.assertEqual("hmac-sha1", p._pyroConnection.macState.algorithm.name)
+            self.daemon.macAlgorithms=[Pyro4.msgauth.getAlgorithm("hmac-sha1")]
+            Pyro4.config.MAC_ALGORITHMS="foobar"
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                self.assertRaises(Pyro4.errors.CommunicationError, p._pyroBind)
+        finally:
+            Pyro4.config.MAC_ALGORITHMS=Pyro4.config.__class__().MAC_ALGORITHMS
+
+    def testHandshakeOptions(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            self.assertEqual(55, p.multiply(5, 11))
+            options=p._pyroConnection.options
+            self.assertTrue("connect" in options.extensions)
+            self.assertEqual(None, p._pyroConnection.handshakeMessage, "the capabilities should be sent with the first request")
+            self.assertEqual(frozenset(codec.codecId for codec in Pyro4.compression.getCodecs()), options.codecIds)
+        # both sides keep to the maximum message size that was agreed on, the request or the reply isn't sent
+        try:
+            for args in [("x"*3000, 1), ("x", 3000)]:
+                Pyro4.config.MAX_MESSAGE_SIZE=2000
+                with Pyro4.core.Proxy(self.objectUri) as p:
+                    p._pyroBind()
+                    self.assertEqual(2000, p._pyroConnection.options.maxMessageSize)
+                    Pyro4.config.MAX_MESSAGE_SIZE=0
+                    self.assertEqual("x"*1000, p.multiply("x", 1000))
+                    self.assertRaises(Pyro4.errors.ProtocolError, p.multiply, *args)
+        finally:
+            Pyro4.config.MAX_MESSAGE_SIZE=0
+        # a client that doesn't send its capabilities (an older version) still works
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroBind()
+            p._pyroConnection.handshakeMessage=None
+            p._pyroConnection.handles=None
+            self.assertEqual(55, p.multiply(5, 11))
+
+    def testInternedNames(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            self.assertEqual(55, p.multiply(5, 11))
+            handles=p._pyroConnection.handles
+            self.assertEqual({self.objectUri.object: 0, "multiply": 1}, handles.known)
+            self.assertEqual(55, p.multiply(5, 11))
+            self.assertEqual(6, p.multiply(2, 3))
+            self.assertEqual({"number": 42}, p.getDict())
+            self.assertEqual(3, len(handles.known))
+            # the daemon resolves the handles again when objects are (un)registered
+            obj=self.daemon.objectsById[self.objectUri.object]
+            self.daemon.unregister(obj)
+            self.assertRaises(Pyro4.errors.DaemonError, p.multiply, 5, 11)
+            self.daemon.register(obj, self.objectUri.object)
+            self.assertEqual(55, p.multiply(5, 11))
+            self.assertRaises(AttributeError, p.unexisting_method)
+            self.assertFalse("unexisting_method" in handles.known)
+            self.assertEqual(55, p.multiply(5, 11))
+
     def testNoDottedNames(self):
         Pyro4.config.DOTTEDNAMES=False
         with Pyro4.core.Proxy(self.objectUri) as p:
@@ -214,6 +334,13 @@ class ServerTestsOnce(unittest.TestCase):
             self.assertEqual("slept for 42",result.value)
             self.assertTrue(result.ready)
             self.assertTrue(result.wait())
+            # the async calls don't connect for every call, they borrow connections from the connection pool
+            results=[async.multiply(i, 2) for i in range(20)]
+            self.assertEqual([i*2 for i in range(20)], [result.value for result in results])
+            self.assertTrue(Pyro4.connpool.pool.idleCount(self.objectUri)>0)
+            # and they follow the changes of the proxy
+            p._pyroOneway.add("multiply")
+            self.assertEqual(None, async.multiply(6, 7).value)
 
     def testAsyncProxyCallchain(self):
         class FuncHolder(object):
@@ -236,6 +363,129 @@ class ServerTestsOnce(unittest.TestCase):
             self.assertEqual(22,value)
             self.assertEqual(3,holder.count.value())
 
+    def testIsasync(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroAsyncs.update(["asyncMultiply", "asyncFail"])
+            f1=p.asyncMultiply(6, 7)
+            f2=p.asyncFail()
+            self.assertTrue(isinstance(f1, Pyro4.futures.ClientFuture))
+            # the outcome comes back on the connection of the proxy, other calls go on meanwhile
+            self.assertEqual(55, p.multiply(5, 11))
+            self.assertEqual(42, f1.result(2))
+            self.assertRaises(ValueError, f2.result, 2)
+            self.assertEqual(None, p._pyroFutureDaemon)
+            self.assertFalse(hasattr(f1, "_pyroId"))
+            self.assertEqual(0, len(self.daemon._futures))
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroAsyncs.add("asyncPending")
+            f=p.asyncPending()
+            self.assertTrue(f.cancel())
+            self.assertTrue(f.cancelled())
+            self.assertTrue(self.daemon.objectsById["something"].pendingFuture.cancelled())
+            f=p.asyncPending()
+            self.assertEqual(55, p.multiply(5, 11))
+            self.assertEqual(1, len(self.daemon._futures))
+            pending=self.daemon.objectsById["something"].pendingFuture
+        # the client is gone, its futures are cancelled
+        for _ in range(50):
+            if pending.cancelled():
+                break
+            time.sleep(0.05)
+        self.assertTrue(pending.cancelled())
+        self.assertEqual(0, len(self.daemon._futures))
+        self.assertRaises(Pyro4.errors.ConnectionClosedError, f.result, 1)
+        with Pyro4.core.Proxy(self.objectUri) as p1:
+            with Pyro4.core.Proxy(self.objectUri) as p2:
+                # pooled proxies can't get the outcome on their connection, they use the future daemon
+                p1._pyroPooled=p2._pyroPooled=True
+                p1._pyroAsyncs.add("asyncMultiply")
+                p2._pyroAsyncs.add("asyncMultiply")
+                f1=p1.asyncMultiply(6, 7)
+                f2=p2.asyncMultiply(2, 3)
+                self.assertTrue(isinstance(f1, Pyro4.futures.ClientFuture))
+                self.assertEqual(42, f1.result(2))
+                self.assertEqual(6, f2.result(2))
+                # all proxies share the future daemon of the process, the futures are gone when they are done
+                futureDaemon=p1._pyroFutureDaemon
+                self.assertTrue(futureDaemon is p2._pyroFutureDaemon)
+                self.assertTrue(futureDaemon is Pyro4.core._futureDaemon())
+                self.assertFalse(hasattr(f1, "_pyroId"))
+                self.assertEqual(1, len(futureDaemon.objectsById))
+                # the futures are sent as proxies, the pickling of ClientFutures elsewhere in the process isn't changed
+                self.assertFalse(Pyro4.futures.ClientFuture in copyreg.dispatch_table)
+
+    def testIsasyncProgress(self):
+        for pooled in (False, True):
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroPooled=pooled      # pooled proxies get the updates through the future daemon
+                p._pyroAsyncs.add("asyncProgress")
+                f=p.asyncProgress(200, 0.002)
+                updates=[]
+                f.add_update_callback(lambda future, start, end: updates.append(end))
+                self.assertEqual(200, f.result(5))
+                # the updates are coalesced, the last one arrives before the result
+                self.assertEqual((0, 199), f.get_progress())
+                self.assertTrue(2<len(updates)<50)
+                self.assertEqual(199, updates[-1])
+
+    def testProtocolErrorReply(self):
+        # a request that can't be read is answered with an error, then the connection is closed
+        MF=Pyro4.core.MessageFactory
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p.ping()
+            conn=p._pyroConnection
+            conn.send(MF.createMessage(MF.MSG_RESULT, tobytes("garbage"), 0, 1, conn.macState))
+            msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+            self.assertTrue(flags & MF.FLAGS_EXCEPTION)
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.recv, 1)
+
+    def testConnectOnlyBeforeFirstRequest(self):
+        # the capabilities of the client are only accepted once, in front of its first request
+        MF=Pyro4.core.MessageFactory
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroBind()
+            conn=p._pyroConnection
+            connect=conn.handshakeMessage
+            self.assertEqual(55, p.multiply(5, 11))
+            conn.send(connect)
+            msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+            self.assertTrue(flags & MF.FLAGS_EXCEPTION)
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.recv, 1)
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroBind()
+            conn=p._pyroConnection
+            conn.handshakeMessage, connect = None, conn.handshakeMessage
+            conn.send(connect*1000)
+            msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+            self.assertTrue(flags & MF.FLAGS_EXCEPTION)
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.recv, 1)
+
+    def testEarlyErrorReplyForOlderClients(self):
+        # until the daemon knows the mac algorithm of the client, it signs with the one that older clients use
+        MF=Pyro4.core.MessageFactory
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroBind()
+            conn=p._pyroConnection
+            conn.macState=None      # hmac-sha1, like an older client
+            conn.send(MF.createMessage(MF.MSG_RESULT, tobytes("garbage"), 0, 1))
+            msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+            self.assertTrue(flags & MF.FLAGS_EXCEPTION)
+
+    def testBatchStreamMaxMsgSize(self):
+        # the results of a streamed batch don't have to fit in one message
+        try:
+            Pyro4.config.MAX_MESSAGE_SIZE=3000
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroBind()
+                Pyro4.config.MAX_MESSAGE_SIZE=0
+                batch=Pyro4.batch(p)
+                for i in range(40):
+                    batch.multiply("x", 400)
+                self.assertRaises(Pyro4.errors.ProtocolError, batch)
+                self.assertEqual(["x"*400]*40, list(batch(stream=4)))
+        finally:
+            Pyro4.config.MAX_MESSAGE_SIZE=0
+
     def testBatchOneway(self):
         with Pyro4.core.Proxy(self.objectUri) as p:
             batch=Pyro4.batch(p)
@@ -408,8 +658,8 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
         Pyro4.config.THREADPOOL_MAXTHREADS=20
         Pyro4.config.HMAC_KEY=tobytes("testsuite")
         self.daemon=Pyro4.core.Daemon(port=0)
-        obj=MyThing()
-        uri=self.daemon.register(obj, "something")
+        self.thing=MyThing()
+        uri=self.daemon.register(self.thing, "something")
         self.objectUri=uri
         self.daemonthread=DaemonLoopThread(self.daemon)
         self.daemonthread.start()
@@ -422,6 +672,59 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
         Pyro4.config.COMMTIMEOUT=None
         Pyro4.config.HMAC_KEY=None
 
+    def testBatchParallel(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            batch=Pyro4.batch(p)
+            for i in range(5):
+                batch.delayAndId(0.3, i)
+            batch.divide(1, 0)
+            batch.multiply(7, 6)
+            begin=time.time()
+            results=batch(parallel=True)
+            duration=time.time()-begin
+            self.assertTrue(duration<1.2, "the calls should run at the same time")
+            self.assertEqual(["slept for %d" % i for i in range(5)], [next(results) for i in range(5)])
+            self.assertRaises(ZeroDivisionError, next, results)
+            # an exception doesn't stop the calls after it
+            results=p._pyroInvokeBatch([("divide", (1, 0), {}), ("multiply", (7, 6), {})], parallel=True)
+            self.assertTrue(isinstance(results[0], Pyro4.futures._ExceptionWrapper))
+            self.assertEqual(42, results[1])
+            for i in range(4):
+                batch.delayAndId(0.3, i)
+            begin=time.time()
+            asyncresult=batch(async=True, parallel=2)
+            self.assertEqual(["slept for %d" % i for i in range(4)], list(asyncresult.value))
+            duration=time.time()-begin
+            self.assertTrue(0.55<duration<1.1, "at most 2 calls should run at the same time")
+
+    def testBatchStream(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            batch=Pyro4.batch(p)
+            for i in range(6):
+                batch.delayAndId(0.2, i)
+            begin=time.time()
+            results=batch(stream=2)
+            self.assertEqual("slept for 0", next(results))
+            self.assertTrue(time.time()-begin<0.8, "the first chunk should arrive before the batch is finished")
+            self.assertEqual(["slept for %d" % i for i in range(1, 6)], list(results))
+            # a streamed batch still stops at the first exception, unless it is parallel
+            batch.multiply(7, 6)
+            batch.divide(1, 0)
+            batch.multiply(2, 3)
+            results=batch(stream=True)
+            self.assertEqual(42, next(results))
+            self.assertRaises(ZeroDivisionError, next, results)
+            self.assertRaises(StopIteration, next, results)
+            results=list(p._pyroInvokeBatch([("divide", (1, 0), {}), ("multiply", (2, 3), {})], parallel=True, stream=True))
+            self.assertTrue(isinstance(results[0], Pyro4.futures._ExceptionWrapper))
+            self.assertEqual(6, results[1])
+            for i in range(6):
+                batch.delayAndId(0.3, i)
+            begin=time.time()
+            asyncresult=batch(async=True, parallel=True, stream=3)
+            self.assertEqual(["slept for %d" % i for i in range(6)], list(asyncresult.value))
+            self.assertTrue(time.time()-begin<1.2, "the calls of a chunk should run at the same time")
+
     def testConnectionStuff(self):
         p1=Pyro4.core.Proxy(self.objectUri)
         p2=Pyro4.core.Proxy(self.objectUri)
@@ -458,8 +761,9 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
         self.assertTrue(p._pyroConnection is None)
         # test compression:
         try:
+            Pyro4.config.COMPRESSION=True
             with Pyro4.core.Proxy(self.objectUri) as p:
-                Pyro4.config.COMPRESSION=True
+                self.assertTrue(p._pyroCompression is not None)
                 self.assertEqual(55, p.multiply(5,11))
                 self.assertEqual("*"*1000, p.multiply("*"*500,2))
         finally:
@@ -491,6 +795,52 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
             p._pyroOneway=[]   # empty set is better but don't care in this test
             self.assertEqual(55, p.multiply(5,11))
             
+    def testOnewayBurst(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroOneway.add("ping")
+            p.ping()
+            # the oneway calls don't wait for each other, many of them arrive at the daemon at once
+            for _ in range(100):
+                p.ping()
+            p._pyroTimeout=2.0
+            self.assertEqual(42, p.multiply(6, 7))
+        # the oneway calls are run by the bounded thread pool of the daemon, not by a thread per call
+        self.assertTrue(self.daemon.onewayPool.workercountSafe<=Pyro4.config.ONEWAY_THREADS)
+        self.assertEqual(0, self.daemon.onewayPool.dropped)
+
+    def testStreamCompression(self):
+        self.daemon.streamCompression=True
+        Pyro4.config.COMPRESSION_STREAM=True
+        try:
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroOneway.add("ping")
+                for i in range(50):
+                    p.ping()
+                    self.assertEqual(i*2, p.multiply(i, 2))
+                self.assertEqual("x"*1000, p.multiply("x", 1000))
+                self.assertRaises(ZeroDivisionError, p.divide, 1, 0)
+                self.assertTrue(p._pyroConnection.compressStream is not None)
+                self.assertTrue(p._pyroConnection.decompressStream is not None, "the replies should be compressed")
+            # the replies of a pipelined proxy can be sent from many threads, they must stay in stream order
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                p._pyroPipelined=True
+                errors=[]
+                def calls(number):
+                    try:
+                        for i in range(20):
+                            if p.multiply(number, i)!=number*i:
+                                errors.append("wrong result")
+                    except Exception:
+                        errors.append(sys.exc_info()[1])
+                threads=[threadutil.Thread(target=calls, args=(number,)) for number in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual([], errors)
+        finally:
+            Pyro4.config.COMPRESSION_STREAM=False
+
     def testOnewayDelayed(self):
         try:
             with Pyro4.core.Proxy(self.objectUri) as p:
@@ -623,6 +973,155 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
             for t in threads:
                 self.assertFalse(t.error, "all threads should report no errors") 
 
+    def testMarshalSerializer(self):
+        Pyro4.config.SERIALIZER="marshal"
+        try:
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                self.assertEqual("marshal", p._pyroSerializer.name)
+                self.assertEqual({"number": 42}, p.getDict())
+                self.assertEqual((1, (2, 3), {"four": 4}), p.testargs(1, 2, 3, four=4))
+                # data that marshal can't serialize goes over the wire as a pickle
+                obj=MyThing2()
+                self.assertTrue(isinstance(p.echo(obj), MyThing2))
+                self.assertRaises(ZeroDivisionError, p.divide, 1, 0)
+                batch=Pyro4.batch(p)
+                batch.multiply(6, 7)
+                batch.divide(1, 0)
+                results=batch()
+                self.assertEqual(42, next(results))
+                self.assertRaises(ZeroDivisionError, next, results)
+        finally:
+            Pyro4.config.SERIALIZER="pickle"
+
+    def testOutOfBandBuffers(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            big=tobytes("x")*(4*1024*1024)
+            self.assertEqual(big, p.echo(big))
+            bigarray=bytearray(big[:100000])
+            result=p.echo([bigarray, "small", big[:70000]])
+            self.assertTrue(type(result[0]) is bytearray)
+            self.assertEqual([bigarray, "small", big[:70000]], result)
+            self.assertEqual(42, p.multiply(6, 7))
+
+    def testStreamedIterators(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            self.assertEqual(list(range(40)), list(p.generator(40)))
+            self.assertEqual(["one", "two", "three"], list(p.iterator()))
+            self.assertEqual(0, len(self.daemon.streams), "exhausted streams are discarded")
+            numbers=p.generator(1000)
+            numbers.prefetch=5
+            self.assertEqual(0, next(numbers))
+            self.assertEqual(5, self.thing.generated, "the generator only runs as far as the client fetched")
+            self.assertEqual([1, 2, 3, 4, 5], [next(numbers) for _ in range(5)])
+            self.assertEqual(10, self.thing.generated)
+            self.assertEqual(1, len(self.daemon.streams))
+            self.thing.generatorClosed=False
+            numbers.close()
+            self.assertTrue(self.thing.generatorClosed, "closing the stream early must close the generator")
+            self.assertEqual(0, len(self.daemon.streams))
+            self.assertRaises(StopIteration, next, numbers)
+            # an error in the generator is raised after the items that came before it
+            numbers=p.generator(10, failAt=3)
+            self.assertEqual([0, 1, 2], [next(numbers) for _ in range(3)])
+            self.assertRaises(ValueError, next, numbers)
+            self.assertRaises(StopIteration, next, numbers)
+            self.assertEqual(0, len(self.daemon.streams))
+            # the streams of a client are closed when its connection closes
+            self.thing.generatorClosed=False
+            numbers=p.generator(1000)
+            next(numbers)
+            self.assertEqual(1, len(self.daemon.streams))
+        time.sleep(0.3)
+        self.assertEqual(0, len(self.daemon.streams))
+        self.assertTrue(self.thing.generatorClosed)
+
+    def testStreamingDisabled(self):
+        Pyro4.config.ITER_STREAMING=False
+        try:
+            with Pyro4.core.Proxy(self.objectUri) as p:
+                self.assertRaises(Exception, p.generator, 10)    # generators can't be serialized
+        finally:
+            Pyro4.config.ITER_STREAMING=True
+        self.assertEqual(0, len(self.daemon.streams))
+
+    def testPipelining(self):
+        class CallerThread(threadutil.Thread):
+            def __init__(self, proxy, name):
+                super(CallerThread,self).__init__()
+                self.setDaemon(True)
+                self.proxy=proxy
+                self.name=name
+                self.reply=None
+            def run(self):
+                self.reply=self.proxy.delayAndId(0.5, self.name)
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroPipelined=True
+            p._pyroTimeout=5.0
+            p.ping()
+            connection=p._pyroConnection
+            threads=[CallerThread(p, "t%d" % i) for i in range(4)]
+            start=time.time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            duration=time.time()-start
+            for t in threads:
+                self.assertEqual("slept for "+t.name, t.reply)
+            self.assertTrue(connection is p._pyroConnection, "all calls must use the same connection")
+            if Pyro4.config.SERVERTYPE in ("multiplex", "epoll"):
+                # the calls are processed one after another, 4 times 0.5 seconds
+                self.assertTrue(1.8<duration<2.6)
+            else:
+                # the daemon processes the calls of the connection in parallel
+                self.assertTrue(0.4<duration<1.2)
+
+    def testPipelinedTimeout(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroPipelined=True
+            p.ping()
+            connection=p._pyroConnection
+            p._pyroTimeout=0.2
+            self.assertRaises(Pyro4.errors.TimeoutError, p.delay, 0.5)
+            # the late reply is dropped, the connection remains usable
+            p._pyroTimeout=2.0
+            self.assertEqual(42, p.multiply(6,7))
+            self.assertTrue(connection is p._pyroConnection)
+            time.sleep(0.5)
+            self.assertEqual(42, p.multiply(6,7))
+
+    def testPipelinedAsync(self):
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroPipelined=True
+            p.ping()
+            connection=p._pyroConnection
+            async=Pyro4.async(p)
+            results=[async.multiply(i, 2) for i in range(10)]
+            self.assertEqual([i*2 for i in range(10)], [r.value for r in results])
+            # the async calls use the connection of the pipelined proxy itself
+            self.assertTrue(connection is p._pyroConnection)
+
+    def testPipelinedRelease(self):
+        errors=[]
+        def call(proxy):
+            try:
+                proxy.delay(1)
+            except Pyro4.errors.ConnectionClosedError:
+                errors.append(sys.exc_info()[1])
+        with Pyro4.core.Proxy(self.objectUri) as p:
+            p._pyroPipelined=True
+            p.ping()
+            caller=threadutil.Thread(target=call, args=(p,))
+            caller.setDaemon(True)
+            caller.start()
+            time.sleep(0.2)
+            p._pyroRelease()
+            caller.join(0.5)
+            self.assertFalse(caller.isAlive(), "waiting call must fail when the connection is released")
+            self.assertEqual(1, len(errors))
+            time.sleep(1)
+            self.assertEqual(42, p.multiply(6,7))
+
     def testServerConnections(self):
         # check if the server allows to grow the number of connections
         proxies=[Pyro4.core.Proxy(self.objectUri) for _ in range(10)]
@@ -672,7 +1171,7 @@ class ServerTestsThreadNoTimeout(unittest.TestCase):
             self.assertFalse(t.error, "all threads should report no errors")
         del threads
         duration=time.time()-start
-        if Pyro4.config.SERVERTYPE=="multiplex":
+        if Pyro4.config.SERVERTYPE in ("multiplex", "epoll"):
             # multiplex based server doesn't execute calls in parallel,
             # so 6 threads times 0.5 seconds =~ 3 seconds
             self.assertTrue(2.5<duration<3.5)
@@ -690,6 +1189,47 @@ if os.name!="java":
         def testException(self):
             pass
 
+    if hasattr(select, "epoll"):
+        class ServerTestsEpollNoTimeout(ServerTestsMultiplexNoTimeout):
+            SERVERTYPE="epoll"
+            COMMTIMEOUT=None
+
+            def testIncompleteFirstMessage(self):
+                # clients that don't send (all of) their first message don't hold up the other clients
+                location=(self.objectUri.host, self.objectUri.port)
+                silent=socket.create_connection(location)
+                partial=socket.create_connection(location)
+                try:
+                    partial.send(tobytes("PYRO"))
+                    time.sleep(0.1)
+                    with Pyro4.core.Proxy(self.objectUri) as p:
+                        p._pyroTimeout=1.0
+                        self.assertEqual(42, p.multiply(6, 7))
+                        self.assertEqual(3, len(self.daemon.transportServer.clients))
+                    # a message header that doesn't make sense ends the connection
+                    partial.send(tobytes("garbage that isn't a message header"))
+                    time.sleep(0.1)
+                    self.assertEqual(1, len(self.daemon.transportServer.clients))
+                finally:
+                    silent.close()
+                    partial.close()
+
+    class ServerTestsHybridNoTimeout(ServerTestsThreadNoTimeout):
+        SERVERTYPE="hybrid"
+        COMMTIMEOUT=None
+        def testServerParallelism(self):
+            # more proxies than worker threads: calls still run in parallel
+            Pyro4.config.THREADPOOL_MAXTHREADS=6
+            try:
+                super(ServerTestsHybridNoTimeout, self).testServerParallelism()
+            finally:
+                Pyro4.config.THREADPOOL_MAXTHREADS=20
+
+    if sys.version_info>=(3,5):
+        class ServerTestsAsyncioNoTimeout(ServerTestsThreadNoTimeout):
+            SERVERTYPE="asyncio"
+            COMMTIMEOUT=None
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
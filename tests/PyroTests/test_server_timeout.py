@@ -5,7 +5,9 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 import unittest
+import sys
 import os
+import select
 import test_server
 
 class ServerTestsThreadTimeout(test_server.ServerTestsThreadNoTimeout):
@@ -31,6 +33,41 @@ if os.name!="java":
         def testException(self):
             pass
 
+    class ServerTestsHybridTimeout(test_server.ServerTestsHybridNoTimeout):
+        SERVERTYPE="hybrid"
+        COMMTIMEOUT=2.0
+        def testServerParallelism(self):
+            # this test is not suitable on a server with timeout set
+            pass
+        def testProxySharing(self):
+            pass
+        def testException(self):
+            pass
+
+    if hasattr(select, "epoll"):
+        class ServerTestsEpollTimeout(test_server.ServerTestsEpollNoTimeout):
+            SERVERTYPE="epoll"
+            COMMTIMEOUT=2.0
+            def testServerParallelism(self):
+                # this test is not suitable on a server with timeout set
+                pass
+            def testProxySharing(self):
+                pass
+            def testException(self):
+                pass
+
+    if sys.version_info>=(3,5):
+        class ServerTestsAsyncioTimeout(test_server.ServerTestsAsyncioNoTimeout):
+            SERVERTYPE="asyncio"
+            COMMTIMEOUT=2.0
+            def testServerParallelism(self):
+                # this test is not suitable on a server with timeout set
+                pass
+            def testProxySharing(self):
+                pass
+            def testException(self):
+                pass
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
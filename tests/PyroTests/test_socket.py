@@ -5,12 +5,14 @@ Pyro - Python Remote Objects.  Copyright by Irmen de Jong (irmen@razorvine.net).
 """
 
 import unittest
-import socket, os, sys
+import socket, os, sys, select, time
 import Pyro4.socketutil as SU
 from Pyro4 import threadutil
-from Pyro4.socketserver.multiplexserver import SocketServer_Select, SocketServer_Poll
+from Pyro4.socketserver.multiplexserver import SocketServer_Select, SocketServer_Poll, SocketServer_Epoll
 from Pyro4.socketserver.threadpoolserver import SocketServer_Threadpool
+from Pyro4.socketserver.hybridserver import SocketServer_HybridPoll, LockedSocketConnection
 import Pyro4
+import Pyro4.core
 from testsupport import *
 
 
@@ -195,6 +197,148 @@ class TestSocketutil(unittest.TestCase):
         ss.close()
         cs.close()
 
+    def testSendPartsRecvInto(self):
+        ss=SU.createSocket(bind=("localhost",0))
+        port=ss.getsockname()[1]
+        cs=SU.createSocket(connect=("localhost",port), timeout=2.0)
+        a=ss.accept()
+        big=bytearray(tobytes("y"))*999999
+        parts=[tobytes("header"), tobytes(""), big, tobytes("trailer")]
+        def send():
+            SU.sendData(cs, parts)
+            cs.shutdown(socket.SHUT_WR)
+        sender=threadutil.Thread(target=send)
+        sender.setDaemon(True)
+        sender.start()
+        self.assertEqual(tobytes("header"), SU.receiveData(a[0], 6))
+        buffer=bytearray(len(big))
+        self.assertTrue(SU.receiveDataInto(a[0], buffer) is buffer)
+        self.assertEqual(big, buffer)
+        buffer=bytearray(100)
+        self.assertRaises(Pyro4.errors.ConnectionClosedError, SU.receiveDataInto, a[0], buffer)
+        sender.join()
+        a[0].close()
+        ss.close()
+        cs.close()
+
+    def testBufferedConnection(self):
+        sock1, sock2 = socket.socketpair()
+        conn=SU.SocketConnection(sock2)
+        try:
+            # two messages that arrive together are received with a single system call
+            SU.sendData(sock1, tobytes("header1")+tobytes("data1")+tobytes("header2")+tobytes("data2"))
+            self.assertEqual(tobytes("header1"), conn.recv(7))
+            self.assertEqual(17, conn.buffered)
+            self.assertEqual(tobytes("data1"), conn.recv(5))
+            self.assertEqual(tobytes("header2"), conn.recv(7))
+            self.assertEqual(tobytes("data2"), conn.recv(5))
+            self.assertEqual(0, conn.buffered)
+            # data that doesn't fit in the buffer, of which the first part was received together with the header
+            big=tobytes("z")*(SU.RECV_BUFFER_SIZE*3)
+            SU.sendData(sock1, [tobytes("header3"), big, tobytes("trailer")])
+            self.assertEqual(tobytes("header3"), conn.recv(7))
+            self.assertEqual(big, conn.recv(len(big)))
+            self.assertEqual(tobytes("trailer"), conn.recv(7))
+            # recvInto first takes the data that is still buffered
+            SU.sendData(sock1, tobytes("header4")+big)
+            self.assertEqual(tobytes("header4"), conn.recv(7))
+            buffer=bytearray(len(big))
+            self.assertTrue(conn.recvInto(buffer) is buffer)
+            self.assertEqual(big, buffer)
+            self.assertEqual(0, conn.buffered)
+            # more data than the buffer can grow to, is received into its own buffer
+            huge=tobytes("q")*(SU.RECV_BUFFER_MAXSIZE+1)
+            SU.sendData(sock1, [tobytes("header5"), huge])
+            self.assertEqual(tobytes("header5"), conn.recv(7))
+            self.assertEqual(huge, conn.recv(len(huge)))
+            sock1.close()
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.recv, 1)
+        finally:
+            conn.close()
+
+    def testBufferedConnectionDrains(self):
+        class CountingSocket(object):
+            def __init__(self, sock):
+                self.sock=sock
+                self.receives=0
+            def recv_into(self, buffer):
+                self.receives+=1
+                return self.sock.recv_into(buffer)
+            def fileno(self):
+                return self.sock.fileno()
+            def close(self):
+                self.sock.close()
+        sock1, sock2 = socket.socketpair()
+        sock=CountingSocket(sock2)
+        conn=SU.SocketConnection(sock)
+        MF=Pyro4.core.MessageFactory
+        try:
+            self.assertEqual(None, conn.recvBuffer, "the buffer is allocated when it's needed")
+            # many small messages that arrive at once, are all parsed from a single receive
+            messages=[MF.createMessage(MF.MSG_RESULT, tobytes("data%d" % i), 0, i) for i in range(20)]
+            SU.sendData(sock1, tobytes("").join(messages))
+            for i in range(20):
+                msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+                self.assertEqual(i, seq)
+                self.assertEqual(tobytes("data%d" % i), data)
+            self.assertEqual(1, sock.receives)
+            self.assertEqual(None, conn.recvBuffer, "the buffer is dropped when it's empty")
+            # when a receive fills the buffer, the buffer grows so that the rest is received with fewer receives
+            messages=[MF.createMessage(MF.MSG_RESULT, tobytes("x")*900, 0, i) for i in range(60)]
+            SU.sendData(sock1, tobytes("").join(messages))
+            time.sleep(0.1)
+            for i in range(60):
+                msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+                self.assertEqual(i, seq)
+                if i==30:
+                    self.assertTrue(len(conn.recvBuffer)>SU.RECV_BUFFER_SIZE)
+            self.assertEqual(4, sock.receives, "16 kb, 32 kb and then the rest")
+            self.assertEqual(None, conn.recvBuffer, "the large buffer is dropped as well when it's empty")
+        finally:
+            conn.close()
+            sock1.close()
+
+    def testReceiveAvailable(self):
+        sock1, sock2 = socket.socketpair()
+        sock2.setblocking(False)
+        conn=SU.SocketConnection(sock2)
+        try:
+            self.assertEqual(0, len(conn.receiveAvailable(10)), "nothing available, doesn't wait")
+            SU.sendData(sock1, tobytes("hello"))
+            time.sleep(0.05)
+            self.assertEqual(tobytes("hello"), conn.receiveAvailable(10).tobytes())
+            self.assertEqual(5, conn.buffered, "the received data stays buffered")
+            self.assertEqual(tobytes("hello"), conn.receiveAvailable(3).tobytes())
+            self.assertEqual(tobytes("hel"), conn.recv(3))
+            sock1.close()
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.receiveAvailable, 10)
+            self.assertEqual(tobytes("lo"), conn.recv(2))
+        finally:
+            conn.close()
+
+    def testBufferedConnectionClosed(self):
+        sock1, sock2 = socket.socketpair()
+        conn=SU.SocketConnection(sock2)
+        MF=Pyro4.core.MessageFactory
+        try:
+            # a message that fills the buffer exactly, after which the other side closes the connection
+            message=MF.createMessage(MF.MSG_RESULT, tobytes("x")*(SU.RECV_BUFFER_SIZE-MF.HEADERSIZE), 0, 1)
+            SU.sendData(sock1, message)
+            sock1.close()
+            time.sleep(0.1)
+            msgType, flags, seq, data = MF.getMessage(conn, MF.MSG_RESULT)
+            self.assertEqual(SU.RECV_BUFFER_SIZE-MF.HEADERSIZE, len(data))
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, MF.getMessage, conn, MF.MSG_RESULT)
+            sock1, sock2 = socket.socketpair()
+            conn.close()
+            conn=SU.SocketConnection(sock2)
+            SU.sendData(sock1, tobytes("y")*SU.RECV_BUFFER_SIZE)
+            sock1.close()
+            self.assertEqual(tobytes("y")*SU.RECV_BUFFER_SIZE, conn.recv(SU.RECV_BUFFER_SIZE))
+            self.assertRaises(Pyro4.errors.ConnectionClosedError, conn.recv, 1)
+        finally:
+            conn.close()
+
     def testSendUnix(self):
         if hasattr(socket,"AF_UNIX"):
             SOCKNAME="test_unixsocket"
@@ -331,6 +475,37 @@ class TestSocketServer(unittest.TestCase):
         serv.close()
         serv.close()
         self.assertTrue(serv.sock is None)
+    def testServer_hybrid(self):
+        daemon=ServerCallback()
+        port=SU.findProbablyUnusedPort()
+        serv=SocketServer_HybridPoll()
+        serv.init(daemon,"localhost",port)
+        self.assertEqual("localhost:"+str(port), serv.locationStr)
+        self.assertTrue(serv.sock is not None)
+        self.assertTrue(serv.jobqueue.workercount>0)
+        self.assertEqual(LockedSocketConnection, serv.connectionType)
+        serv.close()
+        serv.close()
+        self.assertTrue(serv.sock is None)
+        self.assertTrue(serv.jobqueue.closed)
+    if hasattr(select, "epoll"):
+        def testServer_epoll(self):
+            daemon=ServerCallback()
+            port=SU.findProbablyUnusedPort()
+            serv=SocketServer_Epoll()
+            serv.init(daemon,"localhost",port)
+            self.assertEqual("localhost:"+str(port), serv.locationStr)
+            self.assertTrue(serv.sock is not None)
+            self.assertEqual([serv.sock], serv.sockets)
+            conn=SU.SocketConnection(serv.sock, "ID12345")
+            self.assertEqual("ID12345",conn.objectId)
+            self.assertTrue(conn.sock is not None)
+            conn.close()
+            conn.close()
+            self.assertFalse(conn.sock is None, "connections keep their socket object even if it's closed")
+            serv.close()
+            serv.close()
+            self.assertTrue(serv.sock is None)
 
 
 if __name__ == "__main__":
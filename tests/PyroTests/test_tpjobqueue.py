@@ -101,6 +101,60 @@ class TPJobQueueTests(unittest.TestCase):
         self.assertEqual(0, jq.workercount, "all workers must be stopped by now")
         jq.drain()
 
+    def testJQoverflow(self):
+        self.assertRaises(ValueError, ThreadPooledJobQueue, overflow="explode")
+        started=Pyro4.threadutil.Event()
+        release=Pyro4.threadutil.Event()
+        ran=[]
+        def blocker():
+            started.set()
+            release.wait()
+        for overflow in ("drop", "inline"):
+            started.clear()
+            release.clear()
+            del ran[:]
+            with ThreadPooledJobQueue(0, 1, 1, overflow) as jq:
+                self.assertEqual(0, jq.workercountSafe)
+                jq.process(blocker)
+                started.wait(2)
+                jq.process(lambda: ran.append("queued"))
+                self.assertEqual(1, jq.jobcount)
+                jq.process(lambda: ran.append("overflow"))     # the queue is full
+                if overflow=="drop":
+                    self.assertEqual(1, jq.dropped)
+                    self.assertEqual([], ran)
+                else:
+                    self.assertEqual(0, jq.dropped)
+                    self.assertEqual(["overflow"], ran)
+                self.assertEqual(1, jq.workercountSafe)
+                release.set()
+                time.sleep(0.1)
+                self.assertEqual("queued", ran[-1])
+
+    def testJQjobQueuedWhileWorkerTakesJob(self):
+        # a job that is queued while the only idle worker has just taken another job (but isn't busy yet)
+        # must get a worker of its own, instead of waiting for that other job to finish
+        taken=Pyro4.threadutil.Event()
+        proceed=Pyro4.threadutil.Event()
+        release=Pyro4.threadutil.Event()
+        ran=Pyro4.threadutil.Event()
+        class SlowWorkerQueue(ThreadPooledJobQueue):
+            def getJob(self):
+                job=super(SlowWorkerQueue, self).getJob()
+                if job is blocker:
+                    taken.set()
+                    proceed.wait()
+                return job
+        def blocker():
+            release.wait()
+        with SlowWorkerQueue(1, 4) as jq:
+            jq.process(blocker)
+            self.assertTrue(taken.wait(2))
+            jq.process(ran.set)
+            proceed.set()
+            self.assertTrue(ran.wait(2), "the second job should not wait for the first one")
+            release.set()
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']